@@ -0,0 +1,7 @@
+"""
+Fichier specifique aux modules Python.
+
+:file __init__.py
+:author Thibaut PASSILLY
+:date 07.10.2020
+"""
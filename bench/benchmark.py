@@ -0,0 +1,551 @@
+"""
+Mesures de performances du scanner, sans reseau ni nmap : les requetes
+sont traitees par un faux binaire nmap (voir fake_nmap.py) et les
+moteurs asynchrones testent des ports ouverts localement.
+
+Chaque scenario est execute dans un processus dedie, afin que les pics
+de memoire mesures lui soient propres. Les resultats sont ecrits en JSON,
+et peuvent etre compares a ceux d'une execution precedente.
+
+Utilisation (depuis la racine du projet) :
+    python3 -m bench.benchmark [--sizes 28,24,20,16] [--output res.json]
+                               [--baseline ref.json] ...
+
+:file benchmark.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import select
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from src.config import config_dict
+from src.dispatcher import NmapScan
+from src.logs import multiprocessing_logger_init
+from src.output import Output
+from src.ports import PortSet
+
+BENCH_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+FAKE_NMAP_PATH = os.path.join(BENCH_DIRECTORY, "fake_nmap.py")
+SCENARIOS = ("dispatch", "connect", "udp")
+# premier port des ports ouverts localement (moteurs asynchrones)
+LISTENER_BASE_PORT = 20000
+# sens d'evolution souhaite des indicateurs compares a une reference :
+# 1 si une valeur plus grande est meilleure, -1 sinon
+METRICS = {
+    "wall_seconds": -1,
+    "tasks_per_second": 1,
+    "ports_per_second": 1,
+    "overhead_per_task_ms": -1,
+    "peak_rss_kb": -1,
+    "peak_children_rss_kb": -1,
+    "build_targets_reports_seconds": -1,
+    "output_html_seconds": -1,
+}
+
+
+class BenchmarkScan(NmapScan):
+    """
+    Scan instrumente : chaque requete executee par le pool est comptee,
+    et le temps passe par le processus principal a produire les requetes
+    et a agreger leurs resultats est mesure.
+
+    :class BenchmarkScan
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialisation des objets de type BenchmarkScan.
+
+        :param self : reference vers l'objet BenchmarkScan parent
+        :param args, kwargs : parametres de NmapScan
+        :return None
+        """
+        super().__init__(*args, **kwargs)
+        self.stats = {
+            "tasks": 0,
+            "produce_seconds": 0.0,
+            "handle_seconds": 0.0,
+            "nmap_seconds": 0.0,
+            "probe_seconds": 0.0,
+        }
+
+    def run_tasks(self, pool, function, tasks, handle_result, *args, **kw):
+        stats = self.stats
+
+        def timed_tasks():
+            iterator = iter(tasks)
+            while True:
+                start_time = time.perf_counter()
+                task = next(iterator, None)
+                stats["produce_seconds"] += time.perf_counter() - start_time
+                if task is None:
+                    return
+                stats["tasks"] += 1
+                yield task
+
+        def timed_handle_result(results):
+            start_time = time.perf_counter()
+            handle_result(results)
+            stats["handle_seconds"] += time.perf_counter() - start_time
+            # duree du scan par le faux nmap (voir FAKE_NMAP_DELAY)
+            if isinstance(results, list) and len(results) != 0:
+                stats["nmap_seconds"] += results[0].elapsed
+
+        super().run_tasks(
+            pool, function, timed_tasks(), timed_handle_result, *args, **kw
+        )
+
+    def run_connect_phase(self):
+        start_time = time.perf_counter()
+        super().run_connect_phase()
+        self.stats["probe_seconds"] += time.perf_counter() - start_time
+
+    def run_udp_phase(self):
+        start_time = time.perf_counter()
+        super().run_udp_phase()
+        self.stats["probe_seconds"] += time.perf_counter() - start_time
+
+
+def serve_loopback(protocol, count, span, ready):
+    """
+    Ouverture de ports locaux (TCP en ecoute, ou UDP renvoyant chaque
+    datagramme recu), repartis sur un intervalle de ports.
+
+    :param protocol : protocole ("T" ou "U")
+    :param count : nombre de ports a ouvrir
+    :param span : largeur de l'intervalle de ports
+    :param ready : extremite d'un tube recevant la liste des ports ouverts
+    :return None
+    """
+    sockets = []
+    step = max(1, span // count)
+    for port in range(LISTENER_BASE_PORT, LISTENER_BASE_PORT + span, step):
+        if len(sockets) == count:
+            break
+        kind = socket.SOCK_STREAM if protocol == "T" else socket.SOCK_DGRAM
+        listener = socket.socket(socket.AF_INET, kind)
+        try:
+            listener.bind(("127.0.0.1", port))
+        except OSError:
+            # port deja utilise
+            listener.close()
+            continue
+        if protocol == "T":
+            listener.listen(128)
+        sockets.append(listener)
+    ready.send([listener.getsockname()[1] for listener in sockets])
+    while True:
+        readable, _, _ = select.select(sockets, [], [])
+        for listener in readable:
+            if protocol == "T":
+                connection, _ = listener.accept()
+                connection.close()
+            else:
+                data, address = listener.recvfrom(65535)
+                listener.sendto(data or b"\n", address)
+
+
+def count_open_ports(targets_reports, transport_protocol):
+    """
+    Calcul du nombre de ports ouverts dans les rapports.
+
+    :param targets_reports : rapports du scan (voir build_targets_reports)
+    :param transport_protocol : protocole de transport
+    :return nombre de ports ouverts
+    """
+    return sum(
+        1
+        for target_report in targets_reports["reports"].values()
+        for host_report in target_report["report"].values()
+        for port in host_report["ports"].get(transport_protocol, {}).values()
+        if port.state == "open"
+    )
+
+
+def run_scenario(settings):
+    """
+    Execution d'un scenario dans le processus courant.
+
+    :param settings : parametres du scenario (voir build_scenarios)
+    :return dictionnaire des mesures
+    """
+    # les logs du scan sont ignores (mais toujours transmis par les
+    # processus du pool, comme lors d'un vrai scan)
+    logging.getLogger().addHandler(logging.NullHandler())
+    config_dict["NMAP_BINARY_PATH"] = FAKE_NMAP_PATH
+    config_dict["OUTPUT_DIRECTORY"] = settings["output_directory"]
+    scenario = settings["scenario"]
+    listener = None
+    kwargs = {"transport_protocols": ["T"]}
+    if scenario == "dispatch":
+        targets = ["10.0.0.0/{}".format(settings["prefix"])]
+        port_sets = {"T": PortSet.from_range(1, settings["ports"])}
+    else:
+        protocol = "T" if scenario == "connect" else "U"
+        span = settings["ports"]
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        listener = multiprocessing.Process(
+            target=serve_loopback,
+            args=(protocol, settings["listeners"], span, sender),
+            daemon=True,
+        )
+        listener.start()
+        open_ports = receiver.recv()
+        targets = ["127.0.0.1"]
+        port_sets = {
+            protocol: PortSet.from_range(
+                LISTENER_BASE_PORT, LISTENER_BASE_PORT + span - 1
+            )
+        }
+        if protocol == "T":
+            kwargs = {"transport_protocols": ["T"], "engine": "connect"}
+        else:
+            kwargs = {"transport_protocols": ["U"], "udp_engine": "async"}
+
+    queue_listener, queue = multiprocessing_logger_init(
+        stream_handler=logging.NullHandler(),
+        file_handler=logging.NullHandler(),
+    )
+    scan = BenchmarkScan(
+        targets=targets,
+        queue=queue,
+        port_sets=port_sets,
+        host_batch_size=settings["batch_size"],
+        processes=settings["processes"],
+        output_filename="benchmark",
+        **kwargs
+    )
+    start_time = time.perf_counter()
+    scan.process()
+    wall_seconds = time.perf_counter() - start_time
+    queue_listener.stop()
+
+    start_time = time.perf_counter()
+    targets_reports = scan.build_targets_reports()
+    build_seconds = time.perf_counter() - start_time
+    output = Output(targets_reports)
+    start_time = time.perf_counter()
+    output.output_html()
+    html_seconds = time.perf_counter() - start_time
+    html_path = os.path.join(settings["output_directory"], "benchmark.html")
+
+    stats = scan.stats
+    tasks = stats["tasks"]
+    # temps des processus du pool non passe dans nmap : lancement de nmap,
+    # echanges avec le processus principal, analyse des resultats et
+    # attente de nouvelles requetes
+    pool_seconds = settings["processes"] * (
+        wall_seconds - stats["probe_seconds"]
+    )
+    overhead = pool_seconds - stats["nmap_seconds"]
+    measures = {
+        "name": settings["name"],
+        "scenario": scenario,
+        "hosts": targets_reports["summary"]["totalhosts"],
+        "uphosts": targets_reports["summary"]["uphosts"],
+        "ports": settings["ports"],
+        "tasks": tasks,
+        "wall_seconds": round(wall_seconds, 4),
+        "tasks_per_second": round(tasks / max(wall_seconds, 1e-9), 2),
+        "nmap_seconds": round(stats["nmap_seconds"], 4),
+        "overhead_per_task_ms": round(1000 * overhead / max(tasks, 1), 3),
+        "pool_utilization": round(
+            stats["nmap_seconds"] / max(pool_seconds, 1e-9), 4
+        ),
+        "produce_per_task_ms": round(
+            1000 * stats["produce_seconds"] / max(tasks, 1), 4
+        ),
+        "handle_per_task_ms": round(
+            1000 * stats["handle_seconds"] / max(tasks, 1), 4
+        ),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_children_rss_kb": resource.getrusage(
+            resource.RUSAGE_CHILDREN
+        ).ru_maxrss,
+        "build_targets_reports_seconds": round(build_seconds, 4),
+        "output_html_seconds": round(html_seconds, 4),
+        "html_bytes": os.path.getsize(html_path),
+        # durees par etape mesurees par le scan lui-meme (voir metrics.py)
+        "stages": targets_reports["summary"]["stats"]["stages"],
+        "worker_stages": targets_reports["summary"]["stats"]["worker_stages"],
+    }
+    if listener is not None:
+        listener.terminate()
+        measures["probe_seconds"] = round(stats["probe_seconds"], 4)
+        measures["ports_per_second"] = round(
+            settings["ports"] / max(stats["probe_seconds"], 1e-9), 1
+        )
+        measures["open_ports_expected"] = len(open_ports)
+        measures["open_ports_found"] = count_open_ports(
+            targets_reports, protocol
+        )
+    return measures
+
+
+def build_scenarios(args, output_directory):
+    """
+    Creation de la liste des scenarios a executer.
+
+    :param args : options de la ligne de commande
+    :param output_directory : dossier des sorties html des scenarios
+    :return liste de parametres de scenarios
+    """
+    common = {
+        "output_directory": output_directory,
+        "processes": args.processes,
+        "batch_size": args.batch_size,
+    }
+    scenarios = []
+    if "dispatch" in args.scenarios:
+        for prefix in args.sizes:
+            scenarios.append(
+                dict(
+                    common,
+                    name="dispatch/{}".format(prefix),
+                    scenario="dispatch",
+                    prefix=prefix,
+                    ports=args.ports,
+                )
+            )
+    for scenario, ports in (
+        ("connect", args.connect_ports),
+        ("udp", args.udp_ports),
+    ):
+        if scenario in args.scenarios:
+            scenarios.append(
+                dict(
+                    common,
+                    name=scenario,
+                    scenario=scenario,
+                    ports=ports,
+                    listeners=args.listeners,
+                )
+            )
+    return scenarios
+
+
+def build_environment(args, tools_directory):
+    """
+    Preparation de l'environnement des scenarios : parametres du faux
+    nmap et, sauf demande contraire, un faux sudo (run_request lance nmap
+    via sudo).
+
+    :param args : options de la ligne de commande
+    :param tools_directory : dossier temporaire recevant le faux sudo
+    :return dictionnaire des variables d'environnement
+    """
+    environment = dict(os.environ)
+    environment["FAKE_NMAP_DELAY"] = str(args.delay)
+    environment["FAKE_NMAP_HOST_DELAY"] = str(args.host_delay)
+    environment["FAKE_NMAP_UP_RATIO"] = str(args.up_ratio)
+    if args.xml:
+        environment["FAKE_NMAP_XML"] = os.path.abspath(args.xml)
+    if not args.sudo:
+        sudo_path = os.path.join(tools_directory, "sudo")
+        with open(sudo_path, "w") as sudo_file:
+            sudo_file.write('#!/bin/sh\n[ "$1" = "-n" ] && shift\nexec "$@"\n')
+        os.chmod(sudo_path, os.stat(sudo_path).st_mode | stat.S_IEXEC)
+        environment["PATH"] = (
+            tools_directory + os.pathsep + environment.get("PATH", "")
+        )
+    return environment
+
+
+def compare(results, baseline, tolerance):
+    """
+    Comparaison des mesures a celles d'une execution de reference.
+
+    :param results : mesures des scenarios
+    :param baseline : resultats de reference (voir main)
+    :param tolerance : degradation relative toleree (0.2 pour 20%)
+    :return liste des regressions (dict)
+    """
+    reference = {measures["name"]: measures for measures in baseline}
+    regressions = []
+    for measures in results:
+        if measures["name"] not in reference:
+            continue
+        for metric, direction in METRICS.items():
+            before = reference[measures["name"]].get(metric)
+            after = measures.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if change * direction < -tolerance:
+                regressions.append(
+                    {
+                        "name": measures["name"],
+                        "metric": metric,
+                        "baseline": before,
+                        "value": after,
+                        "change": round(change, 3),
+                    }
+                )
+    return regressions
+
+
+def parse_arguments():
+    """
+    Analyse des options de la ligne de commande.
+
+    :param None
+    :return options (argparse.Namespace)
+    """
+    parser = argparse.ArgumentParser(
+        description="Mesures de performances du scanner (hors ligne)"
+    )
+    parser.add_argument(
+        "--scenarios",
+        type=lambda value: value.split(","),
+        default=list(SCENARIOS),
+        help="scenarios parmi {}".format(",".join(SCENARIOS)),
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(prefix) for prefix in value.split(",")],
+        default=[28, 24, 20, 16],
+        help="longueurs de prefixe des reseaux IPv4 scannes",
+    )
+    parser.add_argument(
+        "--ports", type=int, default=1000, help="ports TCP par machine"
+    )
+    parser.add_argument(
+        "--connect-ports",
+        type=int,
+        default=10000,
+        help="ports scannes par le moteur connect",
+    )
+    parser.add_argument(
+        "--udp-ports",
+        type=int,
+        default=5000,
+        help="ports scannes par le moteur UDP async",
+    )
+    parser.add_argument(
+        "--listeners", type=int, default=32, help="ports ouverts localement"
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=config_dict["PROCESSES"],
+        help="nombre de processus de scan",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=config_dict["HOST_BATCH_SIZE"],
+        help="nombre de machines par appel a nmap",
+    )
+    parser.add_argument(
+        "--delay", type=float, default=0.0, help="duree de chaque appel"
+    )
+    parser.add_argument(
+        "--host-delay",
+        type=float,
+        default=0.0,
+        help="duree du scan de chaque machine",
+    )
+    parser.add_argument(
+        "--up-ratio",
+        type=float,
+        default=0.25,
+        help="proportion des machines en ligne",
+    )
+    parser.add_argument("--xml", help="sortie XML de nmap a rejouer")
+    parser.add_argument(
+        "--sudo",
+        action="store_true",
+        help="utiliser le vrai sudo plutot qu'un faux sudo",
+    )
+    parser.add_argument("--output", help="fichier JSON des resultats")
+    parser.add_argument("--baseline", help="resultats JSON de reference")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="degradation relative toleree par rapport a la reference",
+    )
+    # execution d'un seul scenario (processus fils)
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    """
+    Execution des scenarios, chacun dans un processus fils, puis ecriture
+    des resultats.
+
+    :param None
+    :return code de retour : 1 si une regression a ete detectee
+    """
+    args = parse_arguments()
+    if args.run_scenario:
+        measures = run_scenario(json.loads(args.run_scenario))
+        sys.stdout.write(json.dumps(measures) + "\n")
+        return 0
+
+    root_directory = os.path.dirname(BENCH_DIRECTORY)
+    results = []
+    with tempfile.TemporaryDirectory() as temp_directory:
+        environment = build_environment(args, temp_directory)
+        for settings in build_scenarios(args, temp_directory):
+            sys.stderr.write("scenario {}...\n".format(settings["name"]))
+            completed = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "bench.benchmark",
+                    "--run-scenario",
+                    json.dumps(settings),
+                ],
+                cwd=root_directory,
+                env=environment,
+                stdout=subprocess.PIPE,
+                check=True,
+            )
+            measures = json.loads(completed.stdout.decode().splitlines()[-1])
+            sys.stderr.write("  {}\n".format(json.dumps(measures)))
+            results.append(measures)
+
+    document = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline", "run_scenario")
+        },
+        "results": results,
+    }
+    return_code = 0
+    if args.baseline:
+        with open(args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        document["regressions"] = compare(results, baseline, args.tolerance)
+        if len(document["regressions"]) != 0:
+            return_code = 1
+    text = json.dumps(document, indent=4)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+    return return_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
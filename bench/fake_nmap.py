@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Faux binaire nmap pour les mesures de performances : aucune sonde n'est
+envoyee, une sortie XML enregistree est rejouee pour chaque machine
+demandee, avec des delais configurables.
+
+Configuration par variables d'environnement :
+    - FAKE_NMAP_XML : sortie XML de nmap (-oX) dont la premiere machine en
+      ligne sert de modele ; a defaut, modele integre (22, 80, 443/tcp)
+    - FAKE_NMAP_DELAY : duree fixe de chaque appel (secondes)
+    - FAKE_NMAP_HOST_DELAY : duree du scan de chaque machine (secondes)
+    - FAKE_NMAP_UP_RATIO : proportion des machines en ligne (0 a 1)
+
+:file fake_nmap.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import copy
+import ipaddress
+import os
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+
+# modele utilise sans sortie XML enregistree
+DEFAULT_HOST_XML = """<host>
+<status state="up" reason="syn-ack" reason_ttl="0"/>
+<address addr="0.0.0.0" addrtype="ipv4"/>
+<hostnames><hostname name="bench.local" type="PTR"/></hostnames>
+<ports>
+<port protocol="tcp" portid="22"><state state="open" reason="syn-ack"/>
+<service name="ssh" product="OpenSSH" version="8.2p1" conf="10">
+<cpe>cpe:/a:openbsd:openssh:8.2p1</cpe></service></port>
+<port protocol="tcp" portid="80"><state state="open" reason="syn-ack"/>
+<service name="http" product="nginx" version="1.18.0" conf="10">
+<cpe>cpe:/a:igor_sysoev:nginx:1.18.0</cpe></service></port>
+<port protocol="tcp" portid="443"><state state="open" reason="syn-ack"/>
+<service name="http" product="nginx" tunnel="ssl" conf="10"/></port>
+</ports>
+</host>"""
+# options de nmap suivies d'une valeur
+VALUE_OPTIONS = ("-oX", "-p", "--max-rate", "--max-parallelism")
+# proportion des machines en ligne par defaut
+DEFAULT_UP_RATIO = 0.25
+
+
+def load_template():
+    """
+    Chargement du modele de machine en ligne.
+
+    :param None
+    :return element <host> (ElementTree)
+    """
+    path = os.environ.get("FAKE_NMAP_XML")
+    if not path:
+        return ElementTree.fromstring(DEFAULT_HOST_XML)
+    for host in ElementTree.parse(path).getroot().iter("host"):
+        if host.find("status").get("state") == "up":
+            return host
+    raise ValueError("aucune machine en ligne dans {}".format(path))
+
+
+def parse_arguments(arguments):
+    """
+    Analyse de la ligne de commande nmap.
+
+    :param arguments : arguments de la ligne de commande
+    :return tuple : liste des cibles, ports demandes (str ou None),
+            options
+    """
+    hosts = []
+    ports = None
+    options = []
+    index = 0
+    while index < len(arguments):
+        argument = arguments[index]
+        if argument in VALUE_OPTIONS:
+            if argument == "-p":
+                ports = arguments[index + 1]
+            index += 2
+            continue
+        if argument.startswith("-"):
+            options.append(argument)
+        else:
+            hosts.append(argument)
+        index += 1
+    return hosts, ports, options
+
+
+def parse_ports(ports, protocol):
+    """
+    Analyse de la liste de ports demandes (syntaxe de l'option -p).
+
+    :param ports : ports demandes, ou None
+    :param protocol : protocole scanne ("tcp" ou "udp")
+    :return fonction indiquant si un port est demande
+    """
+    if ports is None:
+        return lambda port: True
+    intervals = []
+    current = protocol[0].upper()
+    for token in ports.split(","):
+        if token[:2] in ("T:", "U:"):
+            current, token = token[0], token[2:]
+        if current != protocol[0].upper():
+            continue
+        start, _, end = token.partition("-")
+        intervals.append((int(start), int(end or start)))
+    return lambda port: any(a <= port <= b for a, b in intervals)
+
+
+def is_up(address, up_ratio):
+    """
+    Etat (deterministe) d'une machine : une meme adresse est toujours en
+    ligne ou toujours hors-ligne.
+
+    :param address : adresse IP (ipaddress)
+    :param up_ratio : proportion des machines en ligne
+    :return booleen
+    """
+    return (int(address) * 2654435761) % 1000 < up_ratio * 1000
+
+
+def host_element(template, address, protocol, requested, ping_only):
+    """
+    Creation de l'element <host> d'une machine en ligne d'apres le modele.
+
+    :param template : element <host> modele
+    :param address : adresse IP (ipaddress)
+    :param protocol : protocole scanne ("tcp" ou "udp")
+    :param requested : fonction indiquant si un port est demande
+    :param ping_only : booleen indiquant un ping scan (-sn)
+    :return element <host>
+    """
+    host = copy.deepcopy(template)
+    for element in host.findall("address"):
+        if element.get("addrtype") != "mac":
+            host.remove(element)
+    host.insert(
+        1,
+        ElementTree.Element(
+            "address",
+            addr=str(address),
+            addrtype="ipv{}".format(address.version),
+        ),
+    )
+    ports = host.find("ports")
+    if ports is None:
+        return host
+    if ping_only:
+        host.remove(ports)
+        return host
+    for port in ports.findall("port"):
+        if port.get("protocol") != protocol or not requested(
+            int(port.get("portid"))
+        ):
+            ports.remove(port)
+    return host
+
+
+def main():
+    """
+    Rejeu de la sortie XML pour les machines demandees.
+
+    :param None
+    :return code de retour
+    """
+    arguments = sys.argv[1:]
+    # python-nmap verifie la version du binaire
+    if "-V" in arguments:
+        sys.stdout.write(
+            "Nmap version 7.80 ( https://nmap.org )\n"
+            "Platform: x86_64-pc-linux-gnu\n"
+        )
+        return 0
+    start_time = time.time()
+    delay = float(os.environ.get("FAKE_NMAP_DELAY", "0"))
+    host_delay = float(os.environ.get("FAKE_NMAP_HOST_DELAY", "0"))
+    up_ratio = float(os.environ.get("FAKE_NMAP_UP_RATIO", DEFAULT_UP_RATIO))
+    template = load_template()
+
+    hosts, ports, options = parse_arguments(arguments)
+    protocol = "udp" if "-sU" in options or "-sUV" in options else "tcp"
+    ping_only = "-sn" in options
+    requested = parse_ports(ports, protocol)
+    out = sys.stdout
+    out.write(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<nmaprun scanner="nmap" args="nmap {}" version="7.80">\n'.format(
+            " ".join(arguments)
+        )
+    )
+    time.sleep(delay)
+    total = 0
+    up = 0
+    for target in hosts:
+        for address in ipaddress.ip_network(target, strict=False):
+            total += 1
+            time.sleep(host_delay)
+            if not is_up(address, up_ratio):
+                continue
+            up += 1
+            element = host_element(
+                template, address, protocol, requested, ping_only
+            )
+            out.write(ElementTree.tostring(element, encoding="unicode"))
+            out.write("\n")
+            # chaque machine est affichee des qu'elle est scannee, comme le
+            # fait nmap
+            out.flush()
+    out.write(
+        '<runstats><finished elapsed="{:.2f}" exit="success"/>'
+        '<hosts up="{}" down="{}" total="{}"/></runstats>\n'
+        "</nmaprun>\n".format(time.time() - start_time, up, total - up, total)
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,7 +8,8 @@ composants.
 """
 
 import sys
-from src.dispatcher import launch_processes
+from src.daemon import run_daemon
+from src.dispatcher import launch_processes, run_worker
 from src.logs import set_logging
 from src.output import finalize
 from src.parsing import parse
@@ -25,11 +26,27 @@ def main():
     """
     try:
         stdout_handler, output_file_handler = set_logging()
-        soft, targets = parse()
+        soft, targets, options = parse()
+        if options["worker"] is not None:
+            run_worker(
+                options["worker"],
+                stdout_handler,
+                output_file_handler,
+                options["processes"],
+            )
+            return 0
+        if options["daemon"] is not None:
+            run_daemon(
+                options["daemon"],
+                stdout_handler,
+                output_file_handler,
+                options,
+            )
+            return 0
         targets_reports = launch_processes(
-            soft, targets, stdout_handler, output_file_handler
+            soft, targets, stdout_handler, output_file_handler, options
         )
-        finalize(targets_reports)
+        finalize(targets_reports, options["output_formats"])
     except Exception as exception:
         sys.stderr.write(
             "le programme a echoue avec l'erreur suivante : {}\n".format(
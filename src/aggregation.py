@@ -0,0 +1,313 @@
+"""
+Agregation incrementale des rapports de scan.
+
+:file aggregation.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import bisect
+import ipaddress
+
+
+class AddressIntervals:
+    """
+    Ensemble d'adresses IP stocke sous forme d'intervalles disjoints,
+    fusionnes au fur et a mesure des ajouts : la memoire occupee depend
+    du nombre de trous entre les adresses ajoutees, et non du nombre
+    d'adresses (un reseau entierement scanne tient en un intervalle).
+
+    :class AddressIntervals
+    """
+
+    def __init__(self):
+        """
+        Initialisation des objets de type AddressIntervals.
+
+        :param self : reference vers l'objet AddressIntervals parent
+        :return None
+        """
+        # par version d'IP : debuts et fins des intervalles, tries
+        self.starts = {4: [], 6: []}
+        self.ends = {4: [], 6: []}
+        self.count = 0
+
+    def add(self, ip_host):
+        """
+        Ajout d'une adresse, fusionnee avec les intervalles adjacents.
+
+        :param self : reference vers l'objet AddressIntervals parent
+        :param ip_host : adresse IP (str)
+        :return booleen indiquant si l'adresse etait absente
+        """
+        address = ipaddress.ip_address(ip_host)
+        value = int(address)
+        starts = self.starts[address.version]
+        ends = self.ends[address.version]
+        index = bisect.bisect_right(starts, value) - 1
+        if index >= 0 and ends[index] >= value:
+            return False
+        self.count += 1
+        merge_left = index >= 0 and ends[index] == value - 1
+        merge_right = (
+            index + 1 < len(starts) and starts[index + 1] == value + 1
+        )
+        if merge_left and merge_right:
+            ends[index] = ends[index + 1]
+            del starts[index + 1]
+            del ends[index + 1]
+        elif merge_left:
+            ends[index] = value
+        elif merge_right:
+            starts[index + 1] = value
+        else:
+            starts.insert(index + 1, value)
+            ends.insert(index + 1, value)
+        return True
+
+    def __len__(self):
+        return self.count
+
+
+class ReportAggregator:
+    """
+    Construction des rapports par cible au fur et a mesure de l'arrivee
+    des resultats : chaque rapport n'est parcouru qu'une seule fois, et
+    n'a pas besoin d'etre conserve apres son agregation.
+
+    :class ReportAggregator
+    """
+
+    def __init__(self, targets, transport_protocols, target_map, sinks=()):
+        """
+        Initialisation des objets de type ReportAggregator.
+
+        :param self : reference vers l'objet ReportAggregator parent
+        :param targets : liste de cibles scannees
+        :param transport_protocols : protocoles de transport scannes
+        :param target_map : correspondance entre les IP et leurs cibles
+                            d'origine (TargetMap)
+        :param sinks : sorties recevant chaque resultat des son agregation
+                       (objets munis d'une methode write, voir output.py)
+        :return None
+        """
+        self.transport_protocols = transport_protocols
+        self.target_map = target_map
+        self.sinks = list(sinks)
+        # index des machines par cible :
+        # {cible: {"seen": nombre de machines, "report": {ip/host: rapport},
+        #          "errors": erreurs propres a la cible}}
+        # seules les machines en ligne figurent dans "report". Le rapport
+        # d'une machine appartenant a plusieurs cibles est partage.
+        self.index = {
+            target: {"seen": 0, "report": {}, "errors": []}
+            for target in targets
+        }
+        # machines scannees, toutes cibles confondues : une machine n'est
+        # comptee qu'une fois dans ses cibles, meme si plusieurs requetes
+        # (protocoles, intervalles de ports) la concernent.
+        self.seen = AddressIntervals()
+        self.host_reports = {}
+
+    def mark_seen(self, ip_host):
+        """
+        Prise en compte d'une machine scannee dans toutes ses cibles.
+
+        :param self : reference vers l'objet ReportAggregator parent
+        :param ip_host : IP/hote de la machine
+        :return tuple des cibles d'origine de la machine
+        """
+        targets = self.target_map.owners(ip_host)
+        if self.seen.add(ip_host):
+            for target in targets:
+                self.index[target]["seen"] += 1
+        return targets
+
+    def add_down_host(self, ip_host):
+        """
+        Prise en compte d'une machine hors-ligne, qui n'a fait l'objet
+        d'aucun scan de ports.
+
+        :param self : reference vers l'objet ReportAggregator parent
+        :param ip_host : IP/hote de la machine
+        :return None
+        """
+        self.mark_seen(ip_host)
+
+    def add_target_error(self, target, message):
+        """
+        Prise en compte d'une erreur concernant une cible dans son
+        ensemble (nom d'hote qui n'a pas pu etre resolu, par exemple) :
+        sans elle, la cible apparaitrait comme un scan vide, sans erreur.
+
+        :param self : reference vers l'objet ReportAggregator parent
+        :param target : cible d'origine
+        :param message : message d'erreur
+        :return None
+        """
+        self.index[target]["errors"].append(message)
+
+    def get_host_report(self, targets, ip_host, target_type):
+        """
+        Recuperation (ou creation) du rapport d'une machine en ligne.
+
+        :param self : reference vers l'objet ReportAggregator parent
+        :param targets : cibles auxquelles appartient la machine
+        :param ip_host : IP/hote de la machine
+        :param target_type : type d'IP (4 ou 6)
+        :return rapport de la machine (dict)
+        """
+        if ip_host not in self.host_reports:
+            # pour chaque IP faisant partie d'une target
+            # (ipv4, ipv6, cidr...), on va stocker les
+            # informations dont on a besoin, c'est-a-dire
+            # le type d'IP (v4 ou v6), l'adresse MAC,
+            # les noms d'hotes, les ports ouverts, et les
+            # eventuelles erreurs rencontrees lors du scan.
+            host_report = {
+                "type": target_type,
+                "mac": None,
+                "hostnames": [],
+                "ports": {
+                    transport_protocol: {}
+                    for transport_protocol in self.transport_protocols
+                },
+                "errors": [],
+            }
+            self.host_reports[ip_host] = host_report
+            for target in targets:
+                self.index[target]["report"][ip_host] = host_report
+        return self.host_reports[ip_host]
+
+    def emit(self, targets, ip_host, host_report, transport_protocol, ports):
+        """
+        Transmission d'un resultat qui vient d'etre agrege aux sorties en
+        flux (JSON Lines, CSV...), une fois par cible d'origine.
+
+        :param self : reference vers l'objet ReportAggregator parent
+        :param targets : cibles auxquelles appartient la machine
+        :param ip_host : IP/hote de la machine
+        :param host_report : rapport agrege de la machine
+        :param transport_protocol : protocole de transport du resultat
+        :param ports : resultats des ports (PortResult)
+        :return None
+        """
+        if len(self.sinks) == 0:
+            return
+        for target in targets:
+            record = {
+                "target": target,
+                "ip_host": ip_host,
+                "type": host_report["type"],
+                "mac": host_report["mac"],
+                "hostnames": list(host_report["hostnames"]),
+                "transport_protocol": transport_protocol,
+                "ports": ports,
+            }
+            for sink in self.sinks:
+                sink.write(record)
+
+    def add(self, result):
+        """
+        Agregation du resultat d'une requete de scan pour une seule IP.
+
+        :param self : reference vers l'objet ReportAggregator parent
+        :param result : resultat de scan (HostResult)
+        :return None
+        """
+        metadata = result.metadata
+        ip_host = result.ip_host
+        targets = self.mark_seen(ip_host)
+
+        # seules les machines scannees comme "up" figurent dans le rapport
+        if not result.up:
+            return
+        host_report = self.get_host_report(
+            targets, ip_host, metadata["target_type"]
+        )
+
+        # stockage des erreurs et des avertissements
+        # dans les metadonnees liees a la cible courante.
+        for messages in (result.errors, result.warnings):
+            if messages:
+                host_report["errors"].append(messages)
+
+        # stockage des informations concernant les ports TCP et UDP
+        protocol_ports = host_report["ports"].setdefault(
+            metadata["transport_protocol"], {}
+        )
+        for port_result in result.ports:
+            protocol_ports[port_result.port] = port_result
+
+        # stockage de l'adresse MAC si elle est presente
+        if result.mac is not None:
+            host_report["mac"] = result.mac
+
+        # stockage des eventuels noms d'hote
+        for hostname in result.hostnames:
+            if hostname not in host_report["hostnames"]:
+                host_report["hostnames"].append(hostname)
+
+        self.emit(
+            targets,
+            ip_host,
+            host_report,
+            metadata["transport_protocol"],
+            result.ports,
+        )
+
+    def merge_cached_host(self, ip_host, target_type, host, ports):
+        """
+        Agregation des resultats d'une machine en ligne provenant du cache
+        (voir ResultCache), pour les ports qui ne sont pas rescannes.
+
+        :param self : reference vers l'objet ReportAggregator parent
+        :param ip_host : IP/hote de la machine
+        :param target_type : type d'IP (4 ou 6)
+        :param host : etat de la machine {"mac", "hostnames"}
+        :param ports : resultats des ports {protocole: {port: PortResult}}
+        :return None
+        """
+        targets = self.mark_seen(ip_host)
+        host_report = self.get_host_report(targets, ip_host, target_type)
+        for transport_protocol, protocol_ports in ports.items():
+            host_report["ports"].setdefault(transport_protocol, {}).update(
+                protocol_ports
+            )
+        if host["mac"] is not None:
+            host_report["mac"] = host["mac"]
+        for hostname in host["hostnames"]:
+            if hostname not in host_report["hostnames"]:
+                host_report["hostnames"].append(hostname)
+        for transport_protocol, protocol_ports in ports.items():
+            self.emit(
+                targets,
+                ip_host,
+                host_report,
+                transport_protocol,
+                tuple(protocol_ports.values()),
+            )
+
+    def build(self):
+        """
+        Creation des rapports par cible et du resume global.
+
+        :param self : reference vers l'objet ReportAggregator parent
+        :return tuple : rapports par cible, nombre total de machines
+                scannees, nombre de machines en ligne (une machine
+                appartenant a plusieurs cibles n'est comptee qu'une fois)
+        """
+        reports = {}
+        for target, target_index in self.index.items():
+            # le summary d'une cible contient quelques informations
+            # telles que le nombre de machines scannees, le nombre
+            # de machines en marche.
+            reports[target] = {
+                "report": target_index["report"],
+                "summary": {
+                    "totalhosts": target_index["seen"],
+                    "uphosts": len(target_index["report"]),
+                    "errors": target_index["errors"],
+                },
+            }
+        return reports, len(self.seen), len(self.host_reports)
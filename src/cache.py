@@ -0,0 +1,319 @@
+"""
+Cache persistant des resultats de scan (SQLite), permettant de ne
+rescanner que les machines et les ports dont les resultats sont perimes.
+
+:file cache.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import json
+import sqlite3
+import time
+from .model import PortResult
+from .ports import PortSet
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    ip TEXT PRIMARY KEY,
+    type INTEGER,
+    up INTEGER NOT NULL,
+    mac TEXT,
+    hostnames TEXT NOT NULL,
+    scanned_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ports (
+    ip TEXT NOT NULL,
+    protocol TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    info TEXT NOT NULL,
+    scanned_at REAL NOT NULL,
+    PRIMARY KEY (ip, protocol, port)
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    ip TEXT NOT NULL,
+    protocol TEXT NOT NULL,
+    first_port INTEGER NOT NULL,
+    last_port INTEGER NOT NULL,
+    scanned_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_host ON coverage (ip, protocol);
+CREATE TABLE IF NOT EXISTS names (
+    name TEXT PRIMARY KEY,
+    addresses TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+# nombre maximal d'IP d'une requete portant sur plusieurs machines (les
+# anciennes versions de SQLite limitent une requete a 999 parametres)
+MAX_QUERY_HOSTS = 900
+
+
+def placeholders(values):
+    """
+    Marqueurs de parametres d'une clause IN.
+
+    :param values : liste des valeurs
+    :return chaine de caracteres, ex : "?, ?, ?"
+    """
+    return ", ".join("?" * len(values))
+
+
+class ResultCache:
+    """
+    Stockage sur disque des resultats de scan : etat de chaque machine,
+    informations de chaque port (cle : IP, protocole, port), et
+    intervalles de ports effectivement scannes, le tout horodate.
+
+    Les resolutions DNS des cibles designees par un nom d'hote y sont
+    egalement conservees jusqu'a leur expiration.
+
+    Les intervalles scannes permettent de distinguer un port ferme (scanne
+    recemment, absent des resultats) d'un port jamais scanne.
+
+    :class ResultCache
+    """
+
+    def __init__(self, path):
+        """
+        Initialisation des objets de type ResultCache.
+
+        :param self : reference vers l'objet ResultCache parent
+        :param path : chemin de la base SQLite
+        :return None
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+        # une instance correspond a un scan : les etats de machine
+        # enregistres depuis son ouverture sont fusionnes (voir record_host)
+        self.opened_at = time.time()
+
+    def close(self):
+        """
+        Fermeture de la base, en validant les dernieres ecritures.
+
+        :param self : reference vers l'objet ResultCache parent
+        :return None
+        """
+        self.connection.commit()
+        self.connection.close()
+
+    def commit(self):
+        """
+        Validation des ecritures en attente.
+
+        :param self : reference vers l'objet ResultCache parent
+        :return None
+        """
+        self.connection.commit()
+
+    def record_host(self, ip_host, target_type, up, mac=None, hostnames=()):
+        """
+        Enregistrement de l'etat d'une machine. Au sein d'un meme scan, une
+        machine vue en ligne par une requete le reste, meme si une autre
+        requete (autre protocole, autre intervalle de ports) ne l'a pas
+        trouvee : l'etat est fusionne par un OU, et l'adresse MAC et les
+        noms d'hote deja connus sont conserves.
+
+        :param self : reference vers l'objet ResultCache parent
+        :param ip_host : IP de la machine
+        :param target_type : type d'IP (4 ou 6)
+        :param up : booleen indiquant si la machine est en ligne
+        :param mac : adresse MAC de la machine (ou None)
+        :param hostnames : noms d'hote de la machine
+        :return None
+        """
+        self.connection.execute(
+            "INSERT INTO hosts VALUES (:ip, :type, :up, :mac, :names, :now) "
+            "ON CONFLICT (ip) DO UPDATE SET "
+            "type = excluded.type, "
+            "up = CASE WHEN scanned_at >= :opened_at "
+            "THEN max(up, excluded.up) ELSE excluded.up END, "
+            "mac = CASE WHEN scanned_at >= :opened_at "
+            "THEN coalesce(excluded.mac, mac) ELSE excluded.mac END, "
+            "hostnames = CASE WHEN scanned_at >= :opened_at "
+            "AND excluded.hostnames = '[]' "
+            "THEN hostnames ELSE excluded.hostnames END, "
+            "scanned_at = excluded.scanned_at",
+            {
+                "ip": ip_host,
+                "type": target_type,
+                "up": int(up),
+                "mac": mac,
+                "names": json.dumps(list(hostnames)),
+                "now": time.time(),
+                "opened_at": self.opened_at,
+            },
+        )
+
+    def record(self, result):
+        """
+        Enregistrement du resultat d'une requete pour une seule IP : les
+        ports de l'intervalle scanne sont remplaces par les nouveaux
+        resultats, et l'intervalle est marque comme scanne. Une machine
+        hors-ligne n'a fait l'objet d'aucun scan de ports : seul son etat
+        est enregistre.
+
+        :param self : reference vers l'objet ResultCache parent
+        :param result : resultat de scan (HostResult)
+        :return None
+        """
+        metadata = result.metadata
+        ip_host = result.ip_host
+        protocol = metadata["transport_protocol"]
+        now = time.time()
+        self.record_host(
+            ip_host,
+            metadata["target_type"],
+            result.up,
+            result.mac,
+            result.hostnames,
+        )
+
+        # sans intervalle explicite (ports choisis par nmap), on ne peut
+        # pas savoir quels ports ont ete couverts.
+        if not result.up or metadata["port_range"] is None:
+            return
+        port_set = PortSet.from_nmap(metadata["port_range"])
+        for start, end in port_set.intervals:
+            self.connection.execute(
+                "DELETE FROM ports WHERE ip = ? AND protocol = ? "
+                "AND port BETWEEN ? AND ?",
+                (ip_host, protocol, start, end),
+            )
+            # les intervalles plus anciens entierement recouverts sont
+            # inutiles : on evite ainsi que la table ne grossisse a
+            # chaque scan.
+            self.connection.execute(
+                "DELETE FROM coverage WHERE ip = ? AND protocol = ? "
+                "AND first_port >= ? AND last_port <= ?",
+                (ip_host, protocol, start, end),
+            )
+            self.connection.execute(
+                "INSERT INTO coverage VALUES (?, ?, ?, ?, ?)",
+                (ip_host, protocol, start, end, now),
+            )
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO ports VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    ip_host,
+                    protocol,
+                    port_result.port,
+                    json.dumps(port_result.to_dict()),
+                    now,
+                )
+                for port_result in result.ports
+            ),
+        )
+
+    def lookup_hosts(self, ip_hosts, min_time):
+        """
+        Recuperation de l'etat d'un ensemble de machines, en une seule
+        requete, pour celles dont l'etat est suffisamment recent.
+
+        :param self : reference vers l'objet ResultCache parent
+        :param ip_hosts : liste d'IP (au plus MAX_QUERY_HOSTS)
+        :param min_time : date minimale des resultats (timestamp)
+        :return dictionnaire {IP: {"up", "mac", "hostnames"}}
+        """
+        rows = self.connection.execute(
+            "SELECT ip, up, mac, hostnames FROM hosts "
+            "WHERE scanned_at >= ? AND ip IN ({})".format(
+                placeholders(ip_hosts)
+            ),
+            [min_time] + list(ip_hosts),
+        )
+        return {
+            ip_host: {
+                "up": bool(up),
+                "mac": mac,
+                "hostnames": json.loads(hostnames),
+            }
+            for ip_host, up, mac, hostnames in rows
+        }
+
+    def fresh_ports(self, ip_hosts, protocol, min_time):
+        """
+        Recuperation des ports scannes recemment pour un ensemble de
+        machines, en une seule requete.
+
+        :param self : reference vers l'objet ResultCache parent
+        :param ip_hosts : liste d'IP (au plus MAX_QUERY_HOSTS)
+        :param protocol : protocole de transport ("T" ou "U")
+        :param min_time : date minimale des resultats (timestamp)
+        :return dictionnaire {IP: ports scannes depuis min_time (PortSet)},
+                sans les machines n'ayant aucun port scanne recemment
+        """
+        rows = self.connection.execute(
+            "SELECT ip, first_port, last_port FROM coverage "
+            "WHERE protocol = ? AND scanned_at >= ? AND ip IN ({})".format(
+                placeholders(ip_hosts)
+            ),
+            [protocol, min_time] + list(ip_hosts),
+        )
+        intervals = {}
+        for ip_host, first_port, last_port in rows:
+            intervals.setdefault(ip_host, []).append((first_port, last_port))
+        return {
+            ip_host: PortSet(host_intervals)
+            for ip_host, host_intervals in intervals.items()
+        }
+
+    def lookup_ports(self, ip_hosts, protocol):
+        """
+        Recuperation des informations des ports d'un ensemble de machines,
+        en une seule requete.
+
+        :param self : reference vers l'objet ResultCache parent
+        :param ip_hosts : liste d'IP (au plus MAX_QUERY_HOSTS)
+        :param protocol : protocole de transport ("T" ou "U")
+        :return dictionnaire {IP: {port: PortResult}}
+        """
+        rows = self.connection.execute(
+            "SELECT ip, port, info FROM ports "
+            "WHERE protocol = ? AND ip IN ({})".format(placeholders(ip_hosts)),
+            [protocol] + list(ip_hosts),
+        )
+        ports = {}
+        for ip_host, port, info in rows:
+            ports.setdefault(ip_host, {})[port] = PortResult.from_dict(
+                port, json.loads(info)
+            )
+        return ports
+
+    def record_name(self, name, addresses, expires_at):
+        """
+        Enregistrement de la resolution d'un nom d'hote.
+
+        :param self : reference vers l'objet ResultCache parent
+        :param name : nom d'hote
+        :param addresses : adresses IP du nom d'hote
+        :param expires_at : date d'expiration de la resolution (timestamp)
+        :return None
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO names VALUES (?, ?, ?)",
+            (name, json.dumps(list(addresses)), expires_at),
+        )
+
+    def lookup_name(self, name, now):
+        """
+        Recuperation de la resolution d'un nom d'hote, si elle n'a pas
+        expire.
+
+        :param self : reference vers l'objet ResultCache parent
+        :param name : nom d'hote
+        :param now : date courante (timestamp)
+        :return tuple (liste d'adresses, date d'expiration), ou None
+        """
+        row = self.connection.execute(
+            "SELECT addresses, expires_at FROM names "
+            "WHERE name = ? AND expires_at > ?",
+            (name, now),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
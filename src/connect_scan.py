@@ -0,0 +1,265 @@
+"""
+Moteur de scan TCP connect() asynchrone, execute dans le processus principal.
+
+:file connect_scan.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import asyncio
+import logging
+import time
+
+try:
+    import resource
+except ImportError:
+    # le module resource n'existe pas sous Windows : on ne pourra alors
+    # pas ajuster la limite de descripteurs de fichiers.
+    resource = None
+
+# nombre de descripteurs de fichiers gardes en reserve pour le reste
+# du programme (logs, pipes du multiprocessing, fichiers de sortie...).
+RESERVED_FILE_DESCRIPTORS = 256
+
+
+def adjust_concurrency(concurrency):
+    """
+    Augmentation de la limite de descripteurs de fichiers ouverts, et
+    ajustement du nombre de connexions simultanees en consequence.
+
+    :param concurrency : nombre de connexions simultanees souhaite
+    :return nombre de connexions simultanees reellement utilisable
+    """
+    if resource is None:
+        return concurrency
+    soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = concurrency + RESERVED_FILE_DESCRIPTORS
+    if soft_limit != resource.RLIM_INFINITY and soft_limit < wanted:
+        if hard_limit == resource.RLIM_INFINITY:
+            new_soft_limit = wanted
+        else:
+            new_soft_limit = min(wanted, hard_limit)
+        try:
+            resource.setrlimit(
+                resource.RLIMIT_NOFILE, (new_soft_limit, hard_limit)
+            )
+            soft_limit = new_soft_limit
+        except (ValueError, OSError):
+            logging.warning(
+                "impossible d'augmenter la limite de descripteurs "
+                "de fichiers ({})".format(soft_limit)
+            )
+    if soft_limit == resource.RLIM_INFINITY:
+        return concurrency
+    return max(1, min(concurrency, soft_limit - RESERVED_FILE_DESCRIPTORS))
+
+
+async def probe_port(ip_host, port, timeout):
+    """
+    Tentative de connexion TCP sur un port.
+
+    :param ip_host : adresse IP a tester
+    :param port : numero de port a tester
+    :param timeout : duree maximale d'attente de la connexion (secondes)
+    :return etat du port : "open", "closed" ou "filtered"
+    """
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(ip_host, port), timeout
+        )
+    except ConnectionRefusedError:
+        # un RST a ete recu : la machine est en ligne, le port est ferme
+        return "closed"
+    except (OSError, asyncio.TimeoutError):
+        return "filtered"
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return "open"
+
+
+async def scan_hosts(
+    iter_ip_hosts,
+    ports,
+    concurrency,
+    timeout,
+    max_rate=0,
+    max_host_probes=0,
+    probe=probe_port,
+):
+    """
+    Scan de l'ensemble des couples (IP, port) avec un nombre borne de
+    connexions simultanees, un debit de connexions borne et un nombre
+    borne de connexions simultanees par machine.
+
+    :param iter_ip_hosts : fonction renvoyant un generateur des adresses IP
+                           a scanner (appelee une fois par port)
+    :param ports : ports a scanner
+    :param concurrency : nombre maximal de connexions simultanees
+    :param timeout : duree maximale d'attente d'une connexion (secondes)
+    :param max_rate : nombre maximal de connexions par seconde (0 :
+                      illimite)
+    :param max_host_probes : nombre maximal de connexions simultanees par
+                             machine (0 : illimite)
+    :param probe : coroutine de test d'un port (ip, port, timeout),
+                   renvoyant "open", "closed" ou "filtered" (connexion TCP
+                   par defaut, voir udp_scan.py pour UDP)
+    :return dictionnaire {ip: {"up": bool, "open": list(int)}}, limite aux
+            machines ayant repondu
+    """
+    # seules les machines ayant repondu sont stockees : les autres sont
+    # considerees hors-ligne, sans occuper de memoire.
+    results = {}
+    semaphore = asyncio.BoundedSemaphore(concurrency)
+    pending = set()
+    # semaphores des machines ayant des connexions en cours :
+    # {ip: [semaphore, nombre de connexions en cours ou en attente]}
+    host_slots = {}
+    loop = asyncio.get_running_loop()
+    next_send_time = loop.time()
+
+    async def probe_host(ip_host, port):
+        if max_host_probes == 0:
+            return await probe(ip_host, port, timeout)
+        if ip_host not in host_slots:
+            host_slots[ip_host] = [asyncio.Semaphore(max_host_probes), 0]
+        slot = host_slots[ip_host]
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                return await probe(ip_host, port, timeout)
+        finally:
+            slot[1] -= 1
+            # le semaphore d'une machine ne survit pas a ses connexions
+            if slot[1] == 0:
+                del host_slots[ip_host]
+
+    async def probe_task(ip_host, port):
+        try:
+            state = await probe_host(ip_host, port)
+        finally:
+            semaphore.release()
+        if state == "filtered":
+            return
+        if ip_host not in results:
+            results[ip_host] = {"up": True, "open": []}
+        if state == "open":
+            results[ip_host]["open"].append(port)
+
+    # les taches sont creees au fur et a mesure que des places se liberent
+    # dans le semaphore : on ne garde ainsi jamais plus de "concurrency"
+    # coroutines en memoire. Le parcours se fait port par port (et non
+    # machine par machine) pour repartir les connexions sur les cibles.
+    for port in ports:
+        for ip_host in iter_ip_hosts():
+            await semaphore.acquire()
+            if max_rate:
+                # les connexions sont espacees regulierement ; l'attente
+                # n'a lieu que si l'on est en avance sur le debit vise.
+                now = loop.time()
+                if next_send_time > now:
+                    await asyncio.sleep(next_send_time - now)
+                next_send_time = max(next_send_time, now) + 1 / max_rate
+            task = asyncio.ensure_future(probe_task(ip_host, port))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.gather(*pending)
+
+    for host_result in results.values():
+        host_result["open"].sort()
+    return results
+
+
+def build_report(ip_host, target_type, host_result, elapsed):
+    """
+    Creation d'un rapport ayant la meme forme que ceux de python-nmap,
+    afin qu'il soit utilisable par NmapScan.build_targets_reports.
+
+    :param ip_host : adresse IP scannee
+    :param target_type : version IP (4 ou 6)
+    :param host_result : resultat de scan_hosts pour cette adresse
+    :param elapsed : duree du scan (secondes)
+    :return rapport de scan (dict)
+    """
+    uphosts = 1 if host_result["up"] else 0
+    report = {
+        "nmap": {
+            "command_line": "",
+            "scaninfo": {},
+            "scanstats": {
+                "timestr": time.ctime(),
+                "elapsed": "{:.2f}".format(elapsed),
+                "uphosts": str(uphosts),
+                "downhosts": str(1 - uphosts),
+                "totalhosts": "1",
+            },
+        },
+        "scan": {},
+    }
+    if host_result["up"]:
+        report["scan"][ip_host] = {
+            "hostnames": [],
+            "addresses": {"ipv{}".format(target_type): ip_host},
+            "vendor": {},
+            "status": {"state": "up", "reason": "connect"},
+            "tcp": {
+                port: {
+                    "state": "open",
+                    "reason": "syn-ack",
+                    "name": "",
+                    "product": "",
+                    "version": "",
+                    "extrainfo": "",
+                    "conf": "",
+                    "cpe": "",
+                }
+                for port in host_result["open"]
+            },
+        }
+    return report
+
+
+def run_connect_scan(
+    iter_ip_hosts,
+    hosts_count,
+    ports,
+    concurrency,
+    timeout,
+    max_rate=0,
+    max_host_probes=0,
+):
+    """
+    Lancement du scan connect() dans une boucle d'evenements asyncio.
+
+    :param iter_ip_hosts : fonction renvoyant un generateur des adresses IP
+                           a scanner
+    :param hosts_count : nombre d'adresses IP a scanner
+    :param ports : ports a scanner
+    :param concurrency : nombre maximal de connexions simultanees
+    :param timeout : duree maximale d'attente d'une connexion (secondes)
+    :param max_rate : nombre maximal de connexions par seconde (0 :
+                      illimite)
+    :param max_host_probes : nombre maximal de connexions simultanees par
+                             machine (0 : illimite)
+    :return tuple : resultats de scan_hosts, duree du scan (secondes)
+    """
+    concurrency = adjust_concurrency(concurrency)
+    logging.info(
+        "scan connect() de {} machine(s) sur {} port(s), {} connexions "
+        "simultanees".format(hosts_count, len(ports), concurrency)
+    )
+    start_time = time.time()
+    results = asyncio.run(
+        scan_hosts(
+            iter_ip_hosts,
+            ports,
+            concurrency,
+            timeout,
+            max_rate=max_rate,
+            max_host_probes=max_host_probes,
+        )
+    )
+    return results, time.time() - start_time
@@ -0,0 +1,1051 @@
+"""
+Mode daemon : le pool de processus, la journalisation et l'environnement
+de templating sont initialises une seule fois, et les scans sont soumis
+par une API HTTP locale (port TCP ou socket Unix), qui echange du JSON.
+
+    - POST /jobs : soumission d'un scan, ex : {"targets": ["10.0.0.0/24"],
+      "ports": "22,80", "discovery": true} (voir JOB_FLAGS et JOB_VALUES) ;
+      renvoie l'etat du scan, dont son identifiant ;
+    - GET /jobs : etat de tous les scans ;
+    - GET /jobs/<id> : etat d'un scan (queued, running, done, failed) et
+      progression de sa phase en cours ;
+    - GET /jobs/<id>/results : resultats au format JSON Lines, transmis au
+      fil de l'eau jusqu'a la fin du scan ;
+    - GET /jobs/<id>/report : rapport du scan termine, en JSON, ou en html
+      avec ?format=html ;
+    - DELETE /jobs/<id> : suppression d'un scan en attente ou termine.
+
+Les scans s'executent simultanement (DAEMON_MAX_JOBS au plus) et se
+partagent le pool de processus a tour de role (voir SharedPool).
+
+:file daemon.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import collections
+import datetime
+import functools
+import hmac
+import http.server
+import json
+import logging
+import os
+import queue
+import shutil
+import signal
+import socketserver
+import stat
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+from .cache import ResultCache
+from .config import config_dict
+from .dispatcher import NmapScan, build_nmap_options, create_pool
+from .distributed import parse_address
+from .logs import multiprocessing_logger_init
+from .output import finalize, format_record, get_template, open_stream_writers
+from .parsing import JobArgumentParser, parse
+
+# champs booleens d'une soumission de scan, et options correspondantes
+JOB_FLAGS = {
+    "soft": "--soft",
+    "discovery": "--discovery",
+    "incremental": "--incremental",
+}
+# champs a valeur d'une soumission de scan, et options correspondantes ;
+# les options propres au daemon (processus, debit) ne sont pas modifiables
+# par un scan.
+JOB_VALUES = {
+    "ports": "--ports",
+    "exclude_ports": "--exclude-ports",
+    "top_ports": "--top-ports",
+    "engine": "--engine",
+    "udp_engine": "--udp-engine",
+    "batch_size": "--batch-size",
+    "max_host_tasks": "--max-host-tasks",
+    "cache_ttl": "--cache-ttl",
+}
+# taille maximale du corps d'une requete (octets)
+MAX_REQUEST_SIZE = 1024 * 1024
+
+
+def build_job_arguments(request):
+    """
+    Conversion d'une soumission de scan en arguments de la ligne de
+    commande, analyses ensuite comme ceux d'un scan classique.
+
+    :param request : soumission (dict JSON)
+    :return liste d'arguments
+    """
+    if not isinstance(request, dict):
+        raise ValueError("objet JSON attendu")
+    fields = set(JOB_FLAGS) | set(JOB_VALUES) | {"targets", "output_formats"}
+    unknown = set(request) - fields
+    if unknown:
+        raise ValueError("champ(s) inconnu(s) : {}".format(sorted(unknown)))
+
+    def check_values(name, values):
+        # aucune valeur ne doit pouvoir etre lue comme une option
+        if (
+            not isinstance(values, list)
+            or len(values) == 0
+            or not all(
+                isinstance(value, str) and value and value[0] != "-"
+                for value in values
+            )
+        ):
+            raise ValueError("{} : liste de chaines attendue".format(name))
+        return values
+
+    arguments = ["--targets"] + check_values("targets", request.get("targets"))
+    for field, option in JOB_FLAGS.items():
+        if request.get(field):
+            arguments.append(option)
+    for field, option in JOB_VALUES.items():
+        if request.get(field) is not None:
+            arguments.append("{}={}".format(option, request[field]))
+    if "output_formats" in request:
+        arguments.append("--output-formats")
+        arguments += check_values("output_formats", request["output_formats"])
+    return arguments
+
+
+class PoolClient:
+    """
+    Acces d'un scan au pool partage, dans l'interface de
+    multiprocessing.Pool utilisee par NmapScan. Les methodes close et
+    join ne concernent que le scan : le pool reste actif.
+
+    :class PoolClient
+    """
+
+    def __init__(self, shared_pool):
+        """
+        Initialisation des objets de type PoolClient.
+
+        :param self : reference vers l'objet PoolClient parent
+        :param shared_pool : pool partage (SharedPool)
+        :return None
+        """
+        self.shared_pool = shared_pool
+        # requetes en attente d'une place dans le pool :
+        # (fonction d'execution, requete, file des resultats)
+        self.pending = collections.deque()
+
+    def imap_unordered(self, runner, iterable):
+        """
+        Execution des requetes par le pool partage.
+
+        :param self : reference vers l'objet PoolClient parent
+        :param runner : fonction d'execution des requetes (run_timed)
+        :param iterable : requetes
+        :return generateur des resultats, dans l'ordre ou ils arrivent
+        """
+        results = queue.Queue()
+        # nombre de requetes, connu une fois l'iterable epuise
+        total = []
+
+        def feed():
+            # l'iterable peut bloquer (file de requetes bornee) : il est
+            # parcouru par un thread dedie, comme dans multiprocessing.
+            count = 0
+            try:
+                for item in iterable:
+                    with self.shared_pool.lock:
+                        self.pending.append((runner, item, results))
+                    count += 1
+                    self.shared_pool.dispatch()
+            except Exception as exception:
+                results.put(exception)
+            total.append(count)
+            results.put(None)
+
+        self.shared_pool.register(self)
+        threading.Thread(target=feed, daemon=True).start()
+        try:
+            received = 0
+            while len(total) == 0 or received < total[0]:
+                item = results.get()
+                if item is None:
+                    continue
+                if isinstance(item, Exception):
+                    raise item
+                received += 1
+                yield item
+        finally:
+            self.shared_pool.unregister(self)
+
+    def close(self):
+        """
+        Fin du scan : le pool partage reste actif.
+
+        :param self : reference vers l'objet PoolClient parent
+        :return None
+        """
+
+    def join(self):
+        """
+        Fin du scan : toutes ses requetes sont deja terminees.
+
+        :param self : reference vers l'objet PoolClient parent
+        :return None
+        """
+
+    def terminate(self):
+        """
+        Interruption du scan : ses requetes en attente sont abandonnees.
+
+        :param self : reference vers l'objet PoolClient parent
+        :return None
+        """
+        with self.shared_pool.lock:
+            self.pending.clear()
+
+
+class SharedPool:
+    """
+    Pool de processus partage entre les scans du daemon. Les requetes de
+    chaque scan attendent dans une file propre (PoolClient) ; chaque place
+    liberee dans le pool est attribuee a tour de role aux scans ayant des
+    requetes en attente, de sorte qu'un scan volumineux ne retarde pas les
+    petits scans soumis apres lui.
+
+    :class SharedPool
+    """
+
+    def __init__(self, pool, processes):
+        """
+        Initialisation des objets de type SharedPool.
+
+        :param self : reference vers l'objet SharedPool parent
+        :param pool : pool de processus (multiprocessing.Pool)
+        :param processes : nombre de processus du pool
+        :return None
+        """
+        self.pool = pool
+        self.processes = processes
+        self.lock = threading.Lock()
+        # scans ayant une execution de requetes en cours, a tour de role
+        self.clients = collections.deque()
+        # requetes confiees au pool et non terminees
+        self.running = 0
+
+    def client(self):
+        """
+        Creation d'un acces au pool pour un nouveau scan.
+
+        :param self : reference vers l'objet SharedPool parent
+        :return acces au pool (PoolClient)
+        """
+        return PoolClient(self)
+
+    def register(self, client):
+        """
+        Prise en compte d'un scan dans le tour de role.
+
+        :param self : reference vers l'objet SharedPool parent
+        :param client : acces au pool du scan
+        :return None
+        """
+        with self.lock:
+            self.clients.append(client)
+
+    def unregister(self, client):
+        """
+        Retrait d'un scan du tour de role.
+
+        :param self : reference vers l'objet SharedPool parent
+        :param client : acces au pool du scan
+        :return None
+        """
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+
+    def dispatch(self):
+        """
+        Attribution des places libres du pool aux requetes en attente, un
+        scan apres l'autre. Seules les requetes en cours d'execution sont
+        confiees au pool : aucune file ne s'y accumule.
+
+        :param self : reference vers l'objet SharedPool parent
+        :return None
+        """
+        with self.lock:
+            while self.running < self.processes:
+                client = self.next_client()
+                if client is None:
+                    return
+                runner, item, results = client.pending.popleft()
+                self.running += 1
+                self.pool.apply_async(
+                    runner,
+                    (item,),
+                    callback=functools.partial(self.complete, results),
+                    error_callback=functools.partial(self.fail, results, item),
+                )
+
+    def next_client(self):
+        """
+        Scan suivant du tour de role ayant des requetes en attente (le
+        verrou doit etre detenu).
+
+        :param self : reference vers l'objet SharedPool parent
+        :return acces au pool du scan (PoolClient), ou None
+        """
+        for _ in range(len(self.clients)):
+            client = self.clients[0]
+            self.clients.rotate(-1)
+            if client.pending:
+                return client
+        return None
+
+    def complete(self, results, result):
+        """
+        Fin d'une requete : son resultat est transmis au scan, et sa place
+        attribuee a une autre requete.
+
+        :param self : reference vers l'objet SharedPool parent
+        :param results : file des resultats du scan
+        :param result : resultat de la requete (voir run_timed)
+        :return None
+        """
+        with self.lock:
+            self.running -= 1
+        results.put(result)
+        self.dispatch()
+
+    def fail(self, results, item, exception):
+        """
+        Echec d'une requete hors de run_timed (transmission au pool),
+        renvoye comme le ferait run_timed.
+
+        :param self : reference vers l'objet SharedPool parent
+        :param results : file des resultats du scan
+        :param item : requete (fonction, argument, date de mise en file)
+        :param exception : exception levee
+        :return None
+        """
+        _, argument, queued_at = item
+        now = time.time()
+        self.complete(
+            results,
+            (
+                None,
+                {
+                    "queued_at": queued_at,
+                    "error": str(exception),
+                    "task": argument,
+                    "start": now,
+                    "end": now,
+                    "stages": {},
+                },
+            ),
+        )
+
+
+class ResultStream:
+    """
+    Sortie en flux ecrite dans un fichier propre au scan : les resultats
+    agreges sont transmis aux clients de l'API au fur et a mesure (voir
+    ReportAggregator.emit), sans etre conserves en memoire jusqu'a
+    l'oubli du scan.
+
+    :class ResultStream
+    """
+
+    def __init__(self, path):
+        """
+        Initialisation des objets de type ResultStream.
+
+        :param self : reference vers l'objet ResultStream parent
+        :param path : chemin du fichier des resultats
+        :return None
+        """
+        self.path = path
+        self.output_file = open(path, "w")
+        self.condition = threading.Condition()
+        # nombre de lignes ecrites, et nombre de lignes ecrites sur disque
+        # (seules ces dernieres sont lues par les clients)
+        self.written = 0
+        self.count = 0
+        self.closed = False
+
+    def write(self, record):
+        """
+        Ajout d'un resultat.
+
+        :param self : reference vers l'objet ResultStream parent
+        :param record : resultat agrege (voir ReportAggregator.emit)
+        :return None
+        """
+        self.output_file.write(format_record(record) + "\n")
+        self.written += 1
+
+    def flush(self):
+        """
+        Ecriture sur disque des nouveaux resultats et signalement aux
+        clients en attente.
+
+        :param self : reference vers l'objet ResultStream parent
+        :return None
+        """
+        with self.condition:
+            self.output_file.flush()
+            self.count = self.written
+            self.condition.notify_all()
+
+    def close(self):
+        """
+        Fin du scan : les clients recoivent les derniers resultats.
+
+        :param self : reference vers l'objet ResultStream parent
+        :return None
+        """
+        with self.condition:
+            if not self.output_file.closed:
+                self.output_file.close()
+            self.count = self.written
+            self.closed = True
+            self.condition.notify_all()
+
+    def remove(self):
+        """
+        Suppression du fichier des resultats, a l'oubli du scan. Les
+        clients qui le lisent encore conservent leur acces au fichier.
+
+        :param self : reference vers l'objet ResultStream parent
+        :return None
+        """
+        self.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def iter_lines(self):
+        """
+        Generateur des resultats (lignes JSON), depuis le debut du scan et
+        jusqu'a sa fin. Seules les lignes signalees par flush, donc
+        completes, sont lues.
+
+        :param self : reference vers l'objet ResultStream parent
+        :return generateur de lignes JSON
+        """
+        index = 0
+        with open(self.path) as input_file:
+            while True:
+                with self.condition:
+                    self.condition.wait_for(
+                        lambda: index < self.count or self.closed
+                    )
+                    count = self.count
+                    closed = self.closed
+                for _ in range(count - index):
+                    yield input_file.readline().rstrip("\n")
+                index = count
+                if closed:
+                    return
+
+
+class ScanJob:
+    """
+    Scan soumis au daemon.
+
+    :class ScanJob
+    """
+
+    def __init__(self, request, soft, targets, options, spool_directory):
+        """
+        Initialisation des objets de type ScanJob.
+
+        :param self : reference vers l'objet ScanJob parent
+        :param request : soumission du scan (dict JSON)
+        :param soft : booleen indiquant le type de scan
+        :param targets : liste de cibles
+        :param options : dictionnaire des options de scan (voir parse)
+        :param spool_directory : dossier des fichiers de resultats des
+                                 scans (voir ResultStream)
+        :return None
+        """
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.soft = soft
+        self.targets = targets
+        self.options = options
+        # queued, running, done, failed ou cancelled
+        self.state = "queued"
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.scan = None
+        self.targets_reports = None
+        self.stream = ResultStream(
+            os.path.join(spool_directory, "{}.jsonl".format(self.id))
+        )
+
+    def status(self):
+        """
+        Etat du scan, tel que renvoye par l'API.
+
+        :param self : reference vers l'objet ScanJob parent
+        :return dictionnaire serialisable en JSON
+        """
+        status = {
+            "id": self.id,
+            "state": self.state,
+            "request": self.request,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "results": self.stream.count,
+        }
+        if self.state == "running" and self.scan is not None:
+            status["progress"] = self.scan.progress
+        if self.error is not None:
+            status["error"] = self.error
+        if self.targets_reports is not None:
+            summary = self.targets_reports["summary"]
+            status["summary"] = {
+                key: summary[key]
+                for key in ("filename", "scan_time", "totalhosts", "uphosts")
+            }
+        return status
+
+
+class ScanDaemon:
+    """
+    Daemon de scan : pool de processus partage, file des scans soumis et
+    execution simultanee d'un nombre borne de scans.
+
+    :class ScanDaemon
+    """
+
+    def __init__(
+        self, log_queue, processes, max_rate, max_host_probes, max_host_tasks
+    ):
+        """
+        Initialisation des objets de type ScanDaemon : creation du pool.
+
+        :param self : reference vers l'objet ScanDaemon parent
+        :param log_queue : file d'attente des messages de logs
+        :param processes : nombre de processus du pool
+        :param max_rate : debit maximal de paquets par seconde, tous scans
+                          confondus (0 : illimite)
+        :param max_host_probes : nombre maximal de sondes simultanees par
+                                 machine (0 : illimite)
+        :param max_host_tasks : nombre maximal de requetes nmap simultanees
+                                par machine (0 : illimite), plafond de
+                                celui de chaque scan
+        :return None
+        """
+        self.log_queue = log_queue
+        self.processes = processes
+        self.max_rate = max_rate
+        self.max_host_probes = max_host_probes
+        self.max_host_tasks = max_host_tasks
+        self.shared_pool = SharedPool(
+            create_pool(
+                processes,
+                log_queue,
+                max_rate,
+                build_nmap_options(max_rate, max_host_probes, max_host_tasks),
+            ),
+            processes,
+        )
+        self.lock = threading.Lock()
+        # les sorties sont ecrites une a une (creation du dossier, fichier
+        # de mesures commun)
+        self.output_lock = threading.Lock()
+        self.jobs = {}
+        # resultats en flux des scans, supprimes a l'oubli de chaque scan
+        self.spool_directory = tempfile.mkdtemp(prefix="port_scanner_")
+        self.job_queue = queue.Queue()
+        for _ in range(config_dict["DAEMON_MAX_JOBS"]):
+            threading.Thread(target=self.run_jobs, daemon=True).start()
+
+    def submit(self, request):
+        """
+        Soumission d'un scan.
+
+        :param self : reference vers l'objet ScanDaemon parent
+        :param request : soumission du scan (dict JSON)
+        :return scan (ScanJob)
+        """
+        soft, targets, options = parse(
+            build_job_arguments(request), JobArgumentParser
+        )
+        job = ScanJob(request, soft, targets, options, self.spool_directory)
+        with self.lock:
+            self.prune()
+            self.jobs[job.id] = job
+        self.job_queue.put(job)
+        logging.info(
+            "scan {} soumis : {} cible(s)".format(job.id, len(targets))
+        )
+        return job
+
+    def prune(self):
+        """
+        Oubli des scans termines depuis plus de DAEMON_JOB_RETENTION
+        secondes (le verrou doit etre detenu).
+
+        :param self : reference vers l'objet ScanDaemon parent
+        :return None
+        """
+        limit = time.time() - config_dict["DAEMON_JOB_RETENTION"]
+        for job_id, job in list(self.jobs.items()):
+            if job.finished is not None and job.finished < limit:
+                del self.jobs[job_id]
+                job.stream.remove()
+
+    def get(self, job_id):
+        """
+        Recuperation d'un scan.
+
+        :param self : reference vers l'objet ScanDaemon parent
+        :param job_id : identifiant du scan
+        :return scan (ScanJob), ou None
+        """
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        """
+        Liste des scans, du plus ancien au plus recent.
+
+        :param self : reference vers l'objet ScanDaemon parent
+        :return liste de scans (ScanJob)
+        """
+        with self.lock:
+            self.prune()
+            return list(self.jobs.values())
+
+    def delete(self, job_id):
+        """
+        Suppression d'un scan en attente (il ne sera pas execute) ou
+        termine.
+
+        :param self : reference vers l'objet ScanDaemon parent
+        :param job_id : identifiant du scan
+        :return booleen indiquant si le scan a ete supprime (False s'il
+                est en cours), ou None s'il est inconnu
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.state == "running":
+                return False
+            if job.state == "queued":
+                job.state = "cancelled"
+            job.stream.remove()
+            self.jobs.pop(job_id, None)
+        return True
+
+    def run_jobs(self):
+        """
+        Execution des scans soumis, l'un apres l'autre (un thread par scan
+        simultane).
+
+        :param self : reference vers l'objet ScanDaemon parent
+        :return None
+        """
+        while True:
+            job = self.job_queue.get()
+            with self.lock:
+                if job.state != "queued":
+                    continue
+                job.state = "running"
+                job.started = time.time()
+            self.run_job(job)
+
+    def limit_host_tasks(self, max_host_tasks):
+        """
+        Nombre maximal de requetes nmap simultanees par machine d'un scan,
+        plafonne par celui du daemon : les options nmap du pool partage,
+        dont --max-parallelism, sont calculees d'apres ce dernier (voir
+        build_nmap_options).
+
+        :param self : reference vers l'objet ScanDaemon parent
+        :param max_host_tasks : valeur demandee par le scan (0 : illimite)
+        :return nombre maximal de requetes simultanees (0 : illimite)
+        """
+        if self.max_host_tasks == 0:
+            return max_host_tasks
+        if max_host_tasks == 0:
+            return self.max_host_tasks
+        return min(max_host_tasks, self.max_host_tasks)
+
+    def run_job(self, job):
+        """
+        Execution d'un scan par le pool partage.
+
+        :param self : reference vers l'objet ScanDaemon parent
+        :param job : scan (ScanJob)
+        :return None
+        """
+        options = job.options
+        cache = None
+        sinks = []
+        # le nom des fichiers de sortie distingue les scans simultanes
+        output_filename = "{}_{}".format(
+            datetime.datetime.now().strftime("%Y_%m_%d_%H_%M_%S"), job.id
+        )
+        try:
+            if options["cache_path"]:
+                cache = ResultCache(options["cache_path"])
+            with self.output_lock:
+                sinks = open_stream_writers(
+                    output_filename, options["output_formats"]
+                )
+            job.scan = NmapScan(
+                targets=job.targets,
+                queue=self.log_queue,
+                soft=job.soft,
+                engine=options["engine"],
+                udp_engine=options["udp_engine"],
+                host_batch_size=options["host_batch_size"],
+                discovery=options["discovery"],
+                port_sets=options["port_sets"],
+                processes=self.processes,
+                max_rate=self.max_rate,
+                max_host_probes=self.max_host_probes,
+                max_host_tasks=self.limit_host_tasks(
+                    options["max_host_tasks"]
+                ),
+                cache=cache,
+                cache_ttl=(
+                    options["cache_ttl"] if options["incremental"] else None
+                ),
+                sinks=sinks + [job.stream],
+                output_filename=output_filename,
+                pool=self.shared_pool.client(),
+            )
+            job.scan.process()
+            targets_reports = job.scan.build_targets_reports()
+            with self.output_lock:
+                finalize(targets_reports, options["output_formats"])
+            job.targets_reports = targets_reports
+            job.state = "done"
+        except Exception as exception:
+            logging.error("le scan {} a echoue : {}".format(job.id, exception))
+            job.error = str(exception)
+            job.state = "failed"
+        finally:
+            if cache is not None:
+                cache.close()
+            for sink in sinks:
+                sink.close()
+            job.finished = time.time()
+            job.stream.close()
+
+    def close(self):
+        """
+        Arret du daemon : les scans en cours sont interrompus.
+
+        :param self : reference vers l'objet ScanDaemon parent
+        :return None
+        """
+        self.shared_pool.pool.terminate()
+        self.shared_pool.pool.join()
+        shutil.rmtree(self.spool_directory, ignore_errors=True)
+
+
+def encode_report_value(value):
+    """
+    Conversion en JSON des objets des rapports (PortResult).
+
+    :param value : objet non serialisable par json
+    :return dictionnaire serialisable
+    """
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    raise TypeError("objet non serialisable : {!r}".format(value))
+
+
+class DaemonRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Traitement des requetes de l'API du daemon.
+
+    :class DaemonRequestHandler
+    """
+
+    server_version = "port_scanner"
+
+    def log_message(self, message_format, *args):
+        logging.debug("API : " + message_format % args)
+
+    def authorize(self):
+        """
+        Verification du jeton de l'API (en-tete "Authorization: Bearer
+        <jeton>"), exige des qu'un jeton est configure.
+
+        :param self : reference vers l'objet DaemonRequestHandler parent
+        :return booleen indiquant si la requete est autorisee (sinon, la
+                reponse 401 est deja envoyee)
+        """
+        token = self.server.token
+        if not token:
+            return True
+        expected = "Bearer {}".format(token).encode()
+        received = self.headers.get("Authorization", "").encode()
+        if hmac.compare_digest(received, expected):
+            return True
+        self.send_error_json(401, "jeton absent ou invalide")
+        return False
+
+    def send_json(self, status, body):
+        """
+        Envoi d'une reponse JSON.
+
+        :param self : reference vers l'objet DaemonRequestHandler parent
+        :param status : code HTTP
+        :param body : corps de la reponse (serialisable en JSON)
+        :return None
+        """
+        data = json.dumps(body, default=encode_report_value).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message):
+        """
+        Envoi d'une erreur.
+
+        :param self : reference vers l'objet DaemonRequestHandler parent
+        :param status : code HTTP
+        :param message : description de l'erreur
+        :return None
+        """
+        self.send_json(status, {"error": message})
+
+    def parse_path(self):
+        """
+        Analyse du chemin de la requete.
+
+        :param self : reference vers l'objet DaemonRequestHandler parent
+        :return tuple : segments du chemin, parametres de la requete
+        """
+        url = urllib.parse.urlsplit(self.path)
+        segments = [segment for segment in url.path.split("/") if segment]
+        return segments, urllib.parse.parse_qs(url.query)
+
+    def find_job(self, segments):
+        """
+        Recuperation du scan designe par le chemin /jobs/<id>/...
+
+        :param self : reference vers l'objet DaemonRequestHandler parent
+        :param segments : segments du chemin
+        :return scan (ScanJob), ou None (reponse 404 deja envoyee)
+        """
+        job = None
+        if len(segments) >= 2 and segments[0] == "jobs":
+            job = self.server.scan_daemon.get(segments[1])
+        if job is None:
+            self.send_error_json(404, "scan inconnu")
+        return job
+
+    def do_POST(self):
+        if not self.authorize():
+            return
+        segments, _ = self.parse_path()
+        if segments != ["jobs"]:
+            self.send_error_json(404, "ressource inconnue")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_SIZE:
+            self.send_error_json(413, "requete trop volumineuse")
+            return
+        try:
+            request = json.loads(self.rfile.read(length) or b"null")
+            job = self.server.scan_daemon.submit(request)
+        except ValueError as exception:
+            self.send_error_json(400, str(exception))
+            return
+        self.send_json(201, job.status())
+
+    def do_GET(self):
+        if not self.authorize():
+            return
+        segments, query = self.parse_path()
+        if segments == ["jobs"]:
+            self.send_json(
+                200, [job.status() for job in self.server.scan_daemon.list()]
+            )
+            return
+        if len(segments) not in (2, 3):
+            self.send_error_json(404, "ressource inconnue")
+            return
+        job = self.find_job(segments)
+        if job is None:
+            return
+        if len(segments) == 2:
+            self.send_json(200, job.status())
+        elif segments[2] == "results":
+            self.stream_results(job)
+        elif segments[2] == "report":
+            self.send_report(job, query.get("format", ["json"])[0])
+        else:
+            self.send_error_json(404, "ressource inconnue")
+
+    def do_DELETE(self):
+        if not self.authorize():
+            return
+        segments, _ = self.parse_path()
+        if len(segments) != 2 or segments[0] != "jobs":
+            self.send_error_json(404, "ressource inconnue")
+            return
+        deleted = self.server.scan_daemon.delete(segments[1])
+        if deleted is None:
+            self.send_error_json(404, "scan inconnu")
+            return
+        if not deleted:
+            self.send_error_json(409, "scan en cours")
+            return
+        self.send_response(204)
+        self.end_headers()
+
+    def stream_results(self, job):
+        """
+        Transmission des resultats d'un scan au fil de l'eau (JSON Lines),
+        jusqu'a la fin du scan. La reponse n'a pas de longueur : sa fin
+        est signalee par la fermeture de la connexion.
+
+        :param self : reference vers l'objet DaemonRequestHandler parent
+        :param job : scan (ScanJob)
+        :return None
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for line in job.stream.iter_lines():
+                self.wfile.write(line.encode() + b"\n")
+                self.wfile.flush()
+        except OSError:
+            # client deconnecte
+            pass
+
+    def send_report(self, job, report_format):
+        """
+        Envoi du rapport d'un scan termine.
+
+        :param self : reference vers l'objet DaemonRequestHandler parent
+        :param job : scan (ScanJob)
+        :param report_format : "json" ou "html"
+        :return None
+        """
+        if job.targets_reports is None:
+            self.send_error_json(
+                409, "scan non termine ({})".format(job.state)
+            )
+            return
+        if report_format == "json":
+            self.send_json(200, job.targets_reports)
+            return
+        if report_format != "html":
+            self.send_error_json(400, "format inconnu : json ou html")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.end_headers()
+        get_template().stream(targets_reports=job.targets_reports).dump(
+            self.wfile, encoding="utf-8"
+        )
+
+
+class UnixHTTPServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    """
+    Serveur HTTP sur une socket Unix, un thread par connexion.
+
+    :class UnixHTTPServer
+    """
+
+    daemon_threads = True
+
+
+def create_server(address, token):
+    """
+    Creation du serveur de l'API : socket Unix si l'adresse est un chemin,
+    port TCP ([hote:]port, hote local par defaut) sinon. Un port TCP
+    exige un jeton (voir parse).
+
+    :param address : adresse d'ecoute
+    :param token : jeton exige des clients (vide : aucun)
+    :return serveur HTTP
+    """
+    if "/" not in address:
+        server = http.server.ThreadingHTTPServer(
+            parse_address(address, "127.0.0.1"), DaemonRequestHandler
+        )
+    else:
+        # une socket laissee par un daemon precedent est remplacee
+        if os.path.exists(address):
+            if not stat.S_ISSOCK(os.stat(address).st_mode):
+                raise ValueError("{} n'est pas une socket".format(address))
+            os.unlink(address)
+        # seul l'utilisateur du daemon peut soumettre des scans : la
+        # socket est creee directement avec ces droits.
+        umask = os.umask(0o177)
+        try:
+            server = UnixHTTPServer(address, DaemonRequestHandler)
+        finally:
+            os.umask(umask)
+    server.token = token
+    return server
+
+
+def run_daemon(address, stdout_handler, output_file_handler, options):
+    """
+    Lancement du daemon, jusqu'a son interruption (Ctrl-C, SIGTERM).
+
+    :param address : adresse de l'API (voir create_server)
+    :param stdout_handler : reference vers la sortie standard des logs
+    :param output_file_handler : reference vers la sortie des logs dans un
+                                 fichier
+    :param options : dictionnaire des options (processus, debit)
+    :return None
+    """
+    queue_listener, log_queue = multiprocessing_logger_init(
+        stream_handler=stdout_handler, file_handler=output_file_handler
+    )
+    scan_daemon = ScanDaemon(
+        log_queue,
+        options["processes"],
+        options["max_rate"],
+        options["max_host_probes"],
+        options["max_host_tasks"],
+    )
+    try:
+        server = create_server(address, config_dict["DAEMON_TOKEN"])
+        server.scan_daemon = scan_daemon
+        # arret propre sur SIGTERM ; les processus du pool, deja crees,
+        # conservent le comportement par defaut.
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        logging.info(
+            "daemon pret : API sur {}, {} processus".format(
+                address, options["processes"]
+            )
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if "/" in address:
+                os.unlink(address)
+    finally:
+        logging.info("arret du daemon")
+        scan_daemon.close()
+        queue_listener.stop()
@@ -6,52 +6,280 @@ Repartition des taches a effectuer de maniere a optimiser l'efficacite.
 :date 07.10.2020
 """
 
+import collections
+import contextlib
 import datetime
+import functools
 import ipaddress
+import itertools
 import logging
+import math
 import multiprocessing
 import nmap
-import socket
+import os
+import pickle
+import re
+import subprocess
+import threading
 import time
+import zlib
+from .aggregation import ReportAggregator
+from .cache import MAX_QUERY_HOSTS, ResultCache
 from .config import config_dict
+from .distributed import DistributedPool, parse_address, run_worker_agent
+from .journal import ScanJournal
+from .metrics import ScanMetrics
+from .connect_scan import build_report, run_connect_scan
 from .logs import multiprocessing_logger_init, worker_init
+from .model import HostResult, PortResult
+from .nmap_xml import NmapXmlScan
+from .output import open_stream_writers
+from .progress import ProgressTracker
+from .ports import (
+    MAX_PORT,
+    MIN_PORT,
+    NMAP_DEFAULT_PORTS,
+    PortSet,
+    top_ports,
+)
+from .ratelimit import TokenBucket
+from .resolver import Resolver
+from .scheduler import AdaptiveChunkScheduler
+from .targets import TargetMap, normalize_target
+from .udp_scan import UDP_PROBES, order_udp_ports, run_udp_scan
 
+# nombre de machines dont les ports restant a scanner sont calcules
+# ensemble lors d'un scan partiel (voir NmapScan.iter_batches)
+PLAN_BATCH_SIZE = 256
+# nombre de sondes envoyees par nmap pour tester si une machine est en
+# ligne (ICMP echo, TCP SYN 443, TCP ACK 80, ICMP timestamp)
+DISCOVERY_PROBES = 4
+# duree maximale de la verification de nmap (secondes, voir check_nmap)
+NMAP_CHECK_TIMEOUT = 30
 
-def run_request(args):
+# etat propre a chaque processus du pool, renseigne par init_worker ;
+# "port_scanner" recoit l'objet python-nmap du processus (voir
+# get_port_scanner), "stages" les durees des etapes de la requete en cours
+worker_state = {
+    "rate_limiter": None,
+    "nmap_options": {"arguments": "", "host_probes": 0},
+    "port_scanner": None,
+    "stages": {},
+}
+
+
+def check_nmap():
     """
-    Lancement d'une requete nmap.
+    Verification, une seule fois avant le lancement des requetes, du
+    binaire nmap configure et de la possibilite de le lancer via sudo sans
+    mot de passe : une erreur de configuration fait echouer le scan des
+    son lancement, au lieu de chacune de ses requetes.
 
-    :param args: tuple contenant les metadonnees concernant le scan et la liste
-                 des rapports de scan partagee entre les processus.
-    :return None (les resultats sont stockes dans targets_reports_list)
+    :param None
+    :return version de nmap
     """
-    metadata, targets_reports_list = args
+    nmap_path = config_dict["NMAP_BINARY_PATH"]
+    if not os.path.isfile(nmap_path) or not os.access(nmap_path, os.X_OK):
+        raise RuntimeError(
+            "binaire nmap introuvable ou non executable : {}".format(nmap_path)
+        )
+    # -n : sudo echoue au lieu de demander un mot de passe, que les
+    # processus du pool ne pourraient pas saisir.
+    try:
+        completed = subprocess.run(
+            ["sudo", "-n", nmap_path, "-V"],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            timeout=NMAP_CHECK_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired) as exception:
+        raise RuntimeError(
+            "impossible de lancer nmap via sudo : {}".format(exception)
+        )
+    if completed.returncode != 0:
+        raise RuntimeError(
+            "impossible de lancer nmap via sudo : {}".format(
+                completed.stderr.decode(errors="replace").strip()
+            )
+        )
+    match = re.search(rb"Nmap version (\S+)", completed.stdout)
+    version = match.group(1).decode() if match else "inconnue"
+    logging.info("nmap {} ({}) lance via sudo".format(version, nmap_path))
+    return version
 
-    name = multiprocessing.current_process().name
 
-    # PortScanner est la classe de la bibliotheque nmap permettant
-    # de scanner des cibles. Ici, on choisit de chercher le binaire
-    # nmap uniquement a l'endroit precise dans la configuration, pour
-    # des raisons de securite.
-    port_scanner = nmap.PortScanner(
-        nmap_search_path=(config_dict["NMAP_BINARY_PATH"],)
+def init_worker(queue, rate_limiter, nmap_options):
+    """
+    Initialisation d'un processus du pool : journalisation, limiteur de
+    debit partage et options nmap communes a toutes les requetes.
+
+    :param queue : file d'attente des messages de logs
+    :param rate_limiter : seau a jetons partage (TokenBucket), ou None
+    :param nmap_options : options nmap de limitation (debit, sondes), voir
+                          build_nmap_options
+    :return None
+    """
+    worker_init(queue)
+    worker_state["rate_limiter"] = rate_limiter
+    worker_state["nmap_options"] = nmap_options
+    worker_state["port_scanner"] = None
+
+
+def get_port_scanner():
+    """
+    Objet python-nmap du processus courant, cree a sa premiere requete de
+    decouverte puis reutilise : son constructeur lance nmap (-V) pour en
+    verifier la version.
+
+    :param None
+    :return objet nmap.PortScanner
+    """
+    if worker_state["port_scanner"] is None:
+        worker_state["port_scanner"] = nmap.PortScanner(
+            nmap_search_path=(config_dict["NMAP_BINARY_PATH"],)
+        )
+    return worker_state["port_scanner"]
+
+
+@contextlib.contextmanager
+def worker_timer(stage):
+    """
+    Mesure de la duree d'une etape de la requete en cours, dans un
+    processus du pool (gestionnaire de contexte, voir run_timed).
+
+    :param stage : nom de l'etape
+    :return gestionnaire de contexte
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages = worker_state["stages"]
+        stages[stage] = (
+            stages.get(stage, 0.0) + time.perf_counter() - start_time
+        )
+
+
+def run_timed(task):
+    """
+    Execution d'une requete par un processus du pool, avec mesure de ses
+    durees (voir ScanMetrics.record_task).
+
+    :param task : tuple (fonction, argument, date de mise en file)
+    :return tuple : resultat de la fonction (None en cas d'echec), mesures
+            de la requete
+    """
+    function, argument, queued_at = task
+    worker_state["stages"] = {}
+    start_time = time.time()
+    timing = {"queued_at": queued_at, "error": None}
+    try:
+        payload = function(argument)
+    except Exception as exception:
+        # l'echec est renvoye avec la requete concernee, afin que le
+        # processus principal en tienne compte dans la progression.
+        payload = None
+        timing["error"] = str(exception)
+        timing["task"] = argument
+    timing["start"] = start_time
+    timing["end"] = time.time()
+    timing["stages"] = worker_state["stages"]
+    return payload, timing
+
+
+def throttle(packets):
+    """
+    Attente eventuelle du limiteur de debit partage avant une requete.
+
+    :param packets : estimation du nombre de paquets de la requete
+    :return None
+    """
+    rate_limiter = worker_state["rate_limiter"]
+    if rate_limiter is None:
+        return
+    waited = rate_limiter.acquire(packets)
+    if waited > 0:
+        logging.debug(
+            "limitation du debit : attente de {:.1f}s".format(waited)
+        )
+
+
+def estimate_packets(metadata):
+    """
+    Estimation du nombre de paquets envoyes par une requete de scan de
+    ports : une sonde par couple (IP, port).
+
+    :param metadata: dictionnaire des metadonnees de la requete
+    :return nombre de paquets
+    """
+    if "port_count" in metadata:
+        ports_count = metadata["port_count"]
+    elif metadata["port_range"] is None:
+        ports_count = NMAP_DEFAULT_PORTS
+    else:
+        ports_count = len(PortSet.from_nmap(metadata["port_range"]))
+    return len(metadata["ip_hosts"]) * ports_count
+
+
+def get_host_type(ip_host):
+    """
+    Recuperation de la version d'une adresse IP.
+
+    :param ip_host : adresse IP (str)
+    :return type d'IP (4 ou 6)
+    """
+    return ipaddress.ip_address(ip_host).version
+
+
+def pack_reports(reports):
+    """
+    Serialisation et compression des resultats d'une requete, afin de
+    limiter le volume de donnees echange entre les processus.
+
+    :param reports : liste de resultats (HostResult)
+    :return resultats compresses (bytes)
+    """
+    return zlib.compress(
+        pickle.dumps(reports, protocol=pickle.HIGHEST_PROTOCOL), 1
     )
 
+
+def unpack_reports(payload):
+    """
+    Decompression des resultats renvoyes par un processus de scan.
+
+    :param payload : resultats compresses par pack_reports
+    :return liste de resultats (HostResult)
+    """
+    return pickle.loads(zlib.decompress(payload))
+
+
+def run_request(metadata):
+    """
+    Lancement d'une requete nmap.
+
+    :param metadata: dictionnaire des metadonnees concernant le scan
+    :return resultats de scan compresses, un par IP (voir pack_reports)
+    """
+    name = multiprocessing.current_process().name
+
     logger = logging.getLogger()
     logger.info(
         "lancement du process pour (nom={}, ip/host={}, transport={},"
         "ports={})".format(
             name,
-            metadata["ip_host"],
+            metadata["nmap_hosts"],
             metadata["transport_protocol"],
             metadata["port_range"],
         )
     )
 
     # option concernant le protocole utilise pour la couche transport
-    # -sTV : scan des services TCP et de leurs versions
-    # -sUV : scan des services UDP et de leurs versions
-    transport_option = "-s{}V".format(metadata["transport_protocol"])
+    # -sT / -sU : scan des ports TCP / UDP
+    # -sTV / -sUV : scan des services TCP / UDP et de leurs versions
+    transport_option = "-s{}".format(metadata["transport_protocol"])
+    if metadata["version_detection"]:
+        transport_option += "V"
 
     # option concernant le protocole IP, notamment la version
     if metadata["target_type"] in (4, 6):
@@ -60,25 +288,370 @@ def run_request(args):
         ip_option = ""
 
     arguments = "{} {}".format(transport_option, ip_option)
-    # si port_range est a nul, cela signifie que c'est un scan soft.
-    # ainsi, on met le temps a la vitesse 4, la vitesse 5 faisant
-    # souvent abstraction des services...
-    if metadata["port_range"] is None:
+    # si la decouverte d'hotes est desactivee (la machine est deja connue
+    # comme etant en ligne), on evite le ping prealable de nmap.
+    if not metadata["host_discovery"]:
+        arguments += " -Pn"
+    # dans le cas d'un scan soft, on met le temps a la vitesse 4, la
+    # vitesse 5 faisant souvent abstraction des services...
+    if metadata["soft"]:
         arguments += " -T4"
+    limits = limit_arguments(len(metadata["ip_hosts"]))
+    if limits:
+        arguments += " " + limits
 
-    target_report = port_scanner.scan(
-        hosts=metadata["ip_host"],
-        ports=metadata["port_range"],
-        arguments=arguments,
+    # le debit global est partage entre tous les processus du pool
+    with worker_timer("throttle"):
+        throttle(estimate_packets(metadata))
+
+    # les metadonnees sont communes a tous les resultats de la requete :
+    # elles ne sont serialisees qu'une fois pour le processus principal.
+    shared_metadata = {
+        key: value
+        for key, value in metadata.items()
+        if key not in ("ip_hosts", "nmap_hosts")
+    }
+    # plusieurs machines (ou un CIDR entier) peuvent etre scannees en un
+    # seul appel : nmap se charge alors de les scanner en parallele. On
+    # cherche le binaire nmap uniquement a l'endroit precise dans la
+    # configuration, pour des raisons de securite.
+    nmap_scan = NmapXmlScan(
+        config_dict["NMAP_BINARY_PATH"],
+        metadata["nmap_hosts"],
+        metadata["port_range"],
+        arguments.split(),
         # l'option "sudo" est requise pour obtenir les adresses MAC
         sudo=True,
     )
-    if target_report is not None:
-        target_report["metadata"] = metadata
-        targets_reports_list.append(target_report)
+    # la sortie de nmap est analysee au fil de l'eau : chaque machine est
+    # signalee des que nmap a termine de la scanner.
+    results = {}
+    with worker_timer("nmap"):
+        for result in nmap_scan.results(shared_metadata):
+            logger.info(
+                "{} : {} port(s) analyse(s) sur {}".format(
+                    name, len(result.ports), result.ip_host
+                )
+            )
+            results[result.ip_host] = result
+    # duree du scan d'apres nmap : l'ecart avec l'etape "nmap" correspond
+    # au lancement de nmap (via sudo) et a l'analyse de sa sortie.
+    worker_state["stages"]["nmap_elapsed"] = (
+        worker_state["stages"].get("nmap_elapsed", 0.0) + nmap_scan.elapsed
+    )
     logger.info(
         "le scan {} est termine (cible = {})".format(name, metadata["target"])
     )
+    # la duree et les erreurs ne sont connues qu'a la fin du scan
+    for result in results.values():
+        result.elapsed = nmap_scan.elapsed
+        result.errors = list(nmap_scan.errors)
+        result.warnings = list(nmap_scan.warnings)
+    # les resultats sont renvoyes directement au processus principal via
+    # le Pool, sans passer par un processus Manager intermediaire.
+    with worker_timer("serialize"):
+        return pack_reports(
+            [
+                results.get(ip_host)
+                or HostResult(
+                    shared_metadata, ip_host, False, elapsed=nmap_scan.elapsed
+                )
+                for ip_host in metadata["ip_hosts"]
+            ]
+        )
+
+
+def run_discovery(metadata):
+    """
+    Lancement d'une requete nmap de decouverte des machines en ligne
+    (ping scan ICMP/ARP/TCP, sans scan de ports).
+
+    :param metadata: dictionnaire des metadonnees concernant le groupe de
+                     machines a tester
+    :return tuple compresse (cible, liste des IP en ligne), voir
+            pack_reports
+    """
+    port_scanner = get_port_scanner()
+    arguments = "-sn"
+    if metadata["target_type"] in (4, 6):
+        arguments += " -{}".format(metadata["target_type"])
+    limits = limit_arguments(metadata["hosts_count"])
+    if limits:
+        arguments += " " + limits
+    with worker_timer("throttle"):
+        throttle(DISCOVERY_PROBES * metadata["hosts_count"])
+    with worker_timer("nmap"):
+        discovery_report = port_scanner.scan(
+            hosts=metadata["nmap_hosts"],
+            arguments=arguments,
+            # l'option "sudo" permet a nmap d'utiliser ICMP et ARP
+            sudo=True,
+        )
+    live_hosts = [
+        ip_host
+        for ip_host, host_scan in discovery_report["scan"].items()
+        if host_scan["status"]["state"] == "up"
+    ]
+    return pack_reports((metadata["target"], live_hosts))
+
+
+def encode_host_results(payload):
+    """
+    Conversion des resultats d'une requete de scan en JSON, pour leur
+    envoi au coordinateur d'un scan distribue : rapports python-nmap, comme
+    dans le journal (voir HostResult.to_report).
+
+    :param payload : resultats compresses par run_request
+    :return liste de rapports (serialisable en JSON)
+    """
+    return [result.to_report() for result in unpack_reports(payload)]
+
+
+def decode_host_results(reports):
+    """
+    Conversion inverse de encode_host_results, par le coordinateur. Les
+    resultats sont compresses a nouveau, comme ceux d'un pool local.
+
+    :param reports : liste de rapports python-nmap
+    :return resultats compresses (voir pack_reports)
+    """
+    return pack_reports([HostResult.from_report(r) for r in reports])
+
+
+def encode_discovery(payload):
+    """
+    Conversion du resultat d'une requete de decouverte en JSON.
+
+    :param payload : resultat compresse par run_discovery
+    :return liste [cible, liste des IP en ligne]
+    """
+    return list(unpack_reports(payload))
+
+
+def decode_discovery(result):
+    """
+    Conversion inverse de encode_discovery, par le coordinateur.
+
+    :param result : liste [cible, liste des IP en ligne]
+    :return resultat compresse (voir pack_reports)
+    """
+    target, live_hosts = result
+    return pack_reports((str(target), [str(ip) for ip in live_hosts]))
+
+
+# fonctions executables par les workers d'un scan distribue, avec la
+# conversion de leur resultat vers et depuis JSON (voir distributed.py)
+REMOTE_FUNCTIONS = {
+    "run_request": (run_request, encode_host_results, decode_host_results),
+    "run_discovery": (run_discovery, encode_discovery, decode_discovery),
+}
+
+
+def build_nmap_options(max_rate, max_host_probes, max_host_tasks=0):
+    """
+    Options nmap de limitation communes a toutes les requetes.
+
+    :param max_rate : debit maximal de paquets par seconde (0 : illimite)
+    :param max_host_probes : nombre maximal de sondes simultanees par
+                             machine (0 : illimite)
+    :param max_host_tasks : nombre maximal de requetes nmap simultanees par
+                            machine (0 : illimite)
+    :return dictionnaire {"arguments": options nmap communes,
+            "host_probes": sondes simultanees par machine et par requete
+            (0 : illimite)}, voir limit_arguments
+    """
+    arguments = []
+    # le seau a jetons partage borne le debit moyen ; --max-rate
+    # empeche en plus un processus seul de depasser le debit global.
+    if max_rate:
+        arguments.append("--max-rate {}".format(max_rate))
+    # la borne par machine est repartie entre les requetes simultanees
+    # d'un meme groupe de machines (voir AdaptiveChunkScheduler) ; sans
+    # limite du nombre de ces requetes, elle ne vaut que par requete.
+    host_probes = max_host_probes
+    if max_host_probes and max_host_tasks:
+        host_probes = max(1, max_host_probes // max_host_tasks)
+    return {"arguments": " ".join(arguments), "host_probes": host_probes}
+
+
+def limit_arguments(hosts_count):
+    """
+    Options nmap de limitation d'une requete, d'apres les options communes
+    du processus (voir build_nmap_options). --max-parallelism borne les
+    sondes en vol de l'appel entier, que nmap repartit entre les machines
+    de l'appel : la borne par machine est donc multipliee par leur nombre.
+
+    :param hosts_count : nombre de machines de la requete
+    :return chaine d'options nmap
+    """
+    nmap_options = worker_state["nmap_options"]
+    arguments = [nmap_options["arguments"]]
+    if nmap_options["host_probes"]:
+        arguments.append(
+            "--max-parallelism {}".format(
+                nmap_options["host_probes"] * hosts_count
+            )
+        )
+    return " ".join(argument for argument in arguments if argument)
+
+
+def create_pool(processes, queue, max_rate, nmap_options):
+    """
+    Creation du pool de processus executant les requetes, apres
+    verification de nmap. Le limiteur de debit, en memoire partagee, est
+    transmis a chaque processus lors de son initialisation.
+
+    :param processes : nombre de processus du pool
+    :param queue : file d'attente des messages de logs
+    :param max_rate : debit maximal de paquets par seconde, tous processus
+                      confondus (0 : illimite)
+    :param nmap_options : options nmap de limitation (voir
+                          build_nmap_options)
+    :return pool de processus
+    """
+    check_nmap()
+    rate_limiter = None
+    if max_rate:
+        rate_limiter = TokenBucket(max_rate)
+    return multiprocessing.Pool(
+        processes=processes,
+        initializer=init_worker,
+        initargs=[queue, rate_limiter, nmap_options],
+    )
+
+
+def check_remote_hosts(metadata):
+    """
+    Verification, par un worker, des machines d'une requete recue du
+    coordinateur : seules des adresses IP et des reseaux CIDR sont
+    transmis a nmap, et non des options (-iL, --script...).
+
+    :param metadata : metadonnees de la requete
+    :return None
+    """
+    nmap_hosts = metadata["nmap_hosts"]
+    if not isinstance(nmap_hosts, str) or not nmap_hosts.split():
+        raise ValueError("requete invalide : machines absentes")
+    for nmap_host in nmap_hosts.split():
+        try:
+            ipaddress.ip_network(nmap_host, strict=False)
+        except ValueError:
+            raise ValueError(
+                "requete invalide : {} n'est ni une IP ni un "
+                "CIDR".format(nmap_host)
+            )
+    if metadata["target_type"] not in (4, 6):
+        raise ValueError("requete invalide : version d'IP inconnue")
+
+
+def check_remote_request(metadata):
+    """
+    Verification, par un worker, d'une requete de scan de ports recue du
+    coordinateur : machines, protocole et intervalle de ports, ce dernier
+    devant etre ecrit tel que PortSet.to_nmap l'ecrirait.
+
+    :param metadata : metadonnees de la requete
+    :return None
+    """
+    check_remote_hosts(metadata)
+    if metadata["transport_protocol"] not in ("T", "U"):
+        raise ValueError("requete invalide : protocole inconnu")
+    port_range = metadata["port_range"]
+    if port_range is not None:
+        try:
+            valid = PortSet.from_nmap(port_range).to_nmap() == port_range
+        except (AttributeError, TypeError, ValueError):
+            valid = False
+        if not valid:
+            raise ValueError(
+                "requete invalide : ports {!r}".format(port_range)
+            )
+
+
+def run_remote(check, function, metadata):
+    """
+    Execution par un worker d'une requete recue du coordinateur, apres
+    verification de ses metadonnees.
+
+    :param check : fonction de verification des metadonnees
+    :param function : fonction executant la requete
+    :param metadata : metadonnees de la requete
+    :return resultat de la fonction
+    """
+    if not isinstance(metadata, dict):
+        raise ValueError("requete invalide")
+    try:
+        check(metadata)
+    except KeyError as exception:
+        raise ValueError("requete invalide : {} absent".format(exception))
+    return function(metadata)
+
+
+# verification des requetes recues par les workers, par fonction
+REMOTE_CHECKS = {
+    "run_request": check_remote_request,
+    "run_discovery": check_remote_hosts,
+}
+
+
+def start_worker_pool(processes, queue, settings):
+    """
+    Creation du pool d'un worker, d'apres les parametres du scan recus du
+    coordinateur : seules des limites numeriques sont recues, les options
+    nmap etant construites par le worker lui-meme.
+
+    :param processes : nombre de processus du pool
+    :param queue : file d'attente des messages de logs
+    :param settings : parametres du scan {"max_rate", "max_host_probes",
+                      "max_host_tasks"}
+    :return pool de processus
+    """
+    limits = {}
+    for name in ("max_rate", "max_host_probes", "max_host_tasks"):
+        value = settings.get(name)
+        if type(value) is not int or value < 0:
+            raise ValueError("parametre {} invalide".format(name))
+        limits[name] = value
+    return create_pool(
+        processes,
+        queue,
+        limits["max_rate"],
+        build_nmap_options(
+            limits["max_rate"],
+            limits["max_host_probes"],
+            limits["max_host_tasks"],
+        ),
+    )
+
+
+def run_worker_process(address, processes, queue):
+    """
+    Execution d'un worker de scan distribue jusqu'a la fin du scan.
+
+    :param address : adresse du coordinateur ([hote:]port)
+    :param processes : nombre de requetes executees simultanement
+    :param queue : file d'attente des messages de logs
+    :return None
+    """
+    # les requetes du coordinateur sont verifiees avant d'etre executees
+    functions = {
+        name: (
+            functools.partial(run_remote, REMOTE_CHECKS[name], function),
+            encode,
+            decode,
+        )
+        for name, (function, encode, decode) in REMOTE_FUNCTIONS.items()
+    }
+    # la limite de debit recue du coordinateur s'applique a chaque
+    # worker : elle porte sur les paquets envoyes depuis une meme machine.
+    run_worker_agent(
+        parse_address(address, "127.0.0.1"),
+        processes,
+        functions,
+        run_timed,
+        functools.partial(start_worker_pool, processes, queue),
+        token=config_dict["DISTRIBUTED_TOKEN"],
+    )
 
 
 class NmapScan:
@@ -92,8 +665,26 @@ class NmapScan:
         queue,
         soft=False,
         port_steps=1000,
-        max_port=65535,
+        port_sets=None,
         transport_protocols=["T", "U"],
+        engine="nmap",
+        udp_engine="nmap",
+        host_batch_size=16,
+        discovery=False,
+        processes=None,
+        max_rate=0,
+        max_host_probes=0,
+        max_host_tasks=0,
+        cache=None,
+        cache_ttl=None,
+        journal=None,
+        resume=False,
+        sinks=(),
+        output_filename=None,
+        resolver=None,
+        coordinator=None,
+        local_workers=0,
+        pool=None,
     ):
         """
         Methode permettant d'initialiser les attributs de la classe NmapScan.
@@ -102,28 +693,156 @@ class NmapScan:
         :param targets : liste de cibles a scanner : ipv4/ipv6/cidr/host
         :param queue : file de messages pour les logs
         :param soft : booleen indiquant le type de scan a effectuer
-        :port_steps : intervalle de ports utilise pour la parallelisation.
-        :param max_port : numero de port maximal a scanner
+        :port_steps : intervalle de ports initial utilise pour la
+                      parallelisation, ajuste ensuite selon la vitesse
+                      de scan observee.
+        :param port_sets : ensembles de ports a scanner par protocole
+                           {protocole: PortSet} ; None pour tous les ports,
+                           ou les ports les plus connus en scan soft
         :param transport_protocols : protocoles de transport disponibles
+        :param engine : moteur de scan des ports ("nmap" ou "connect")
+        :param udp_engine : moteur de scan des ports UDP ("nmap" ou
+                            "async")
+        :param host_batch_size : nombre de machines scannees par appel a
+                                 nmap (0 pour passer la cible entiere)
+        :param discovery : booleen indiquant si les machines en ligne sont
+                           recherchees avant le scan des ports
+        :param processes : nombre de processus du pool (PROCESSES par
+                           defaut)
+        :param max_rate : debit maximal de paquets par seconde, tous
+                          processus confondus (0 : illimite)
+        :param max_host_probes : nombre maximal de sondes simultanees par
+                                 machine (0 : illimite)
+        :param max_host_tasks : nombre maximal de requetes nmap
+                                simultanees par groupe de machines lors
+                                du scan des ports (0 : illimite)
+        :param cache : cache des resultats (ResultCache), ou None
+        :param cache_ttl : duree de validite des resultats du cache
+                           (secondes) ; None pour tout rescanner
+        :param journal : journal des requetes terminees (ScanJournal), ou
+                         None
+        :param resume : booleen indiquant si le scan reprend un scan
+                        interrompu, d'apres le journal
+        :param sinks : sorties en flux recevant chaque resultat agrege
+        :param output_filename : nom des fichiers de sortie (date du debut
+                                 du scan par defaut)
+        :param resolver : resolveur des noms d'hote (Resolver) ; par
+                          defaut, un resolveur utilisant le cache
+        :param coordinator : adresse d'ecoute ([hote:]port) des workers
+                             d'un scan distribue, ou None pour un scan
+                             par le pool de processus local
+        :param local_workers : nombre de workers lances sur la machine du
+                               coordinateur
+        :param pool : pool partage avec d'autres scans (voir daemon.py),
+                      utilise a la place d'un pool propre au scan ; ses
+                      methodes close et join ne concernent que ce scan
         :return None
         """
         self.targets = targets
         self.queue = queue
         self.soft = soft
         self.port_steps = port_steps
-        self.max_port = max_port
         self.transport_protocols = transport_protocols
+        # sans ports precises, un scan complet porte sur tous les ports ;
+        # un scan soft laisse nmap choisir ses ports les plus connus.
+        if port_sets is None and not soft:
+            port_sets = {
+                transport_protocol: PortSet.from_range(MIN_PORT, MAX_PORT)
+                for transport_protocol in transport_protocols
+            }
+        # pour un scan partiel, les ports doivent etre connus pour etre
+        # compares au cache ou au journal : on precise ceux que nmap
+        # aurait choisis, d'apres nmap-services (une erreur est levee en
+        # son absence plutot que de scanner moins de ports).
+        if port_sets is None and (cache_ttl is not None or resume):
+            port_sets = {
+                transport_protocol: top_ports(
+                    NMAP_DEFAULT_PORTS, transport_protocol
+                )
+                for transport_protocol in transport_protocols
+            }
+        self.port_sets = port_sets
+        self.engine = engine
+        self.udp_engine = udp_engine
+        self.host_batch_size = host_batch_size
+        self.discovery = discovery
+        # le scan etant limite par les entrees/sorties (attente des
+        # reponses reseau) et non par le CPU, le nombre de processus est
+        # independant du nombre de coeurs.
+        if processes is None:
+            processes = config_dict["PROCESSES"]
+        self.processes = processes
+        self.max_rate = max_rate
+        self.max_host_probes = max_host_probes
+        self.max_host_tasks = max_host_tasks
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        # scan partiel : seuls les ports restant a scanner d'apres le
+        # cache et le journal sont scannes (voir plan_scan). Les machines
+        # et les ports ecartes sont comptes dans la progression.
+        self.partial_scan = False
+        self.cache_min_time = None
+        self.plan_skipped = {"hosts": 0, "ports": 0}
+        # le plan est etabli par le thread du pool qui consomme les
+        # requetes : il lit le cache par sa propre connexion, et transmet
+        # les machines reprises du cache au processus principal, seul a
+        # alimenter l'agregateur (voir merge_cached_hosts).
+        self.plan_cache = None
+        self.cached_hosts = collections.deque()
+        self.journal = journal
+        self.resume = resume
+        # travail deja effectue d'apres le journal, None hors reprise :
+        # {(cible, IP): {protocole: PortSet}}, machines hors-ligne et
+        # machines en ligne par cible (voir load_journal)
+        self.journal_done = None
+        self.journal_down = set()
+        self.journal_discovery = {}
 
-        # La classe Manager de la bibliotheque de multiprocessing
-        # permet de creer des classes qui sont utilisables au sein de
-        # plusieurs processus. Cela permet d'eviter de gerer les
-        # locks et autres soucis lies au multiprocessing.
-        self.manager = multiprocessing.Manager()
-        # liste de rapports de scan partagee entre les processus
-        self.targets_reports_list = self.manager.list()
-        # dictionnaire des listes d'IP/hosts et leurs versions
-        # (IPv4, IPv6) lies a une cible
+        # agregateur des rapports de scan, alimente par le processus
+        # principal au fur et a mesure que les processus de scan renvoient
+        # leurs resultats.
+        self.sinks = sinks
+        # correspondance entre les IP scannees et les cibles d'origine,
+        # renseignee par resolve_targets
+        self.target_map = TargetMap(targets)
+        self.aggregator = ReportAggregator(
+            targets, transport_protocols, self.target_map, sinks
+        )
+        # le nom des fichiers de sortie est fixe des le debut du scan, les
+        # sorties en flux etant ecrites pendant celui-ci.
+        if output_filename is None:
+            output_filename = datetime.datetime.now().strftime(
+                "%Y_%m_%d_%H_%M_%S"
+            )
+        self.output_filename = output_filename
+        if resolver is None:
+            resolver = Resolver(
+                cache,
+                config_dict["DNS_CACHE_TTL"],
+                config_dict["DNS_CONCURRENCY"],
+            )
+        self.resolver = resolver
+        # reseaux disjoints a scanner, issus de la fusion des reseaux de
+        # toutes les cibles (voir resolve_targets) : les requetes portent
+        # sur ces reseaux, et non sur les cibles d'origine.
+        self.scan_targets = []
+        # dictionnaire des reseaux d'IP lies a un reseau a scanner
         self.ip_host_list = {}
+        # mesures internes du scan, ajoutees au resume du rapport
+        self.metrics = ScanMetrics()
+        # ports ouverts dont les services restent a identifier, par
+        # machine : {(cible, IP): {protocole: set(ports)}} (voir
+        # run_version_phase)
+        self.version_ports = {}
+        # scan distribue : les requetes nmap sont executees par des
+        # workers, eventuellement lances localement (voir start_pool)
+        self.coordinator = coordinator
+        self.local_workers = local_workers
+        self.worker_processes = []
+        self.pool = pool
+        # progression de la phase en cours (voir run_tasks), consultable
+        # pendant le scan : {"phase", "percentage"}
+        self.progress = None
 
     def build_targets_reports(self):
         """
@@ -153,165 +872,21 @@ class NmapScan:
         #   }
         # }
         targets_reports = {}
-        targets_reports["reports"] = {}
-        # summary_stats est une variable temporaire permettant de stocker
-        # des informations globales sur le scan. Les donnees seront stockees
-        # dans targets_reports["summary"].
-        summary_stats = {
-            "totalhosts": 0,
-            "uphosts": 0,
-        }
-
-        for target in self.targets:
-            targets_reports["reports"][target] = {}
-            targets_reports["reports"][target]["report"] = {}
-
-            # la liste d'ip/host courante contient uniquement les
-            # cibles qui ont ete scannees comme "up".
-            # la transformation en set permet de supprimer les doublons.
-            # les ip/host sont testes un par un, il ne peut donc y avoir
-            # qu'une seul ip dans la case "scan" logiquement.
-            current_ip_host_list = set(
-                [
-                    r["metadata"]["ip_host"]
-                    for r in self.targets_reports_list
-                    if r["metadata"]["target"] == target
-                    and r["nmap"]["scanstats"]["uphosts"] != "0"
-                ]
+        # les rapports par cible ont ete agreges au fil du scan : il ne
+        # reste qu'a les recuperer, avec le nombre total de machines
+        # scannees et le nombre de machines en marche.
+        with self.metrics.timer("build_targets_reports"):
+            targets_reports["reports"], totalhosts, uphosts = (
+                self.aggregator.build()
             )
-
-            # le summary d'une cible contient quelques informations
-            # telles que le nombre de machines scannees, le nombre
-            # de machines en marche.
-            targets_reports["reports"][target]["summary"] = {
-                "totalhosts": len(
-                    set(
-                        [
-                            r["metadata"]["ip_host"]
-                            for r in self.targets_reports_list
-                            if r["metadata"]["target"] == target
-                        ]
-                    )
-                ),
-                "uphosts": len(current_ip_host_list),
-            }
-
-            # ajout aux summary_stats des donnees courantes concernant le
-            # nombre total de machines scannees et le nombre de machines
-            # en marche.
-            summary_stats["totalhosts"] += targets_reports["reports"][target][
-                "summary"
-            ]["totalhosts"]
-            summary_stats["uphosts"] += targets_reports["reports"][target][
-                "summary"
-            ]["uphosts"]
-
-            for ip_host in current_ip_host_list:
-                # pour chaque IP faisant partie d'une target
-                # (ipv4, ipv6, cidr...), on va stocker les
-                # informations dont on a besoin, c'est-a-dire
-                # le type d'IP (v4 ou v6), l'adresse MAC,
-                # les noms d'hotes, les ports ouverts, et les
-                # eventuelles erreurs rencontrees lors du scan.
-                targets_reports["reports"][target]["report"][ip_host] = {
-                    "type": self.ip_host_list[target]["type"],
-                    "mac": None,
-                    "hostnames": [],
-                    "ports": {},
-                    "errors": [],
-                }
-
-                # on avance dans les couches superieures, et on
-                # stocke alors, pour les protocoles TCP et UDP,
-                # les services ouverts et leurs versions.
-                for transport_protocol in self.transport_protocols:
-                    targets_reports["reports"][target]["report"][ip_host][
-                        "ports"
-                    ][transport_protocol] = {}
-
-                    # selection des rapports concernes
-                    # pour qu'un rapport soit "concerne", il
-                    # faut qu'il concerne la target que l'on cherche,
-                    # l'IP/host que l'on cherche, et le protocole
-                    # de transport que l'on cherche.
-                    # on cherche ces elements dans la liste
-                    # targets_reports_list, qui contient tous les
-                    # resultats de nos scans.
-                    selected_rep = [
-                        r
-                        for r in self.targets_reports_list
-                        if (
-                            r["metadata"]["target"] == target
-                            and r["metadata"]["ip_host"] == ip_host
-                            and r["metadata"]["transport_protocol"]
-                            == transport_protocol
-                        )
-                    ]
-                    for report in selected_rep:
-                        # cette condition en trois temps
-                        # permet simplement de stocker
-                        # la cle ("tcp" ou "udp") au lieu d'avoir
-                        # a ecrire var["tcp"] or var["udp"] a
-                        # chaque condition.
-                        if "tcp" in report["scan"][ip_host]:
-                            transport_key = "tcp"
-                        elif "udp" in report["scan"][ip_host]:
-                            transport_key = "udp"
-                        else:
-                            continue
-
-                        # stockage des erreurs et des avertissements
-                        # dans les metadonnees liees a la cible courante.
-                        if "error" in report["nmap"]["scaninfo"]:
-                            targets_reports["reports"][target]["report"][
-                                ip_host
-                            ]["errors"].append(
-                                report["nmap"]["scaninfo"]["error"]
-                            )
-                        if "warning" in report["nmap"]["scaninfo"]:
-                            targets_reports["reports"][target]["report"][
-                                ip_host
-                            ]["errors"].append(
-                                report["nmap"]["scaninfo"]["warning"]
-                            )
-
-                        # stockage des informations concernant les ports TCP
-                        # et UDP
-                        targets_reports["reports"][target]["report"][ip_host][
-                            "ports"
-                        ][transport_protocol].update(
-                            report["scan"][ip_host][transport_key]
-                        )
-
-                        # stockage de l'adresse MAC si elle est presente
-                        if "mac" in report["scan"][ip_host]["addresses"]:
-                            targets_reports["reports"][target]["report"][
-                                ip_host
-                            ]["mac"] = report["scan"][ip_host]["addresses"][
-                                "mac"
-                            ]
-
-                        # stockage des eventuels noms d'hote
-                        for hostname in report["scan"][ip_host]["hostnames"]:
-                            if (
-                                hostname
-                                not in targets_reports["reports"][target][
-                                    "report"
-                                ][ip_host]["hostnames"]
-                            ):
-                                targets_reports["reports"][target]["report"][
-                                    ip_host
-                                ]["hostnames"].append(hostname["name"])
         # recuperation de la date actuelle
         now = time.time()
 
-        # stockage des informations recoltees lors des boucles
-        # precedentes dans le summary de l'analyse.
+        # stockage des informations recoltees lors de l'agregation
+        # dans le summary de l'analyse.
         targets_reports["summary"] = {
             # filename correspond au nom de fichier de sortie
-            "filename": datetime.datetime.fromtimestamp(now).strftime(
-                "%Y_%m_%d_%H_%M_%S"
-            ),
+            "filename": self.output_filename,
             "soft": self.soft,
             # date
             "timestr": datetime.datetime.fromtimestamp(now).strftime(
@@ -320,170 +895,1225 @@ class NmapScan:
             # temps de scan
             "scan_time": self.scan_time,
             # machines en marche
-            "uphosts": summary_stats["uphosts"],
+            "uphosts": uphosts,
             # nombre de machines scannees
-            "totalhosts": summary_stats["totalhosts"],
+            "totalhosts": totalhosts,
+            # mesures internes du scan (durees, latences, occupation des
+            # processus), completees par l'ecriture des sorties
+            "stats": self.metrics.to_dict(),
         }
         return targets_reports
 
-    def process(self):
+    def iter_ip_hosts(self, target):
         """
-        Creation des sets de donnees a fournir au multi-processing
-        et demarrage de celui-ci.
+        Generateur des IP d'une cible : les adresses sont produites au fur
+        et a mesure, sans jamais construire la liste complete du reseau.
+        Si la phase de decouverte a eu lieu, seules les machines en ligne
+        sont produites.
 
         :param self : reference vers l'objet NmapScan parent.
-        :return None
+        :param target : cible dont on veut parcourir les IP
+        :return generateur d'IP (str)
         """
-        # lancement du chronometre
-        scan_start_time = time.time()
+        if "live" in self.ip_host_list[target]:
+            yield from self.ip_host_list[target]["live"]
+            return
+        for network in self.ip_host_list[target]["networks"]:
+            for ip_address in network:
+                yield str(ip_address)
 
-        # args est une liste contenant, pour chaque processus
-        # qui sera lance en parallele, un tuple d'arguments
-        # a envoyer a la fonction de requetage nmap, run_request.
-        # ce format est impose par la fonctionnalite de mapping
-        # (map et map_async dans notre cas) des Pools de la
-        # bibliotheque multiprocessing.
-        args = []
-        for target in self.targets:
-            # pour chaque cible, on recupere le type de donnees
-            # qu'est la cible : une IPv4, une IPv6, ou un hostname.
-            ip_host_list, target_type = self.get_ip_type(target)
-            # on stocke le resutat dans un dictionnaire
-            self.ip_host_list[target] = {
-                "list": ip_host_list,
-                "type": target_type,
-            }
-            for ip_host in ip_host_list:
-                # Dans le cas d'un scan "soft", seuls les ports
-                # TCP seront testes, ainsi que les ports les plus
-                # connus (well-known ports).
-                if self.soft:
-                    metadata = {
+    def count_ip_hosts(self, target):
+        """
+        Calcul du nombre d'IP produites par iter_ip_hosts pour une cible.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param target : cible dont on veut compter les IP
+        :return nombre d'IP
+        """
+        if "live" in self.ip_host_list[target]:
+            return len(self.ip_host_list[target]["live"])
+        return self.count_addresses(target)
+
+    def count_addresses(self, target):
+        """
+        Calcul du nombre d'adresses d'une cible, avant decouverte.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param target : cible dont on veut compter les adresses
+        :return nombre d'adresses
+        """
+        return sum(
+            network.num_addresses
+            for network in self.ip_host_list[target]["networks"]
+        )
+
+    def count_batches(self, target, batch_size):
+        """
+        Calcul du nombre de groupes produits par batch_ip_hosts.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param target : cible dont on veut regrouper les IP
+        :param batch_size : nombre de machines par groupe (0 : cible entiere)
+        :return nombre de groupes de machines
+        """
+        return sum(
+            1 if batch_size == 0 else -(-hosts_count // batch_size)
+            for hosts_count in self.count_families(target).values()
+            if hosts_count != 0
+        )
+
+    def count_families(self, target):
+        """
+        Calcul du nombre d'IP produites par iter_ip_hosts pour une cible,
+        par version d'IP.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param target : cible dont on veut compter les IP
+        :return dictionnaire {type d'IP: nombre d'IP}
+        """
+        counts = {}
+        if "live" in self.ip_host_list[target]:
+            for ip_host in self.ip_host_list[target]["live"]:
+                host_type = get_host_type(ip_host)
+                counts[host_type] = counts.get(host_type, 0) + 1
+            return counts
+        for network in self.ip_host_list[target]["networks"]:
+            counts[network.version] = (
+                counts.get(network.version, 0) + network.num_addresses
+            )
+        return counts
+
+    def batch_ip_hosts(self, target, batch_size):
+        """
+        Regroupement des IP d'une cible en groupes de machines a scanner
+        en un seul appel a nmap.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param target : cible dont on veut regrouper les IP
+        :param batch_size : nombre de machines par groupe (0 : cible entiere)
+        :return generateur de tuples (hotes a passer a nmap, liste des IP)
+        """
+        networks = self.ip_host_list[target]["networks"]
+        if (
+            batch_size == 0
+            and len(networks) == 1
+            and "live" not in self.ip_host_list[target]
+        ):
+            # le reseau est passe tel quel a nmap, ce qui evite une ligne
+            # de commande contenant toutes les adresses du reseau.
+            yield str(networks[0]), list(self.iter_ip_hosts(target))
+            return
+        # nmap ne scanne qu'une version d'IP par appel : les adresses d'un
+        # nom d'hote sont produites IPv4 d'abord, puis IPv6.
+        for _, family_hosts in itertools.groupby(
+            self.iter_ip_hosts(target), key=get_host_type
+        ):
+            while True:
+                ip_hosts = list(
+                    itertools.islice(family_hosts, batch_size or None)
+                )
+                if len(ip_hosts) == 0:
+                    break
+                yield " ".join(ip_hosts), ip_hosts
+
+    def count_ports(self, transport_protocols):
+        """
+        Calcul du nombre total de ports a scanner, chaque port comptant
+        pour chaque machine (voir AdaptiveChunkScheduler.weight). En scan
+        partiel, les ports ecartes d'apres le cache ou le journal sont
+        comptes au fur et a mesure comme traites (voir plan_hosts).
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param transport_protocols : protocoles de transport a scanner
+        :return nombre de ports
+        """
+        return sum(
+            self.count_ip_hosts(target) for target in self.scan_targets
+        ) * sum(
+            len(self.port_sets[transport_protocol])
+            for transport_protocol in transport_protocols
+        )
+
+    def iter_batches(self, target, transport_protocols):
+        """
+        Generateur des groupes de machines a scanner pour une cible, avec
+        les ports restant a scanner pour chacun.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param target : cible dont on veut regrouper les IP
+        :param transport_protocols : protocoles de transport a scanner
+        :return generateur de tuples (hotes a passer a nmap, liste des IP,
+                {protocole: PortSet} ou None pour les ports par defaut)
+        """
+        if not self.partial_scan:
+            for nmap_hosts, ip_hosts in self.batch_ip_hosts(
+                target, self.host_batch_size
+            ):
+                yield nmap_hosts, ip_hosts, self.port_sets
+            return
+        # pour un scan partiel, le plan est etabli au fil du scan, par
+        # tranches de PLAN_BATCH_SIZE machines : seules les IP d'une
+        # tranche sont en memoire, et les premieres requetes partent sans
+        # attendre que toutes les machines aient ete consultees.
+        chunk_size = PLAN_BATCH_SIZE
+        if self.host_batch_size != 0:
+            chunk_size = self.host_batch_size * max(
+                1, PLAN_BATCH_SIZE // self.host_batch_size
+            )
+        # le cache est interroge pour toute une tranche a la fois
+        chunk_size = min(chunk_size, MAX_QUERY_HOSTS)
+        for _, chunk in self.batch_ip_hosts(target, chunk_size):
+            # les machines ayant les memes ports a rescanner sont
+            # regroupees, afin de conserver des appels a nmap groupes (une
+            # tranche ne contient qu'une version d'IP).
+            groups = {}
+            for ip_host, remaining in self.plan_hosts(
+                target, chunk, transport_protocols
+            ):
+                key = tuple(
+                    remaining[p].to_nmap() for p in transport_protocols
+                )
+                if key not in groups:
+                    groups[key] = (remaining, [])
+                groups[key][1].append(ip_host)
+            for remaining, ip_hosts in groups.values():
+                batch_size = self.host_batch_size or len(ip_hosts)
+                for index in range(0, len(ip_hosts), batch_size):
+                    batch = ip_hosts[index : index + batch_size]
+                    yield " ".join(batch), batch, remaining
+
+    def select_protocols(self, transport_protocols):
+        """
+        Selection des protocoles de transport a scanner : TCP seulement en
+        scan soft, et uniquement ceux dont l'ensemble de ports n'est pas
+        vide.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param transport_protocols : protocoles de transport candidats
+        :return liste de protocoles de transport
+        """
+        if self.soft:
+            transport_protocols = [p for p in transport_protocols if p == "T"]
+        if self.port_sets is None:
+            return transport_protocols
+        return [p for p in transport_protocols if len(self.port_sets[p]) != 0]
+
+    def iter_work_units(self, transport_protocols):
+        """
+        Generateur des groupes de travail : un groupe de machines et un
+        protocole de transport, sans intervalle de ports. En scan soft,
+        chaque groupe correspond directement a une requete nmap ; en scan
+        complet, l'ordonnanceur y decoupe les intervalles de ports.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param transport_protocols : protocoles de transport a scanner
+        :return generateur de dictionnaires de metadonnees
+        """
+        # chaque element produit est le dictionnaire de metadonnees a
+        # envoyer a la fonction de requetage nmap, run_request, via la
+        # fonctionnalite de mapping (imap_unordered dans notre cas) des
+        # Pools de la bibliotheque multiprocessing.
+        # les requetes sont produites a la demande : les workers
+        # demarrent sans attendre que toutes les cibles soient parcourues.
+        # le numero de groupe, commun aux protocoles d'un meme groupe de
+        # machines, permet a l'ordonnanceur de borner les requetes
+        # simultanees par machine (voir AdaptiveChunkScheduler).
+        host_groups = itertools.count()
+        if self.partial_scan and self.cache_ttl is not None:
+            self.plan_cache = ResultCache(self.cache.path)
+        try:
+            yield from self.iter_target_units(transport_protocols, host_groups)
+        finally:
+            if self.plan_cache is not None:
+                self.plan_cache.close()
+                self.plan_cache = None
+
+    def iter_target_units(self, transport_protocols, host_groups):
+        """
+        Generateur des groupes de travail de l'ensemble des cibles (voir
+        iter_work_units).
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param transport_protocols : protocoles de transport a scanner
+        :param host_groups : compteur des groupes de machines
+        :return generateur de dictionnaires de metadonnees
+        """
+        for target in self.scan_targets:
+            for nmap_hosts, ip_hosts, port_sets in self.iter_batches(
+                target, transport_protocols
+            ):
+                host_group = next(host_groups)
+                # les machines d'un groupe ont toutes la meme version d'IP
+                target_type = get_host_type(ip_hosts[0])
+                for transport_protocol in transport_protocols:
+                    # si port_range est a nul, nmap scanne ses ports
+                    # les plus connus (scan soft).
+                    if port_sets is None:
+                        port_range = None
+                    elif len(port_sets[transport_protocol]) == 0:
+                        continue
+                    else:
+                        port_range = port_sets[transport_protocol].to_nmap()
+                    yield {
                         "target": target,
                         "target_type": target_type,
-                        "ip_host": ip_host,
-                        "transport_protocol": "T",
-                        "port_range": None,
+                        "ip_hosts": ip_hosts,
+                        "nmap_hosts": nmap_hosts,
+                        "hosts_count": len(ip_hosts),
+                        "transport_protocol": transport_protocol,
+                        "port_range": port_range,
+                        "host_group": host_group,
+                        "soft": self.soft,
+                        # les machines sont deja connues comme en ligne
+                        # si la phase de decouverte a eu lieu.
+                        "host_discovery": not self.discovery,
+                        # en scan complet, les versions ne sont detectees
+                        # qu'ensuite, sur les seuls ports ouverts (voir
+                        # run_version_phase) ; un scan soft ne fait qu'une
+                        # requete par groupe de machines.
+                        "version_detection": self.soft,
                     }
-                    args.append(
-                        (
-                            metadata,
-                            self.targets_reports_list,
+
+    def run_port_scan(self, pool, transport_protocols):
+        """
+        Scan des ports par nmap pour l'ensemble des cibles.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param pool : pool de processus
+        :param transport_protocols : protocoles de transport a scanner
+        :return None
+        """
+        transport_protocols = self.select_protocols(transport_protocols)
+        # Dans le cas d'un scan "soft", seuls les ports
+        # TCP seront testes, ainsi que les ports les plus
+        # connus (well-known ports) : une requete par groupe.
+        # La progression est comptee en machines, un scan partiel ne
+        # connaissant pas a l'avance le nombre de requetes.
+        if self.soft:
+            total_hosts = sum(
+                self.count_ip_hosts(target) for target in self.scan_targets
+            )
+            if total_hosts == 0 or len(transport_protocols) == 0:
+                return
+            done_hosts = [0]
+
+            def handle_soft_result(results):
+                done_hosts[0] += len(results)
+                self.aggregate_reports(results)
+
+            def handle_soft_failure(metadata):
+                done_hosts[0] += metadata["hosts_count"]
+
+            self.run_tasks(
+                pool,
+                run_request,
+                self.iter_work_units(transport_protocols),
+                handle_soft_result,
+                "du scan",
+                lambda done: (
+                    (done_hosts[0] + self.plan_skipped["hosts"]) / total_hosts
+                )
+                * 100,
+                handle_failure=handle_soft_failure,
+            )
+            return
+
+        total_ports = self.count_ports(transport_protocols)
+        if total_ports == 0:
+            return
+        # la taille des intervalles de ports est ajustee d'apres la vitesse
+        # de scan observee. peu de requetes sont preparees a l'avance afin
+        # que chaque nouvel intervalle profite des dernieres mesures.
+        scheduler = AdaptiveChunkScheduler(
+            self.iter_work_units(transport_protocols),
+            total_ports,
+            initial_chunk=self.port_steps,
+            min_chunk=config_dict["MIN_PORT_STEPS"],
+            max_chunk=config_dict["MAX_PORT_STEPS"],
+            chunk_duration=config_dict["CHUNK_DURATION"],
+            window=2 * self.processes,
+            max_host_tasks=self.max_host_tasks,
+        )
+
+        def handle_chunk_result(results):
+            # toutes les IP d'une requete partagent la meme duree de scan
+            if len(results) != 0:
+                scheduler.record(results[0].metadata, results[0].elapsed)
+            self.aggregate_reports(results)
+            for result in results:
+                self.request_versions(
+                    result.metadata["target"],
+                    result.ip_host,
+                    result.metadata["transport_protocol"],
+                    [p.port for p in result.ports if p.state == "open"],
+                )
+
+        try:
+            self.run_tasks(
+                pool,
+                run_request,
+                scheduler.iter_tasks(),
+                handle_chunk_result,
+                "du scan",
+                lambda done: scheduler.progress(self.plan_skipped["ports"]),
+                max_pending=2 * self.processes,
+                # les ports d'un intervalle en echec comptent tout de meme
+                # dans la progression
+                handle_failure=scheduler.skip,
+            )
+        finally:
+            scheduler.stop()
+
+    def aggregate_reports(self, results):
+        """
+        Agregation des resultats renvoyes par une requete nmap.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param results : liste de resultats (HostResult), un par IP
+        :return None
+        """
+        self.merge_cached_hosts()
+        for result in results:
+            self.add_report(result)
+        if self.cache is not None:
+            self.cache.commit()
+        if self.journal is not None:
+            self.journal.flush()
+        for sink in self.sinks:
+            sink.flush()
+
+    def load_journal(self):
+        """
+        Reprise d'un scan interrompu : les rapports du journal sont agreges
+        a nouveau, et le travail deja effectue est note pour ne pas etre
+        refait (voir plan_hosts).
+
+        :param self : reference vers l'objet NmapScan parent.
+        :return None
+        """
+        self.journal_done = {}
+        # ports ouverts trouves sans detection de versions, et ports dont
+        # les versions ont deja ete detectees
+        version_requested = {}
+        version_done = {}
+        reports_count = 0
+        for entry in self.journal.read():
+            if entry["kind"] == "discovery":
+                self.journal_discovery[entry["target"]] = entry["live"]
+            if entry["kind"] != "report":
+                continue
+            result = entry["result"]
+            self.aggregator.add(result)
+            reports_count += 1
+            metadata = result.metadata
+            key = (metadata["target"], result.ip_host)
+            if not result.up:
+                self.journal_down.add(key)
+                continue
+            if metadata["port_range"] is None:
+                continue
+            done = self.journal_done.setdefault(key, {})
+            protocol = metadata["transport_protocol"]
+            port_set = PortSet.from_nmap(metadata["port_range"])
+            done[protocol] = done.get(protocol, PortSet()) | port_set
+            # les journaux anterieurs au scan en deux phases ne contiennent
+            # que des requetes avec detection de versions.
+            if metadata.get("version_detection", True):
+                version_done.setdefault(key, {}).setdefault(
+                    protocol, set()
+                ).update(port_set)
+            else:
+                version_requested.setdefault(key, {}).setdefault(
+                    protocol, set()
+                ).update(p.port for p in result.ports if p.state == "open")
+        # la detection de versions reste a faire sur les ports ouverts
+        # pour lesquels elle n'a pas eu lieu avant l'interruption.
+        for (target, ip_host), requested in version_requested.items():
+            done = version_done.get((target, ip_host), {})
+            for protocol, ports in requested.items():
+                self.request_versions(
+                    target,
+                    ip_host,
+                    protocol,
+                    ports - done.get(protocol, set()),
+                )
+        logging.info(
+            "reprise : {} rapport(s) relu(s) dans le journal".format(
+                reports_count
+            )
+        )
+
+    def request_versions(self, target, ip_host, transport_protocol, ports):
+        """
+        Ajout de ports ouverts d'une machine a la detection de versions
+        (voir run_version_phase).
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param target : reseau scanne auquel appartient la machine
+        :param ip_host : adresse IP de la machine
+        :param transport_protocol : protocole de transport des ports
+        :param ports : numeros des ports ouverts
+        :return None
+        """
+        if len(ports) == 0:
+            return
+        self.version_ports.setdefault((target, ip_host), {}).setdefault(
+            transport_protocol, set()
+        ).update(ports)
+
+    def add_report(self, result):
+        """
+        Agregation d'un resultat portant sur une seule IP, et enregistrement
+        dans le cache des resultats et le journal le cas echeant.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param result : resultat de scan (HostResult)
+        :return None
+        """
+        self.aggregator.add(result)
+        if self.cache is not None:
+            self.cache.record(result)
+        if self.journal is not None:
+            self.journal.write_result(result)
+
+    def plan_scan(self):
+        """
+        Preparation d'un scan partiel (mode incremental ou reprise) : seuls
+        les ports qui ne sont ni deja scannes lors du scan interrompu (voir
+        load_journal), ni encore valides dans le cache, seront scannes. Le
+        plan est etabli au fil du scan des ports (voir plan_hosts).
+
+        :param self : reference vers l'objet NmapScan parent.
+        :return None
+        """
+        self.partial_scan = True
+        if self.cache_ttl is not None:
+            self.cache_min_time = time.time() - self.cache_ttl
+
+    def plan_hosts(self, target, ip_hosts, transport_protocols):
+        """
+        Calcul des ports restant a scanner pour une tranche de machines
+        d'un scan partiel. Les resultats encore valides du cache sont
+        agreges directement. Une machine hors-ligne d'apres le cache mais
+        trouvee en ligne par la phase de decouverte est entierement
+        rescannee.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param target : cible a laquelle appartiennent les machines
+        :param ip_hosts : liste d'IP de la tranche (meme version d'IP)
+        :param transport_protocols : protocoles de transport a scanner
+        :return liste de tuples (IP, {protocole: PortSet}) des machines
+                ayant des ports a scanner
+        """
+        full_scan = {p: self.port_sets[p] for p in transport_protocols}
+        full_count = sum(len(port_set) for port_set in full_scan.values())
+        # le cache est consulte pour toute la tranche a la fois : une
+        # requete par table, et non une par machine.
+        hosts = {}
+        if self.cache_ttl is not None:
+            hosts = self.plan_cache.lookup_hosts(ip_hosts, self.cache_min_time)
+            up_hosts = [ip for ip, host in hosts.items() if host["up"]]
+            fresh_ports = {}
+            cached_ports = {}
+            for p in transport_protocols:
+                fresh_ports[p] = self.plan_cache.fresh_ports(
+                    up_hosts, p, self.cache_min_time
+                )
+                cached_ports[p] = self.plan_cache.lookup_ports(up_hosts, p)
+        planned = []
+        for ip_host in ip_hosts:
+            target_type = get_host_type(ip_host)
+            remaining = dict(full_scan)
+            if self.journal_done is not None:
+                if (target, ip_host) in self.journal_down:
+                    self.skip_host(full_count)
+                    continue
+                done = self.journal_done.get((target, ip_host), {})
+                remaining = {
+                    p: remaining[p] - done.get(p, PortSet())
+                    for p in transport_protocols
+                }
+
+            host = hosts.get(ip_host)
+            if host is None or (self.discovery and not host["up"]):
+                pass
+            elif not host["up"]:
+                # hors-ligne lors d'un scan recent : pas de rescan
+                self.cached_hosts.append((ip_host, target_type, None, None))
+                self.skip_host(full_count)
+                continue
+            else:
+                host_ports = {}
+                for p in transport_protocols:
+                    fresh = fresh_ports[p].get(ip_host, PortSet())
+                    reused = remaining[p] & fresh
+                    host_ports[p] = {
+                        port: port_result
+                        for port, port_result in cached_ports[p]
+                        .get(ip_host, {})
+                        .items()
+                        if port in reused
+                    }
+                    remaining[p] = remaining[p] - fresh
+                self.cached_hosts.append(
+                    (ip_host, target_type, host, host_ports)
+                )
+
+            remaining_count = sum(len(r) for r in remaining.values())
+            if remaining_count == 0:
+                self.skip_host(full_count)
+                continue
+            self.plan_skipped["ports"] += full_count - remaining_count
+            planned.append((ip_host, remaining))
+        return planned
+
+    def merge_cached_hosts(self):
+        """
+        Agregation des machines reprises du cache par le plan d'un scan
+        partiel (voir plan_hosts). Appelee par le processus principal.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :return None
+        """
+        while len(self.cached_hosts) != 0:
+            ip_host, target_type, host, ports = self.cached_hosts.popleft()
+            if host is None:
+                self.aggregator.add_down_host(ip_host)
+            else:
+                self.aggregator.merge_cached_host(
+                    ip_host, target_type, host, ports
+                )
+
+    def skip_host(self, ports_count):
+        """
+        Prise en compte dans la progression d'une machine a jour, qui ne
+        sera pas rescannee.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param ports_count : nombre de ports ecartes pour la machine
+        :return None
+        """
+        self.plan_skipped["hosts"] += 1
+        self.plan_skipped["ports"] += ports_count
+
+    def run_tasks(
+        self,
+        pool,
+        function,
+        tasks,
+        handle_result,
+        label,
+        progress,
+        max_pending=None,
+        phase="port_scan",
+        handle_failure=None,
+    ):
+        """
+        Execution d'un ensemble de requetes par le pool de processus, avec
+        une file de requetes bornee et un suivi de la progression.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param pool : pool de processus
+        :param function : fonction executee par les processus du pool
+        :param tasks : iterable des arguments des requetes
+        :param handle_result : fonction appelee avec le resultat de chaque
+                               requete reussie
+        :param label : nom de l'etape affiche dans les logs de progression
+        :param progress : fonction renvoyant le pourcentage de progression
+                          a partir du nombre de requetes terminees (y
+                          compris celles en echec)
+        :param max_pending : nombre maximal de requetes en attente
+                             (MAX_PENDING_TASKS par defaut)
+        :param phase : nom de la phase dans les mesures du scan
+        :param handle_failure : fonction appelee avec les arguments de
+                                chaque requete en echec, ou None
+        :return None
+        """
+        tracker = ProgressTracker(label, config_dict["PROGRESS_INTERVAL"])
+        phase_metrics = self.metrics.start_phase(phase, self.processes)
+        # la file de requetes est bornee : le generateur d'arguments est
+        # bloque tant que trop de requetes sont en attente, ce qui garde
+        # une consommation memoire constante quelle que soit la taille
+        # des reseaux a scanner.
+        if max_pending is None:
+            max_pending = config_dict["MAX_PENDING_TASKS"]
+        pending_slots = threading.BoundedSemaphore(max_pending)
+        # nombre de requetes mises en file (profondeur de la file)
+        submitted = [0]
+        # requetes sans resultat, par date de mise en file (rendue unique,
+        # et renvoyee avec chaque resultat) : une requete dont le resultat
+        # n'a pu etre transmis est identifiee par elimination, afin que
+        # handle_failure libere les ressources qui lui sont reservees.
+        in_flight = {}
+        in_flight_lock = threading.Lock()
+
+        def bounded_tasks():
+            for task in tasks:
+                pending_slots.acquire()
+                submitted[0] += 1
+                queued_at = time.time()
+                with in_flight_lock:
+                    while queued_at in in_flight:
+                        queued_at = math.nextafter(queued_at, math.inf)
+                    in_flight[queued_at] = task
+                # chaque requete est executee par run_timed, qui mesure
+                # son attente dans la file et sa duree.
+                yield function, task, queued_at
+
+        # imap_unordered consomme le generateur d'arguments au fur et a
+        # mesure, et rend la main a chaque requete terminee, ce qui permet
+        # de liberer une place dans la file et de mettre a jour la
+        # progression. La boucle se termine des que la derniere requete
+        # est terminee.
+        results = pool.imap_unordered(run_timed, bounded_tasks())
+        done = 0
+        # nombre de requetes dont le resultat n'a pu etre transmis, et
+        # qui n'ont pas encore ete identifiees
+        lost = 0
+        while True:
+            try:
+                payload, timing = next(results)
+            except StopIteration:
+                break
+            except Exception as exception:
+                # echec de la transmission du resultat lui-meme
+                logging.error(
+                    "une requete nmap a echoue : {}".format(exception)
+                )
+                timing = None
+                lost += 1
+            else:
+                with in_flight_lock:
+                    in_flight.pop(timing["queued_at"], None)
+                if timing["error"] is not None:
+                    logging.error(
+                        "une requete nmap a echoue : {}".format(
+                            timing["error"]
                         )
                     )
+                    if handle_failure is not None:
+                        handle_failure(timing["task"])
                 else:
-                    for transport_protocol in self.transport_protocols:
-                        # creation des intervalles de ports dont
-                        # le scan est a paralleliser
-                        ports_ranges = list(
-                            range(0, self.max_port + 1, self.port_steps)
+                    with self.metrics.timer("unpack"):
+                        reports = unpack_reports(payload)
+                    with self.metrics.timer("aggregate"):
+                        handle_result(reports)
+            # les requetes perdues sont connues des que toutes les autres
+            # requetes mises en file ont rendu leur resultat.
+            if lost != 0:
+                with in_flight_lock:
+                    orphans = []
+                    if len(in_flight) == lost:
+                        orphans = list(in_flight.values())
+                        in_flight.clear()
+                if len(orphans) != 0:
+                    lost = 0
+                    if handle_failure is not None:
+                        for task in orphans:
+                            handle_failure(task)
+            # requetes en attente ou en cours, y compris celle-ci
+            self.metrics.record_task(
+                phase_metrics, timing, submitted[0] - done
+            )
+            pending_slots.release()
+            done += 1
+            percentage = progress(done)
+            tracker.update(percentage)
+            self.progress = {"phase": phase, "percentage": percentage}
+        self.metrics.end_phase(phase_metrics)
+        if done != 0:
+            tracker.finish()
+
+    def run_discovery_phase(self, pool):
+        """
+        Decouverte des machines en ligne (ping scan nmap) avant le scan des
+        ports : seules les machines en ligne seront ensuite scannees, les
+        autres etant directement comptees comme hors-ligne.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param pool : pool de processus
+        :return None
+        """
+        batch_size = config_dict["DISCOVERY_BATCH_SIZE"]
+        live_hosts = {target: set() for target in self.scan_targets}
+        # en reprise, la decouverte terminee n'est pas refaite
+        if all(
+            target in self.journal_discovery for target in self.scan_targets
+        ):
+            for target in self.scan_targets:
+                live_hosts[target].update(self.journal_discovery[target])
+            self.apply_discovery(live_hosts)
+            return
+
+        def iter_discovery_args():
+            for target in self.scan_targets:
+                batches = self.batch_ip_hosts(target, batch_size)
+                for nmap_hosts, ip_hosts in batches:
+                    yield {
+                        "target": target,
+                        "target_type": get_host_type(ip_hosts[0]),
+                        "nmap_hosts": nmap_hosts,
+                        "hosts_count": len(ip_hosts),
+                    }
+
+        def handle_discovery_result(result):
+            target, ip_hosts = result
+            live_hosts[target].update(ip_hosts)
+
+        total_tasks = sum(
+            self.count_batches(target, batch_size)
+            for target in self.scan_targets
+        )
+        self.run_tasks(
+            pool,
+            run_discovery,
+            iter_discovery_args(),
+            handle_discovery_result,
+            "de la decouverte",
+            lambda done: (done / total_tasks) * 100,
+            phase="discovery",
+        )
+        self.apply_discovery(live_hosts)
+
+    def apply_discovery(self, live_hosts):
+        """
+        Prise en compte des resultats de la phase de decouverte.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param live_hosts : IP en ligne par cible {cible: set(IP)}
+        :return None
+        """
+        for target in self.scan_targets:
+            # les machines hors-ligne sont comptees des maintenant dans
+            # le resume, et ne feront l'objet d'aucun scan de ports.
+            live_list = []
+            for ip_host in self.iter_ip_hosts(target):
+                if ip_host in live_hosts[target]:
+                    live_list.append(ip_host)
+                else:
+                    self.aggregator.add_down_host(ip_host)
+                    if self.cache is not None:
+                        self.cache.record_host(
+                            ip_host, get_host_type(ip_host), False
                         )
+            self.ip_host_list[target]["live"] = live_list
+            if self.journal is not None:
+                self.journal.write(
+                    {"kind": "discovery", "target": target, "live": live_list}
+                )
+            logging.info(
+                "decouverte : {} machine(s) en ligne sur {} pour {}".format(
+                    len(live_list),
+                    self.count_addresses(target),
+                    target,
+                )
+            )
+
+    def run_connect_phase(self):
+        """
+        Scan des ports TCP via le moteur connect() asynchrone. Les rapports
+        obtenus sont agreges directement, et nmap n'est ensuite utilise que
+        pour detecter les versions des services sur les ports ouverts.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :return None
+        """
+        # en scan soft sans ports precises, on se limite aux ports bien
+        # connus (1-1023)
+        if self.port_sets is None:
+            ports = PortSet.from_range(MIN_PORT, 1023)
+        else:
+            ports = self.port_sets["T"]
+        port_range = ports.to_nmap()
+
+        def iter_all_ip_hosts():
+            for target in self.scan_targets:
+                yield from self.iter_ip_hosts(target)
+
+        results, elapsed = run_connect_scan(
+            iter_all_ip_hosts,
+            sum(self.count_ip_hosts(target) for target in self.scan_targets),
+            ports,
+            concurrency=config_dict["CONNECT_CONCURRENCY"],
+            timeout=config_dict["CONNECT_TIMEOUT"],
+            max_rate=self.max_rate,
+            max_host_probes=self.max_host_probes,
+        )
+
+        for target in self.scan_targets:
+            for ip_host in self.iter_ip_hosts(target):
+                # une machine n'ayant repondu a aucune sonde n'est pas pour
+                # autant hors-ligne (filtrage) : seuls nmap et la phase de
+                # decouverte en decident, elle n'est donc enregistree comme
+                # telle ni dans le cache, ni dans le journal.
+                if ip_host not in results:
+                    self.aggregator.add_down_host(ip_host)
+                    continue
+                target_type = get_host_type(ip_host)
+                host_result = results[ip_host]
+                target_report = build_report(
+                    ip_host, target_type, host_result, elapsed
+                )
+                target_report["metadata"] = {
+                    "target": target,
+                    "target_type": target_type,
+                    "ip_host": ip_host,
+                    "transport_protocol": "T",
+                    "port_range": port_range,
+                    "soft": self.soft,
+                    "host_discovery": True,
+                    "version_detection": False,
+                }
+                self.add_report(HostResult.from_report(target_report))
+                self.request_versions(
+                    target, ip_host, "T", host_result["open"]
+                )
+
+    def run_udp_phase(self):
+        """
+        Scan des ports UDP via des sondes asynchrones (voir udp_scan.py).
+        Les ports ayant repondu sont agreges directement, et nmap n'est
+        ensuite utilise que pour detecter les versions de leurs services.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :return None
+        """
+        ports = self.port_sets["U"]
+        port_range = ports.to_nmap()
+
+        def iter_all_ip_hosts():
+            for target in self.scan_targets:
+                yield from self.iter_ip_hosts(target)
 
-                        # si le dernier port n'est pas dans la liste,
-                        # c'est que les intervalles ne tombent pas
-                        # "pile" sur le dernier numero de port, on
-                        # le rajoute donc "a la main".
-                        if ports_ranges[-1] != self.max_port:
-                            ports_ranges.append(self.max_port)
-                        for index in range(1, len(ports_ranges)):
-                            min_port = ports_ranges[index - 1]
-                            max_port = ports_ranges[index]
-                            port_range = "{}-{}".format(min_port, max_port)
-                            # creation du dictionnaire de metadonnees pour
-                            # l'appel a la fonction de requetage
-                            metadata = {
-                                "target": target,
-                                "target_type": target_type,
-                                "ip_host": ip_host,
-                                "transport_protocol": transport_protocol,
-                                "port_range": port_range,
-                            }
-                            # ajout dans la liste de tuples d'arguments
-                            args.append(
-                                (
-                                    metadata,
-                                    self.targets_reports_list,
-                                )
+        results, elapsed, retransmissions = run_udp_scan(
+            iter_all_ip_hosts,
+            sum(self.count_ip_hosts(target) for target in self.scan_targets),
+            order_udp_ports(ports),
+            concurrency=config_dict["UDP_CONCURRENCY"],
+            timeout=config_dict["UDP_TIMEOUT"],
+            retries=config_dict["UDP_RETRIES"],
+            max_rate=self.max_rate,
+            max_host_probes=self.max_host_probes,
+        )
+        self.metrics.increment("udp_retransmissions", retransmissions)
+
+        for target in self.scan_targets:
+            for ip_host in self.iter_ip_hosts(target):
+                # une machine muette en UDP n'est pas pour autant
+                # hors-ligne : elle n'est pas enregistree comme telle dans
+                # le cache ni dans le journal.
+                if ip_host not in results:
+                    self.aggregator.add_down_host(ip_host)
+                    continue
+                target_type = get_host_type(ip_host)
+                open_ports = results[ip_host]["open"]
+                metadata = {
+                    "target": target,
+                    "target_type": target_type,
+                    "transport_protocol": "U",
+                    "port_range": port_range,
+                    "soft": self.soft,
+                    "host_discovery": True,
+                    "version_detection": False,
+                }
+                self.add_report(
+                    HostResult(
+                        metadata,
+                        ip_host,
+                        True,
+                        ports=[
+                            PortResult(
+                                port,
+                                "open",
+                                "udp-response",
+                                UDP_PROBES.get(port, ("",))[0],
                             )
-        # s'il n'y a aucun argument, alors on peut quitter cette fonction
-        # puisque cela signifie que l'on n'a pas d'appel a faire a la
-        # fonction de requetage.
-        if len(args) == 0:
+                            for port in open_ports
+                        ],
+                        elapsed=elapsed,
+                    )
+                )
+                self.request_versions(target, ip_host, "U", open_ports)
+
+    def iter_version_tasks(self):
+        """
+        Generateur des requetes de detection de versions : une seule
+        requete par machine et par protocole, portant sur l'ensemble des
+        ports ouverts de la machine.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :return generateur de dictionnaires de metadonnees
+        """
+        for (target, ip_host), protocol_ports in self.version_ports.items():
+            for transport_protocol, ports in protocol_ports.items():
+                if len(ports) == 0:
+                    continue
+                yield {
+                    "target": target,
+                    "target_type": get_host_type(ip_host),
+                    "ip_hosts": [ip_host],
+                    "nmap_hosts": ip_host,
+                    "transport_protocol": transport_protocol,
+                    "port_range": PortSet.from_ports(ports).to_nmap(),
+                    "soft": self.soft,
+                    # la machine est deja connue comme etant en ligne
+                    "host_discovery": False,
+                    "version_detection": True,
+                }
+
+    def run_version_phase(self, pool):
+        """
+        Detection des versions des services, une fois les ports ouverts
+        trouves par le scan des ports (nmap sans -sV, ou moteurs
+        asynchrones). Les resultats remplacent ceux des memes ports dans
+        les rapports, le cache et le journal.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :param pool : pool de processus
+        :return None
+        """
+        total_tasks = sum(
+            len([ports for ports in protocol_ports.values() if ports])
+            for protocol_ports in self.version_ports.values()
+        )
+        if total_tasks == 0:
             return
+        logging.info(
+            "detection de versions sur {} machine(s)".format(
+                len(self.version_ports)
+            )
+        )
+        self.run_tasks(
+            pool,
+            run_request,
+            self.iter_version_tasks(),
+            self.aggregate_reports,
+            "de la detection de versions",
+            lambda done: (done / total_tasks) * 100,
+            phase="version_detection",
+        )
+
+    def build_nmap_options(self):
+        """
+        Options nmap de limitation communes a toutes les requetes.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :return options nmap (voir build_nmap_options)
+        """
+        return build_nmap_options(
+            self.max_rate, self.max_host_probes, self.max_host_tasks
+        )
+
+    def start_pool(self):
+        """
+        Creation du pool executant les requetes nmap : pool de processus
+        local, ou coordinateur d'un scan distribue (DistributedPool) et
+        ses workers locaux. Un pool fourni a la creation du scan est
+        utilise tel quel.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :return pool (interface de multiprocessing.Pool)
+        """
+        # pool maintenu entre plusieurs scans (daemon)
+        if self.pool is not None:
+            return self.pool
+        if self.coordinator is None:
+            return create_pool(
+                self.processes,
+                self.queue,
+                self.max_rate,
+                self.build_nmap_options(),
+            )
+        # le nombre de processus designe alors le nombre total de requetes
+        # simultanees attendu de l'ensemble des workers.
+        pool = DistributedPool(
+            parse_address(self.coordinator),
+            REMOTE_FUNCTIONS,
+            {
+                "max_rate": self.max_rate,
+                "max_host_probes": self.max_host_probes,
+                "max_host_tasks": self.max_host_tasks,
+            },
+            token=config_dict["DISTRIBUTED_TOKEN"],
+            lease_duration=config_dict["DISTRIBUTED_LEASE"],
+            max_attempts=config_dict["DISTRIBUTED_MAX_ATTEMPTS"],
+            metrics=self.metrics,
+        )
+        # les workers locaux joignent le coordinateur par la boucle locale
+        # s'il ecoute sur toutes les interfaces, et se partagent les
+        # processus.
+        host, port = pool.address
+        if host == "0.0.0.0":
+            host = "127.0.0.1"
+        elif host == "::":
+            host = "::1"
+        address = "[{}]:{}".format(host, port)
+        for index in range(self.local_workers):
+            worker_process = multiprocessing.Process(
+                target=run_worker_process,
+                args=(
+                    address,
+                    max(1, self.processes // self.local_workers),
+                    self.queue,
+                ),
+                name="worker-{}".format(index + 1),
+            )
+            worker_process.start()
+            self.worker_processes.append(worker_process)
+        return pool
+
+    def process(self):
+        """
+        Creation des sets de donnees a fournir au multi-processing
+        et demarrage de celui-ci.
+
+        :param self : reference vers l'objet NmapScan parent.
+        :return None
+        """
+        # lancement du chronometre
+        scan_start_time = time.time()
+
+        # pour chaque cible, on recupere les reseaux d'adresses a scanner :
+        # une IPv4, une IPv6, un CIDR, ou les adresses d'un hostname.
+        with self.metrics.timer("resolve_targets"):
+            self.resolve_targets()
+
         # Pool est une classe issue de la bibliotheque multiprocessing
         # permettant de creer des groupes d'appels a une fonction qui
         # vont etre automatiquement schedules pour etre executes.
-        # Pool detecte automatiquement le nombre maximal de CPU utilisables,
-        # et donc le nombre maximal de processus que l'on peut paralleliser.
-        # c'est pourquoi il n'est pas utile de le preciser.
-        pool = multiprocessing.Pool(
-            initializer=worker_init, initargs=[self.queue]
-        )
-        # la fonction map asynchrone permet, par rapport a la
-        # fonction map de continuer l'execution du programme principal
-        # parallelement au pool de processus.
-        result = pool.map_async(run_request, args)
-        # Ainsi, on peut effectuer des actions en parallele, comme
-        # par exemple afficher des messages sur la progression du
-        # scan, comme ci-dessous.
-        total_processes = len(args)
-
-        # Tant que le resultat n'est pas pret, c'est-a-dire
-        # tant que le pool n'a pas fini
-        while not result.ready():
-            # on compte les processus du pool qui sont termines
-            done = len(self.targets_reports_list)
-
-            # calcul de la difference de temps entre le debut du scan
-            # et le moment courant
-            now = time.time()
-            progress_percentage = (done / total_processes) * 100
-            time_delta = str(datetime.timedelta(seconds=now - scan_start_time))
+        # Le nombre de processus est configurable (PROCESSES, option -j) ;
+        # il est conserve pour dimensionner l'ordonnanceur des intervalles
+        # de ports. Le limiteur de debit, en memoire partagee, est transmis
+        # a chaque processus lors de son initialisation. En scan distribue,
+        # le pool est remplace par le coordinateur (voir start_pool).
+        with self.metrics.timer("pool_start"):
+            pool = self.start_pool()
+        try:
+            if self.resume:
+                with self.metrics.timer("load_journal"):
+                    self.load_journal()
+            if self.discovery:
+                with self.metrics.timer("discovery"):
+                    self.run_discovery_phase(pool)
 
-            logging.info(
-                "progression du scan : {:.1f}%, temps ecoule : {}".format(
-                    progress_percentage, time_delta
+            # les moteurs asynchrones (connect() pour TCP, sondes UDP)
+            # remplacent nmap pour le scan des ports de leur protocole.
+            protocols = self.select_protocols(self.transport_protocols)
+            if self.engine == "connect" and "T" in protocols:
+                with self.metrics.timer("connect_scan"):
+                    self.run_connect_phase()
+            if self.udp_engine == "async" and "U" in protocols:
+                with self.metrics.timer("udp_scan"):
+                    self.run_udp_phase()
+            nmap_protocols = [
+                p
+                for p in self.transport_protocols
+                if not (p == "T" and self.engine == "connect")
+                and not (p == "U" and self.udp_engine == "async")
+            ]
+
+            # le mode incremental et la reprise ne concernent que nmap :
+            # les moteurs asynchrones rescannent tout, mais alimentent le
+            # cache et le journal.
+            if (self.cache_ttl is not None or self.resume) and len(
+                self.select_protocols(nmap_protocols)
+            ) != 0:
+                self.plan_scan()
+            with self.metrics.timer("port_scan"):
+                self.run_port_scan(pool, nmap_protocols)
+            if self.partial_scan:
+                self.aggregate_reports([])
+                logging.info(
+                    "{} machine(s) a jour, non rescannee(s)".format(
+                        self.plan_skipped["hosts"]
+                    )
                 )
-            )
-            time.sleep(10)
-        pool.close()
-        # Pour pas que les processus ne quittent avant la fonction principale
-        pool.join()
+            # les versions des services ne sont detectees qu'une fois tous
+            # les ports ouverts connus, en une requete par machine.
+            with self.metrics.timer("version_detection"):
+                self.run_version_phase(pool)
+        except BaseException:
+            pool.terminate()
+            for worker_process in self.worker_processes:
+                worker_process.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            # Pour pas que les processus ne quittent avant la fonction
+            # principale
+            with self.metrics.timer("pool_stop"):
+                pool.join()
+                for worker_process in self.worker_processes:
+                    worker_process.join()
 
         # calcul de la duree du scan
         now = time.time()
         time_delta = str(datetime.timedelta(seconds=now - scan_start_time))
-        logging.info(
-            "progression du scan : 100%, temps ecoule : {}".format(time_delta)
-        )
+        logging.info("duree totale du scan : {}".format(time_delta))
         self.scan_time = time_delta
+        self.metrics.add_stage("scan", now - scan_start_time)
 
-    def get_ip_type(self, target):
+    def resolve_targets(self):
         """
-        Pour une cible donnee, recuperation de la liste d'IP que l'on va
-        devoir scanner.
+        Pour chaque cible, recuperation des reseaux d'IP que l'on va
+        devoir scanner. Les noms d'hote sont resolus tous ensemble, de
+        maniere concurrente. Les reseaux de toutes les cibles sont ensuite
+        fusionnes en reseaux disjoints : une adresse commune a plusieurs
+        cibles n'est scannee qu'une fois. Les adresses ne sont pas
+        enumerees ici : les reseaux sont parcourus a la demande par
+        iter_ip_hosts.
 
-        :param target : cible (ipv4, ipv6, cidr, host...)
-        :return tuple IP/Hote, type (ipv4, ipv6 ou 0 pour un nom d'hote)
+        :param self : reference vers l'objet NmapScan parent.
+        :return None
         """
-        try:
-            # recuperation des adresses, tres utile pour les CIDR.
-            # l'option strict=False permet d'autoriser des entrees comme
-            # 192.168.1.1/24, le dernier "1" etant illegitime dans
-            # une representation reseau classique, mais autorise avec nmap.
-            ip_addresses = ipaddress.ip_network(address=target, strict=False)
-        except ValueError:
-            # si cela echoue, c'est que la string ne correspond
-            # ni a une IPv4 ni a une IPV6.
-            # 0 correspond a un hostname, on recupere alors son IP
-            corresponding_ip = socket.gethostbyname(target)
-            return self.get_ip_type(corresponding_ip)
-        ip_host_list = [str(ip) for ip in ip_addresses]
-        host_type = ip_addresses.version
-        return ip_host_list, host_type
+        hostnames = []
+        for target in self.targets:
+            try:
+                # l'option strict=False permet d'autoriser des entrees
+                # comme 192.168.1.1/24, le dernier "1" etant illegitime
+                # dans une representation reseau classique, mais autorise
+                # avec nmap.
+                network = ipaddress.ip_network(address=target, strict=False)
+            except ValueError:
+                # si cela echoue, c'est que la string ne correspond
+                # ni a une IPv4 ni a une IPV6 : c'est un hostname.
+                hostnames.append(target)
+                continue
+            self.target_map.add(target, [network])
+        # les noms sont resolus sous leur forme normalisee (minuscules,
+        # sans point final), qui sert aussi de cle du cache DNS.
+        resolved, failures = self.resolver.resolve(
+            [normalize_target(target) for target in hostnames]
+        )
+        for target in hostnames:
+            # un nom non resolu n'a aucune adresse a scanner : l'erreur
+            # est reportee dans le rapport de la cible.
+            if normalize_target(target) in failures:
+                self.aggregator.add_target_error(
+                    target, failures[normalize_target(target)]
+                )
+            self.target_map.add(
+                target,
+                [
+                    ipaddress.ip_network(address)
+                    for address in resolved[normalize_target(target)]
+                ],
+            )
+        self.target_map.build()
+        for network in self.target_map.networks:
+            self.scan_targets.append(str(network))
+            self.ip_host_list[str(network)] = {"networks": [network]}
+        logging.info(
+            "{} cible(s) regroupee(s) en {} reseau(x) a scanner".format(
+                len(self.targets), len(self.scan_targets)
+            )
+        )
 
 
-def launch_processes(soft, targets, stdout_handler, output_file_handler):
+def launch_processes(
+    soft, targets, stdout_handler, output_file_handler, options
+):
     """
     Lancement des processus pour scanner les cibles.
 
@@ -492,6 +2122,7 @@ def launch_processes(soft, targets, stdout_handler, output_file_handler):
     :param stdout_handler : reference vers la sortie standard des logs
     :param output_file_handler : reference vers la sortie des logs dans un
                                  fichier
+    :param options : dictionnaire des options de scan (moteur...)
     :return liste de rapports sur chaque cible
     """
     if len(targets) == 0:
@@ -502,12 +2133,81 @@ def launch_processes(soft, targets, stdout_handler, output_file_handler):
     queue_listener, queue = multiprocessing_logger_init(
         stream_handler=stdout_handler, file_handler=output_file_handler
     )
-    scan = NmapScan(targets=targets, queue=queue, soft=soft)
-    # lancement du scan
-    scan.process()
+    # le cache des resultats est alimente a chaque scan ; il n'est lu
+    # qu'en mode incremental.
+    cache = None
+    if options["cache_path"]:
+        cache = ResultCache(options["cache_path"])
+    # le journal permet de reprendre le scan s'il est interrompu
+    journal = None
+    if options["journal_path"]:
+        journal = ScanJournal(options["journal_path"])
+        journal.open(
+            targets,
+            soft,
+            options["port_sets"],
+            {"T": options["engine"], "U": options["udp_engine"]},
+            options["resume"],
+        )
+    # les sorties en flux (JSON Lines, CSV) sont ecrites pendant le scan
+    output_filename = datetime.datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+    sinks = open_stream_writers(output_filename, options["output_formats"])
+    scan = NmapScan(
+        targets=targets,
+        queue=queue,
+        soft=soft,
+        engine=options["engine"],
+        udp_engine=options["udp_engine"],
+        host_batch_size=options["host_batch_size"],
+        discovery=options["discovery"],
+        port_sets=options["port_sets"],
+        processes=options["processes"],
+        max_rate=options["max_rate"],
+        max_host_probes=options["max_host_probes"],
+        max_host_tasks=options["max_host_tasks"],
+        cache=cache,
+        cache_ttl=options["cache_ttl"] if options["incremental"] else None,
+        journal=journal,
+        resume=options["resume"],
+        sinks=sinks,
+        output_filename=output_filename,
+        coordinator=options["coordinator"],
+        local_workers=options["local_workers"],
+    )
+    try:
+        # lancement du scan
+        scan.process()
+    finally:
+        if cache is not None:
+            cache.close()
+        if journal is not None:
+            journal.close()
+        for sink in sinks:
+            sink.close()
     # creation du dictionnaire de sortie
     targets_reports = scan.build_targets_reports()
 
     queue_listener.stop()
     logging.info("scans effectues avec succes")
     return targets_reports
+
+
+def run_worker(address, stdout_handler, output_file_handler, processes):
+    """
+    Lancement d'un worker de scan distribue, qui execute les requetes
+    d'un coordinateur jusqu'a la fin du scan.
+
+    :param address : adresse du coordinateur ([hote:]port)
+    :param stdout_handler : reference vers la sortie standard des logs
+    :param output_file_handler : reference vers la sortie des logs dans un
+                                 fichier
+    :param processes : nombre de requetes executees simultanement
+    :return None
+    """
+    queue_listener, queue = multiprocessing_logger_init(
+        stream_handler=stdout_handler, file_handler=output_file_handler
+    )
+    try:
+        run_worker_process(address, processes, queue)
+    finally:
+        queue_listener.stop()
@@ -0,0 +1,842 @@
+"""
+Repartition des requetes d'un scan entre plusieurs machines : un
+coordinateur distribue les requetes a des workers distants, par un
+protocole simple de messages JSON sur TCP (un message par ligne).
+
+Deroulement d'une connexion :
+    - worker -> coordinateur : "hello" (version du protocole, defi
+      aleatoire, nombre de requetes simultanees acceptees) ;
+    - coordinateur -> worker : "challenge" (preuve de connaissance du
+      jeton partage, calculee sur le defi du worker, et defi du
+      coordinateur), ou "error" ;
+    - worker -> coordinateur : "auth" (preuve calculee sur le defi du
+      coordinateur), si la preuve du coordinateur est valide ;
+    - coordinateur -> worker : "welcome" (parametres du scan, duree du
+      bail), ou "error" si le worker est refuse ;
+    - coordinateur -> worker : "task" (identifiant, nom de la fonction,
+      argument, date de mise en file) ;
+    - worker -> coordinateur : "result" (identifiant, resultat converti en
+      JSON, mesures de la requete), et "heartbeat" a intervalle regulier ;
+    - coordinateur -> worker : "stop" une fois toutes les requetes
+      terminees.
+
+Le jeton lui-meme ne circule pas : chaque partie prouve qu'elle le
+connait par un HMAC des deux defis (voir sign). Les workers executant
+nmap en root, ni le coordinateur ni les workers n'acceptent de jeton
+vide.
+
+Les requetes confiees a un worker lui sont attribuees pour la duree d'un
+bail, renouvele par chacun de ses messages. Si le worker se deconnecte ou
+laisse expirer son bail, ses requetes en cours sont redistribuees aux
+autres workers.
+
+:file distributed.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import collections
+import functools
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import queue
+import secrets
+import socket
+import threading
+import time
+
+# version du protocole, verifiee lors de la connexion d'un worker
+PROTOCOL_VERSION = 2
+# taille maximale d'un message (octets)
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+# delai accorde a un worker pour se presenter (secondes)
+HANDSHAKE_TIMEOUT = 10
+# tentatives de connexion d'un worker au coordinateur (une par seconde)
+CONNECT_ATTEMPTS = 30
+# intervalle entre deux avertissements en l'absence de worker (secondes)
+IDLE_WARNING_INTERVAL = 30
+# attente maximale de la deconnexion des workers en fin de scan (secondes)
+JOIN_TIMEOUT = 30
+
+
+def parse_address(address, default_host=""):
+    """
+    Analyse d'une adresse au format [hote:]port ; les adresses IPv6 sont
+    ecrites entre crochets ([::1]:7878).
+
+    :param address : adresse (str)
+    :param default_host : hote utilise si l'adresse n'en precise pas
+    :return tuple (hote, port)
+    """
+    host, separator, port = address.rpartition(":")
+    if not separator:
+        host, port = default_host, address
+    try:
+        return host.strip("[]"), int(port)
+    except ValueError:
+        raise ValueError("adresse invalide : {}".format(address))
+
+
+def sign(token, role, *nonces):
+    """
+    Preuve de connaissance du jeton partage : HMAC-SHA256 du role de
+    l'emetteur et des defis echanges. Le role empeche de renvoyer a une
+    partie sa propre preuve.
+
+    :param token : jeton partage
+    :param role : role de l'emetteur ("coordinator" ou "worker")
+    :param nonces : defis (str)
+    :return preuve (str hexadecimale)
+    """
+    message = ":".join((role,) + nonces).encode()
+    return hmac.new(token.encode(), message, hashlib.sha256).hexdigest()
+
+
+def check_token(token):
+    """
+    Verification du jeton partage d'un scan distribue.
+
+    :param token : jeton partage
+    :return None
+    """
+    if not token:
+        raise ValueError(
+            "le scan distribue necessite un jeton partage "
+            "(DISTRIBUTED_TOKEN)"
+        )
+
+
+class Connection:
+    """
+    Connexion TCP echangeant des messages JSON, un par ligne. L'envoi est
+    protege par un verrou : plusieurs threads peuvent envoyer des
+    messages sur la meme connexion.
+
+    :class Connection
+    """
+
+    def __init__(self, sock):
+        """
+        Initialisation des objets de type Connection.
+
+        :param self : reference vers l'objet Connection parent
+        :param sock : socket connecte
+        :return None
+        """
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+        self.send_lock = threading.Lock()
+        try:
+            self.name = "{}:{}".format(*sock.getpeername()[:2])
+        except OSError:
+            self.name = "?"
+
+    def send(self, message):
+        """
+        Envoi d'un message.
+
+        :param self : reference vers l'objet Connection parent
+        :param message : message (dict serialisable en JSON)
+        :return None
+        """
+        data = json.dumps(message, separators=(",", ":")) + "\n"
+        with self.send_lock:
+            self.sock.sendall(data.encode())
+
+    def receive(self):
+        """
+        Reception d'un message (bloquante).
+
+        :param self : reference vers l'objet Connection parent
+        :return message (dict), ou None si la connexion est fermee
+        """
+        line = self.reader.readline(MAX_MESSAGE_SIZE + 1)
+        if not line:
+            return None
+        if not line.endswith(b"\n"):
+            raise ValueError("message trop long ou incomplet")
+        message = json.loads(line)
+        if not isinstance(message, dict) or "type" not in message:
+            raise ValueError("message invalide")
+        return message
+
+    def close(self):
+        """
+        Fermeture de la connexion ; le thread bloque dans receive est
+        debloque.
+
+        :param self : reference vers l'objet Connection parent
+        :return None
+        """
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class DistributedPool:
+    """
+    Coordinateur d'un scan distribue. Il remplace le pool de processus
+    local (multiprocessing.Pool) : imap_unordered distribue les requetes
+    aux workers connectes, dans la limite du nombre de requetes
+    simultanees annonce par chacun, et renvoie les resultats dans l'ordre
+    ou ils sont recus.
+
+    Les fonctions executables sont designees par leur nom ; chacune est
+    associee aux conversions de son resultat vers et depuis JSON, seul
+    format echange sur le reseau.
+
+    :class DistributedPool
+    """
+
+    def __init__(
+        self,
+        address,
+        functions,
+        settings,
+        token,
+        lease_duration=60,
+        max_attempts=3,
+        metrics=None,
+    ):
+        """
+        Initialisation des objets de type DistributedPool : ouverture du
+        port d'ecoute des workers.
+
+        :param self : reference vers l'objet DistributedPool parent
+        :param address : adresse d'ecoute (hote, port)
+        :param functions : fonctions executables par les workers
+                           {nom: (fonction, encodage, decodage)}
+        :param settings : parametres du scan transmis aux workers (dict
+                          serialisable en JSON)
+        :param token : jeton partage avec les workers (non vide)
+        :param lease_duration : duree du bail d'un worker sans nouvelles
+                                de sa part (secondes)
+        :param max_attempts : nombre maximal d'attributions d'une requete,
+                              au-dela duquel elle est consideree en echec
+        :param metrics : mesures du scan (ScanMetrics), comptant les
+                         requetes redistribuees, ou None
+        :return None
+        """
+        check_token(token)
+        self.functions = functions
+        self.names = {
+            function: name for name, (function, _, _) in functions.items()
+        }
+        self.settings = settings
+        self.token = token
+        self.lease_duration = lease_duration
+        self.max_attempts = max_attempts
+        self.metrics = metrics
+        # etat partage entre les threads des connexions, le thread de
+        # surveillance des baux et le thread du scan
+        self.condition = threading.Condition()
+        self.task_ids = itertools.count()
+        # requetes en cours : {identifiant: requete}
+        self.tasks = {}
+        # identifiants des requetes en attente d'un worker
+        self.pending = collections.deque()
+        # workers connectes : {connexion: etat du worker}
+        self.workers = {}
+        self.closed = False
+
+        host, port = address
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        self.server = socket.create_server((host, port), family=family)
+        self.address = self.server.getsockname()[:2]
+        logging.info(
+            "coordinateur en attente de workers sur {}:{}".format(
+                *self.address
+            )
+        )
+        threading.Thread(target=self.accept_workers, daemon=True).start()
+        threading.Thread(target=self.watch_leases, daemon=True).start()
+
+    def accept_workers(self):
+        """
+        Acceptation des connexions des workers, chacune etant servie par
+        son propre thread.
+
+        :param self : reference vers l'objet DistributedPool parent
+        :return None
+        """
+        while True:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                # port d'ecoute ferme (voir close)
+                return
+            threading.Thread(
+                target=self.serve_worker, args=(sock,), daemon=True
+            ).start()
+
+    def handshake(self, connection):
+        """
+        Presentation d'un worker : verification de la version du protocole,
+        authentification mutuelle par le jeton partage, puis envoi des
+        parametres du scan.
+
+        :param self : reference vers l'objet DistributedPool parent
+        :param connection : connexion du worker
+        :return message de presentation du worker, ou None s'il est refuse
+        """
+        connection.sock.settimeout(HANDSHAKE_TIMEOUT)
+        hello = connection.receive()
+        if hello is None or hello["type"] != "hello":
+            return None
+        worker_nonce = hello.get("nonce")
+        if hello.get("version") != PROTOCOL_VERSION:
+            error = "version du protocole non supportee"
+        elif not isinstance(worker_nonce, str) or not worker_nonce:
+            error = "defi invalide"
+        elif self.closed:
+            error = "scan termine"
+        else:
+            nonce = secrets.token_hex(16)
+            connection.send(
+                {
+                    "type": "challenge",
+                    "nonce": nonce,
+                    "proof": sign(
+                        self.token, "coordinator", worker_nonce, nonce
+                    ),
+                }
+            )
+            auth = connection.receive()
+            if auth is None:
+                return None
+            if auth["type"] == "auth" and hmac.compare_digest(
+                str(auth.get("proof", "")),
+                sign(self.token, "worker", nonce, worker_nonce),
+            ):
+                connection.sock.settimeout(None)
+                connection.send(
+                    {
+                        "type": "welcome",
+                        "settings": self.settings,
+                        "lease": self.lease_duration,
+                    }
+                )
+                return hello
+            error = "jeton invalide"
+        connection.send({"type": "error", "message": error})
+        logging.warning("worker {} refuse : {}".format(connection.name, error))
+        return None
+
+    def serve_worker(self, sock):
+        """
+        Service d'un worker : presentation, puis reception de ses messages
+        jusqu'a sa deconnexion.
+
+        :param self : reference vers l'objet DistributedPool parent
+        :param sock : socket connecte au worker
+        :return None
+        """
+        connection = Connection(sock)
+        try:
+            hello = self.handshake(connection)
+        except (OSError, ValueError) as exception:
+            logging.warning(
+                "worker {} refuse : {}".format(connection.name, exception)
+            )
+            hello = None
+        if hello is None:
+            connection.close()
+            return
+        name = "{} ({})".format(hello.get("name", "?"), connection.name)
+        capacity = max(1, int(hello.get("capacity", 1)))
+        with self.condition:
+            self.workers[connection] = {
+                "name": name,
+                "capacity": capacity,
+                "tasks": set(),
+                "last_seen": time.monotonic(),
+            }
+        logging.info(
+            "worker {} connecte ({} requete(s) simultanee(s))".format(
+                name, capacity
+            )
+        )
+        self.dispatch()
+
+        reason = "connexion fermee"
+        try:
+            while True:
+                message = connection.receive()
+                if message is None:
+                    break
+                # tout message du worker renouvelle son bail
+                with self.condition:
+                    worker = self.workers.get(connection)
+                    if worker is None:
+                        break
+                    worker["last_seen"] = time.monotonic()
+                if message["type"] == "result":
+                    self.handle_result(connection, message)
+        except (OSError, ValueError, KeyError, TypeError) as exception:
+            reason = str(exception) or type(exception).__name__
+        self.remove_worker(connection, reason)
+
+    def remove_worker(self, connection, reason):
+        """
+        Retrait d'un worker : ses requetes en cours sont redistribuees, ou
+        considerees en echec si elles ont atteint le nombre maximal de
+        tentatives.
+
+        :param self : reference vers l'objet DistributedPool parent
+        :param connection : connexion du worker
+        :param reason : cause du retrait (pour les logs)
+        :return None
+        """
+        failed = []
+        with self.condition:
+            worker = self.workers.pop(connection, None)
+            if worker is None:
+                return
+            for task_id in sorted(worker["tasks"], reverse=True):
+                task = self.tasks[task_id]
+                task["worker"] = None
+                if task["attempts"] >= self.max_attempts:
+                    del self.tasks[task_id]
+                    failed.append(task)
+                else:
+                    # les requetes redistribuees passent en priorite
+                    self.pending.appendleft(task_id)
+            self.condition.notify_all()
+        connection.close()
+        redispatched = len(worker["tasks"]) - len(failed)
+        if self.metrics is not None and len(worker["tasks"]) != 0:
+            self.metrics.increment("lost_workers")
+            self.metrics.increment("redispatched_requests", redispatched)
+        if len(worker["tasks"]) == 0 and self.closed:
+            logging.info("worker {} deconnecte".format(worker["name"]))
+        else:
+            logging.warning(
+                "worker {} perdu ({}) : {} requete(s) redistribuee(s), {} "
+                "en echec".format(
+                    worker["name"],
+                    reason,
+                    redispatched,
+                    len(failed),
+                )
+            )
+        for task in failed:
+            self.fail(
+                task,
+                "requete abandonnee apres {} tentative(s)".format(
+                    task["attempts"]
+                ),
+            )
+        self.dispatch()
+
+    def dispatch(self):
+        """
+        Attribution des requetes en attente aux workers ayant de la place,
+        tour a tour.
+
+        :param self : reference vers l'objet DistributedPool parent
+        :return None
+        """
+        assignments = []
+        with self.condition:
+            while self.pending:
+                available = [
+                    (connection, worker)
+                    for connection, worker in self.workers.items()
+                    if len(worker["tasks"]) < worker["capacity"]
+                ]
+                if len(available) == 0:
+                    break
+                for connection, worker in available:
+                    if not self.pending:
+                        break
+                    task_id = self.pending.popleft()
+                    task = self.tasks[task_id]
+                    task["worker"] = connection
+                    task["attempts"] += 1
+                    worker["tasks"].add(task_id)
+                    assignments.append(
+                        (
+                            connection,
+                            {
+                                "type": "task",
+                                "id": task_id,
+                                "function": task["function"],
+                                "argument": task["argument"],
+                                "queued_at": task["queued_at"],
+                            },
+                        )
+                    )
+        for connection, message in assignments:
+            try:
+                connection.send(message)
+            except OSError as exception:
+                self.remove_worker(connection, exception)
+
+    def handle_result(self, connection, message):
+        """
+        Reception du resultat d'une requete.
+
+        :param self : reference vers l'objet DistributedPool parent
+        :param connection : connexion du worker
+        :param message : message "result"
+        :return None
+        """
+        with self.condition:
+            task = self.tasks.get(message["id"])
+            # resultat d'une requete entre-temps redistribuee : ignore
+            if task is None or task["worker"] is not connection:
+                return
+            del self.tasks[message["id"]]
+            self.workers[connection]["tasks"].discard(message["id"])
+        timing = message["timing"]
+        # les horloges des workers ne sont pas celles du coordinateur : la
+        # fin de la requete est datee a la reception de son resultat.
+        end = time.time()
+        timing["start"] = end - (timing["end"] - timing["start"])
+        timing["end"] = end
+        timing["queued_at"] = task["queued_at"]
+        payload = None
+        if timing["error"] is None:
+            decode = self.functions[task["function"]][2]
+            try:
+                payload = decode(message["payload"])
+            except (KeyError, TypeError, ValueError) as exception:
+                timing["error"] = "resultat invalide : {}".format(exception)
+        if timing["error"] is not None:
+            timing["task"] = task["argument"]
+        task["results"].put((payload, timing))
+        self.dispatch()
+
+    def fail(self, task, error):
+        """
+        Echec d'une requete, renvoye comme le ferait run_timed.
+
+        :param self : reference vers l'objet DistributedPool parent
+        :param task : requete
+        :param error : message d'erreur
+        :return None
+        """
+        now = time.time()
+        task["results"].put(
+            (
+                None,
+                {
+                    "queued_at": task["queued_at"],
+                    "error": error,
+                    "task": task["argument"],
+                    "start": now,
+                    "end": now,
+                    "stages": {},
+                },
+            )
+        )
+
+    def watch_leases(self):
+        """
+        Surveillance des baux : un worker sans nouvelles depuis la duree
+        du bail est considere comme perdu.
+
+        :param self : reference vers l'objet DistributedPool parent
+        :return None
+        """
+        last_warning = time.monotonic()
+        while not self.closed:
+            time.sleep(1)
+            now = time.monotonic()
+            with self.condition:
+                expired = [
+                    connection
+                    for connection, worker in self.workers.items()
+                    if now - worker["last_seen"] > self.lease_duration
+                ]
+                idle = len(self.workers) == 0 and len(self.pending) != 0
+                pending = len(self.pending)
+            for connection in expired:
+                self.remove_worker(connection, "bail expire")
+            if not idle:
+                last_warning = now
+            elif now - last_warning >= IDLE_WARNING_INTERVAL:
+                last_warning = now
+                logging.warning(
+                    "aucun worker connecte : {} requete(s) en attente".format(
+                        pending
+                    )
+                )
+
+    def imap_unordered(self, runner, iterable):
+        """
+        Execution des requetes par les workers, dans l'interface de
+        multiprocessing.Pool.imap_unordered. Les workers executent chaque
+        requete avec leur propre runner (run_timed).
+
+        :param self : reference vers l'objet DistributedPool parent
+        :param runner : fonction d'execution des requetes (non transmise)
+        :param iterable : tuples (fonction, argument, date de mise en file)
+        :return generateur des resultats (resultat, mesures de la requete)
+        """
+        results = queue.Queue()
+        # nombre de requetes, connu une fois l'iterable epuise
+        total = []
+
+        def feed():
+            # l'iterable peut bloquer (file de requetes bornee) : il est
+            # parcouru par un thread dedie, comme dans multiprocessing.
+            count = 0
+            try:
+                for function, argument, queued_at in iterable:
+                    task_id = next(self.task_ids)
+                    with self.condition:
+                        self.tasks[task_id] = {
+                            "function": self.names[function],
+                            "argument": argument,
+                            "queued_at": queued_at,
+                            "attempts": 0,
+                            "worker": None,
+                            "results": results,
+                        }
+                        self.pending.append(task_id)
+                    count += 1
+                    self.dispatch()
+            except Exception as exception:
+                results.put(exception)
+            total.append(count)
+            results.put(None)
+
+        threading.Thread(target=feed, daemon=True).start()
+        received = 0
+        while len(total) == 0 or received < total[0]:
+            item = results.get()
+            if item is None:
+                continue
+            if isinstance(item, Exception):
+                raise item
+            received += 1
+            yield item
+
+    def close(self):
+        """
+        Fin du scan : fermeture du port d'ecoute, et arret des workers une
+        fois leurs requetes terminees.
+
+        :param self : reference vers l'objet DistributedPool parent
+        :return None
+        """
+        with self.condition:
+            self.closed = True
+            connections = list(self.workers)
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.close()
+        for connection in connections:
+            try:
+                connection.send({"type": "stop"})
+            except OSError:
+                pass
+
+    def terminate(self):
+        """
+        Arret immediat : les connexions des workers sont fermees, ce qui
+        interrompt leurs requetes en cours.
+
+        :param self : reference vers l'objet DistributedPool parent
+        :return None
+        """
+        self.close()
+        with self.condition:
+            connections = list(self.workers)
+        for connection in connections:
+            connection.close()
+
+    def join(self):
+        """
+        Attente de la deconnexion des workers (voir close).
+
+        :param self : reference vers l'objet DistributedPool parent
+        :return None
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: len(self.workers) == 0, timeout=JOIN_TIMEOUT
+            )
+            connections = list(self.workers)
+        for connection in connections:
+            connection.close()
+
+
+def connect(address):
+    """
+    Connexion au coordinateur, avec plusieurs tentatives : le worker peut
+    etre lance avant lui.
+
+    :param address : adresse du coordinateur (hote, port)
+    :return connexion (Connection)
+    """
+    for attempt in range(CONNECT_ATTEMPTS):
+        try:
+            return Connection(socket.create_connection(address))
+        except OSError:
+            if attempt == CONNECT_ATTEMPTS - 1:
+                raise
+            time.sleep(1)
+
+
+def run_worker_agent(
+    address, capacity, functions, runner, start_pool, token, name=None
+):
+    """
+    Worker d'un scan distribue : les requetes recues du coordinateur sont
+    executees par un pool de processus local, et leurs resultats renvoyes
+    au fur et a mesure.
+
+    :param address : adresse du coordinateur (hote, port)
+    :param capacity : nombre de requetes executees simultanement
+    :param functions : fonctions executables {nom: (fonction, encodage,
+                       decodage)}, identiques a celles du coordinateur
+    :param runner : fonction executant une requete dans le pool, a partir
+                    d'un tuple (fonction, argument, date de mise en file)
+    :param start_pool : fonction creant le pool de processus a partir des
+                        parametres du scan recus du coordinateur
+    :param token : jeton partage avec le coordinateur (non vide)
+    :param name : nom du worker (nom de la machine par defaut)
+    :return None
+    """
+    check_token(token)
+    connection = connect(address)
+    nonce = secrets.token_hex(16)
+    connection.send(
+        {
+            "type": "hello",
+            "version": PROTOCOL_VERSION,
+            "nonce": nonce,
+            "capacity": capacity,
+            "name": name or socket.gethostname(),
+        }
+    )
+    # le coordinateur doit prouver qu'il connait le jeton avant que le
+    # worker n'accepte d'executer ses requetes.
+    challenge = connection.receive()
+    if challenge is None or challenge["type"] != "challenge":
+        connection.close()
+        raise ConnectionError(
+            "connexion refusee par le coordinateur : {}".format(
+                (challenge or {}).get("message", "connexion fermee")
+            )
+        )
+    coordinator_nonce = str(challenge.get("nonce", ""))
+    if not coordinator_nonce or not hmac.compare_digest(
+        str(challenge.get("proof", "")),
+        sign(token, "coordinator", nonce, coordinator_nonce),
+    ):
+        connection.close()
+        raise ConnectionError(
+            "le coordinateur {} ne connait pas le jeton partage".format(
+                connection.name
+            )
+        )
+    connection.send(
+        {
+            "type": "auth",
+            "proof": sign(token, "worker", coordinator_nonce, nonce),
+        }
+    )
+    welcome = connection.receive()
+    if welcome is None or welcome["type"] != "welcome":
+        connection.close()
+        raise ConnectionError(
+            "connexion refusee par le coordinateur : {}".format(
+                (welcome or {}).get("message", "connexion fermee")
+            )
+        )
+    logging.info("worker connecte au coordinateur {}".format(connection.name))
+    pool = start_pool(welcome["settings"])
+    stopped = threading.Event()
+
+    def send(message):
+        try:
+            connection.send(message)
+        except OSError as exception:
+            logging.error(
+                "envoi au coordinateur impossible : {}".format(exception)
+            )
+
+    def heartbeat():
+        # un message au moins trois fois par bail
+        while not stopped.wait(welcome["lease"] / 3):
+            send({"type": "heartbeat"})
+
+    def send_result(task_id, encode, result):
+        payload, timing = result
+        # l'argument est deja connu du coordinateur
+        timing.pop("task", None)
+        if payload is not None:
+            try:
+                payload = encode(payload)
+            except Exception as exception:
+                payload = None
+                timing["error"] = str(exception)
+        send(
+            {
+                "type": "result",
+                "id": task_id,
+                "payload": payload,
+                "timing": timing,
+            }
+        )
+
+    def send_error(task_id, queued_at, exception):
+        now = time.time()
+        timing = {
+            "queued_at": queued_at,
+            "error": str(exception),
+            "start": now,
+            "end": now,
+            "stages": {},
+        }
+        send(
+            {
+                "type": "result",
+                "id": task_id,
+                "payload": None,
+                "timing": timing,
+            }
+        )
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    completed = False
+    try:
+        while True:
+            message = connection.receive()
+            if message is None:
+                break
+            if message["type"] == "stop":
+                completed = True
+                break
+            if message["type"] != "task":
+                continue
+            function, encode, _ = functions[message["function"]]
+            pool.apply_async(
+                runner,
+                ((function, message["argument"], message["queued_at"]),),
+                callback=functools.partial(send_result, message["id"], encode),
+                error_callback=functools.partial(
+                    send_error, message["id"], message["queued_at"]
+                ),
+            )
+    finally:
+        stopped.set()
+        if completed:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
+        connection.close()
+    if not completed:
+        raise ConnectionError("connexion au coordinateur perdue")
+    logging.info("fin du scan distribue : arret du worker")
@@ -0,0 +1,150 @@
+"""
+Journal des requetes terminees, permettant de reprendre un scan
+interrompu.
+
+:file journal.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import json
+import logging
+from .model import HostResult
+
+
+class ScanJournal:
+    """
+    Journal en ajout seul (une entree JSON par ligne) des resultats du
+    scan en cours : rapports de chaque requete terminee (une IP, un
+    protocole, un intervalle de ports) et resultats de la phase de
+    decouverte. Un scan interrompu peut ainsi etre repris sans refaire
+    le travail deja termine, et son rapport reconstruit.
+
+    :class ScanJournal
+    """
+
+    def __init__(self, path):
+        """
+        Initialisation des objets de type ScanJournal.
+
+        :param self : reference vers l'objet ScanJournal parent
+        :param path : chemin du fichier journal
+        :return None
+        """
+        self.path = path
+        self.journal_file = None
+
+    def read(self):
+        """
+        Lecture des entrees du journal. Une derniere ligne incomplete
+        (interruption pendant l'ecriture) est ignoree.
+
+        :param self : reference vers l'objet ScanJournal parent
+        :return generateur d'entrees (dict)
+        """
+        with open(self.path, "r") as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logging.warning("journal : entree incomplete ignoree")
+                    continue
+                if entry["kind"] == "report":
+                    entry["result"] = HostResult.from_report(
+                        entry.pop("report")
+                    )
+                yield entry
+
+    def open(self, targets, soft, port_sets, engines, resume):
+        """
+        Ouverture du journal en ecriture. Un nouveau scan remplace le
+        journal precedent ; une reprise verifie que le journal concerne
+        bien le meme scan (cibles, type de scan, ports, protocoles et
+        moteurs), puis le complete.
+
+        :param self : reference vers l'objet ScanJournal parent
+        :param targets : liste de cibles scannees
+        :param soft : booleen indiquant le type de scan (soft ou non)
+        :param port_sets : ports a scanner par protocole {protocole:
+                           PortSet}, ou None (ports choisis par nmap)
+        :param engines : moteurs de scan par protocole {protocole: moteur}
+        :param resume : booleen indiquant s'il s'agit d'une reprise
+        :return None
+        """
+        header = {
+            "kind": "scan",
+            "targets": sorted(targets),
+            "soft": soft,
+            "ports": None,
+            "protocols": None,
+            "engines": dict(engines),
+        }
+        if port_sets is not None:
+            header["ports"] = {
+                protocol: port_set.to_nmap()
+                for protocol, port_set in port_sets.items()
+            }
+            header["protocols"] = sorted(
+                protocol
+                for protocol, port_set in port_sets.items()
+                if len(port_set) != 0
+            )
+        if resume:
+            first_entry = next(self.read(), None)
+            if first_entry != header:
+                # on precise ce qui differe, pour guider l'utilisateur
+                differences = [
+                    field
+                    for field in header
+                    if first_entry is None
+                    or first_entry.get(field) != header[field]
+                ]
+                raise ValueError(
+                    "le journal {} ne correspond pas au scan a reprendre "
+                    "({})".format(self.path, ", ".join(differences))
+                )
+            self.journal_file = open(self.path, "a")
+            return
+        self.journal_file = open(self.path, "w")
+        self.write(header)
+
+    def write(self, entry):
+        """
+        Ajout d'une entree au journal.
+
+        :param self : reference vers l'objet ScanJournal parent
+        :param entry : entree a ajouter (dict serialisable en JSON)
+        :return None
+        """
+        self.journal_file.write(json.dumps(entry) + "\n")
+
+    def write_result(self, result):
+        """
+        Ajout au journal du resultat d'une requete pour une seule IP, sous
+        la forme d'un rapport python-nmap (voir HostResult.to_report).
+
+        :param self : reference vers l'objet ScanJournal parent
+        :param result : resultat de scan (HostResult)
+        :return None
+        """
+        self.write({"kind": "report", "report": result.to_report()})
+
+    def flush(self):
+        """
+        Ecriture sur disque des entrees en attente.
+
+        :param self : reference vers l'objet ScanJournal parent
+        :return None
+        """
+        self.journal_file.flush()
+
+    def close(self):
+        """
+        Fermeture du journal.
+
+        :param self : reference vers l'objet ScanJournal parent
+        :return None
+        """
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
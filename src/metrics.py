@@ -0,0 +1,425 @@
+"""
+Mesures internes du scan (durees des etapes, latence des requetes,
+occupation des processus...), et leur export au format texte de
+Prometheus.
+
+:file metrics.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import bisect
+import contextlib
+import os
+import threading
+import time
+
+# bornes superieures des classes des histogrammes de latence (secondes)
+LATENCY_BUCKETS = (
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+    600,
+)
+# prefixe des metriques exportees
+METRICS_PREFIX = "port_scanner"
+# description des compteurs (voir ScanMetrics.increment)
+COUNTER_DESCRIPTIONS = {
+    "udp_retransmissions": "Retransmissions de sondes UDP sans reponse.",
+    "redispatched_requests": "Requetes confiees a un autre worker apres la "
+    "perte du leur.",
+    "lost_workers": "Workers perdus en cours de requetes.",
+}
+
+
+class Histogram:
+    """
+    Histogramme a classes fixes, sur le modele de ceux de Prometheus.
+
+    :class Histogram
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Initialisation des objets de type Histogram.
+
+        :param self : reference vers l'objet Histogram parent
+        :param buckets : bornes superieures des classes, croissantes
+        :return None
+        """
+        self.buckets = buckets
+        # la derniere classe recoit les valeurs au-dela de la derniere borne
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """
+        Prise en compte d'une valeur.
+
+        :param self : reference vers l'objet Histogram parent
+        :param value : valeur observee
+        :return None
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self):
+        """
+        Conversion en dictionnaire serialisable en JSON : effectifs
+        cumules par borne superieure, comme dans le format Prometheus.
+
+        :param self : reference vers l'objet Histogram parent
+        :return dictionnaire {"buckets", "count", "sum"}
+        """
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "buckets": buckets,
+            "count": self.count,
+            "sum": round(self.sum, 6),
+        }
+
+
+class ScanMetrics:
+    """
+    Mesures d'un scan, alimentees par le processus principal : durees des
+    etapes du scan, temps passe par les processus du pool dans chaque
+    etape d'une requete, et, pour chaque phase executee par le pool,
+    latence des requetes, attente dans la file, profondeur de la file et
+    occupation des processus.
+
+    :class ScanMetrics
+    """
+
+    def __init__(self):
+        """
+        Initialisation des objets de type ScanMetrics.
+
+        :param self : reference vers l'objet ScanMetrics parent
+        :return None
+        """
+        # les requetes sont produites par un thread du pool
+        self.lock = threading.Lock()
+        # durees des etapes du scan (processus principal) : {etape: s}
+        self.stages = {}
+        # durees cumulees des etapes des requetes (processus du pool)
+        self.worker_stages = {}
+        # mesures par phase executee par le pool (voir start_phase)
+        self.phases = {}
+        # compteurs divers (retransmissions...)
+        self.counters = {counter: 0 for counter in COUNTER_DESCRIPTIONS}
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        """
+        Mesure de la duree d'une etape du scan (gestionnaire de contexte).
+        Les durees d'une meme etape s'additionnent.
+
+        :param self : reference vers l'objet ScanMetrics parent
+        :param stage : nom de l'etape
+        :return gestionnaire de contexte
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(stage, time.perf_counter() - start_time)
+
+    def add_stage(self, stage, seconds):
+        """
+        Ajout d'une duree a une etape du scan.
+
+        :param self : reference vers l'objet ScanMetrics parent
+        :param stage : nom de l'etape
+        :param seconds : duree (secondes)
+        :return None
+        """
+        with self.lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def increment(self, counter, value=1):
+        """
+        Incrementation d'un compteur.
+
+        :param self : reference vers l'objet ScanMetrics parent
+        :param counter : nom du compteur
+        :param value : increment
+        :return None
+        """
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def start_phase(self, phase, processes):
+        """
+        Debut d'une phase executee par le pool (decouverte, scan des
+        ports, detection de versions).
+
+        :param self : reference vers l'objet ScanMetrics parent
+        :param phase : nom de la phase
+        :param processes : nombre de processus du pool
+        :return etat de la phase (dict), a passer a record_task
+        """
+        with self.lock:
+            if phase not in self.phases:
+                self.phases[phase] = {
+                    "tasks": 0,
+                    "failed_tasks": 0,
+                    "processes": processes,
+                    "wall_seconds": 0.0,
+                    "busy_seconds": 0.0,
+                    "queue_depth_max": 0,
+                    "queue_depth_total": 0,
+                    "task_latency": Histogram(),
+                    "queue_wait": Histogram(),
+                }
+            state = self.phases[phase]
+        state["started_at"] = time.time()
+        return state
+
+    def end_phase(self, state):
+        """
+        Fin d'une phase executee par le pool.
+
+        :param self : reference vers l'objet ScanMetrics parent
+        :param state : etat de la phase (voir start_phase)
+        :return None
+        """
+        state["wall_seconds"] += time.time() - state.pop("started_at")
+
+    def record_task(self, state, timing, queue_depth):
+        """
+        Prise en compte d'une requete terminee.
+
+        :param self : reference vers l'objet ScanMetrics parent
+        :param state : etat de la phase (voir start_phase)
+        :param timing : mesures de la requete (voir run_timed), ou None si
+                        son resultat n'a pas pu etre recu
+        :param queue_depth : nombre de requetes en attente ou en cours
+        :return None
+        """
+        state["queue_depth_max"] = max(state["queue_depth_max"], queue_depth)
+        state["queue_depth_total"] += queue_depth
+        if timing is None:
+            state["failed_tasks"] += 1
+            return
+        if timing["error"] is not None:
+            state["failed_tasks"] += 1
+        else:
+            state["tasks"] += 1
+        duration = timing["end"] - timing["start"]
+        state["busy_seconds"] += duration
+        state["task_latency"].observe(duration)
+        state["queue_wait"].observe(
+            max(0.0, timing["start"] - timing["queued_at"])
+        )
+        with self.lock:
+            for stage, seconds in timing["stages"].items():
+                self.worker_stages[stage] = (
+                    self.worker_stages.get(stage, 0.0) + seconds
+                )
+
+    def to_dict(self):
+        """
+        Conversion des mesures en dictionnaire serialisable en JSON.
+
+        :param self : reference vers l'objet ScanMetrics parent
+        :return dictionnaire des mesures
+        """
+        phases = {}
+        for phase, state in self.phases.items():
+            completed = state["tasks"] + state["failed_tasks"]
+            capacity = state["processes"] * state["wall_seconds"]
+            phases[phase] = {
+                "tasks": state["tasks"],
+                "failed_tasks": state["failed_tasks"],
+                "wall_seconds": round(state["wall_seconds"], 6),
+                "busy_seconds": round(state["busy_seconds"], 6),
+                # part du temps des processus passee a executer des
+                # requetes
+                "worker_utilization": round(
+                    state["busy_seconds"] / capacity if capacity else 0.0, 4
+                ),
+                "queue_depth_max": state["queue_depth_max"],
+                "queue_depth_mean": round(
+                    (
+                        state["queue_depth_total"] / completed
+                        if completed
+                        else 0.0
+                    ),
+                    2,
+                ),
+                "task_latency_seconds": state["task_latency"].to_dict(),
+                "queue_wait_seconds": state["queue_wait"].to_dict(),
+            }
+        return {
+            "stages": {
+                stage: round(seconds, 6)
+                for stage, seconds in self.stages.items()
+            },
+            "worker_stages": {
+                stage: round(seconds, 6)
+                for stage, seconds in self.worker_stages.items()
+            },
+            "phases": phases,
+            "counters": dict(self.counters),
+        }
+
+
+def format_histogram(name, labels, histogram):
+    """
+    Lignes d'un histogramme au format texte de Prometheus.
+
+    :param name : nom complet de la metrique
+    :param labels : etiquettes communes (str, ex : 'phase="port_scan"')
+    :param histogram : histogramme (voir Histogram.to_dict)
+    :return liste de lignes
+    """
+    lines = [
+        '{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, count)
+        for bound, count in histogram["buckets"].items()
+    ]
+    lines.append("{}_sum{{{}}} {}".format(name, labels, histogram["sum"]))
+    lines.append("{}_count{{{}}} {}".format(name, labels, histogram["count"]))
+    return lines
+
+
+def format_prometheus(stats, summary=None):
+    """
+    Conversion des mesures au format texte de Prometheus.
+
+    :param stats : mesures (voir ScanMetrics.to_dict)
+    :param summary : resume du scan (machines scannees, en ligne), ou None
+    :return texte
+    """
+    lines = []
+
+    def metric(name, metric_type, description, samples):
+        full_name = "{}_{}".format(METRICS_PREFIX, name)
+        lines.append("# HELP {} {}".format(full_name, description))
+        lines.append("# TYPE {} {}".format(full_name, metric_type))
+        for labels, value in samples:
+            if metric_type == "histogram":
+                lines.extend(format_histogram(full_name, labels, value))
+            elif labels:
+                lines.append("{}{{{}}} {}".format(full_name, labels, value))
+            else:
+                lines.append("{} {}".format(full_name, value))
+
+    def by(label, values):
+        return [
+            ('{}="{}"'.format(label, key), value)
+            for key, value in values.items()
+        ]
+
+    phases = stats["phases"]
+    metric(
+        "stage_seconds",
+        "gauge",
+        "Duree des etapes du scan (processus principal).",
+        by("stage", stats["stages"]),
+    )
+    metric(
+        "worker_stage_seconds",
+        "gauge",
+        "Duree cumulee des etapes des requetes (processus du pool).",
+        by("stage", stats["worker_stages"]),
+    )
+    for name, key, metric_type, description in (
+        ("tasks_total", "tasks", "counter", "Requetes terminees."),
+        (
+            "failed_tasks_total",
+            "failed_tasks",
+            "counter",
+            "Requetes en echec.",
+        ),
+        ("phase_seconds", "wall_seconds", "gauge", "Duree de la phase."),
+        (
+            "worker_utilization",
+            "worker_utilization",
+            "gauge",
+            "Part du temps des processus passee a executer des requetes.",
+        ),
+        (
+            "queue_depth_max",
+            "queue_depth_max",
+            "gauge",
+            "Nombre maximal de requetes en attente ou en cours.",
+        ),
+        (
+            "queue_depth_mean",
+            "queue_depth_mean",
+            "gauge",
+            "Nombre moyen de requetes en attente ou en cours.",
+        ),
+        (
+            "task_latency_seconds",
+            "task_latency_seconds",
+            "histogram",
+            "Duree d'execution des requetes par les processus du pool.",
+        ),
+        (
+            "queue_wait_seconds",
+            "queue_wait_seconds",
+            "histogram",
+            "Attente des requetes avant leur execution.",
+        ),
+    ):
+        metric(
+            name,
+            metric_type,
+            description,
+            by("phase", {p: values[key] for p, values in phases.items()}),
+        )
+    for counter, value in stats["counters"].items():
+        metric(
+            "{}_total".format(counter),
+            "counter",
+            COUNTER_DESCRIPTIONS.get(counter, counter),
+            [("", value)],
+        )
+    if summary is not None:
+        metric(
+            "hosts",
+            "gauge",
+            "Machines scannees, par etat.",
+            [
+                ('state="up"', summary["uphosts"]),
+                (
+                    'state="down"',
+                    summary["totalhosts"] - summary["uphosts"],
+                ),
+            ],
+        )
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path, stats, summary=None):
+    """
+    Ecriture des mesures dans un fichier au format texte de Prometheus.
+    Le fichier est remplace de maniere atomique, afin qu'un collecteur
+    (node_exporter, textfile) ne lise jamais un fichier incomplet.
+
+    :param path : chemin du fichier
+    :param stats : mesures (voir ScanMetrics.to_dict)
+    :param summary : resume du scan, ou None
+    :return None
+    """
+    temp_path = "{}.tmp".format(path)
+    with open(temp_path, "w") as metrics_file:
+        metrics_file.write(format_prometheus(stats, summary))
+    os.replace(temp_path, path)
@@ -0,0 +1,257 @@
+"""
+Modele compact des resultats de scan, utilise a la place des
+dictionnaires imbriques de python-nmap.
+
+:file model.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import sys
+
+# cles de python-nmap pour la couche transport, par protocole
+TRANSPORT_KEYS = {"T": "tcp", "U": "udp"}
+
+
+def intern_string(value):
+    """
+    Internement d'une chaine : les valeurs tres repetees (etats, noms de
+    services, versions...) ne sont stockees qu'une seule fois en memoire.
+
+    :param value : chaine (ou None)
+    :return chaine internee
+    """
+    if value is None:
+        return None
+    return sys.intern(str(value))
+
+
+class PortResult:
+    """
+    Resultat du scan d'un port. Les attributs portent les noms des cles
+    de python-nmap, ce qui permet au template html d'y acceder de la meme
+    maniere (port.name, port.version...).
+
+    :class PortResult
+    """
+
+    FIELDS = (
+        "state",
+        "reason",
+        "name",
+        "product",
+        "version",
+        "extrainfo",
+        "conf",
+        "cpe",
+    )
+    __slots__ = ("port",) + FIELDS
+
+    def __init__(
+        self,
+        port,
+        state="",
+        reason="",
+        name="",
+        product="",
+        version="",
+        extrainfo="",
+        conf="",
+        cpe="",
+    ):
+        """
+        Initialisation des objets de type PortResult.
+
+        :param self : reference vers l'objet PortResult parent
+        :param port : numero du port
+        :param state ... cpe : informations du port (voir python-nmap)
+        :return None
+        """
+        self.port = int(port)
+        self.state = intern_string(state)
+        self.reason = intern_string(reason)
+        self.name = intern_string(name)
+        self.product = intern_string(product)
+        self.version = intern_string(version)
+        self.extrainfo = intern_string(extrainfo)
+        self.conf = intern_string(conf)
+        self.cpe = intern_string(cpe)
+
+    def __reduce__(self):
+        # serialisation sous forme de tuple : les chaines sont a nouveau
+        # internees lors de la deserialisation par le processus principal.
+        return (
+            PortResult,
+            (self.port,) + tuple(getattr(self, f) for f in self.FIELDS),
+        )
+
+    @classmethod
+    def from_dict(cls, port, port_info):
+        """
+        Creation d'un resultat a partir des informations d'un port au
+        format python-nmap.
+
+        :param port : numero du port
+        :param port_info : dictionnaire des informations du port
+        :return resultat (PortResult)
+        """
+        return cls(port, **{f: port_info.get(f, "") for f in cls.FIELDS})
+
+    def to_dict(self):
+        """
+        Conversion au format python-nmap.
+
+        :param self : reference vers l'objet PortResult parent
+        :return dictionnaire des informations du port
+        """
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+
+class HostResult:
+    """
+    Resultat d'une requete de scan pour une seule machine. Les
+    metadonnees de la requete (cible, protocole, intervalle de ports...)
+    sont partagees par les resultats de toutes les machines de la requete.
+
+    :class HostResult
+    """
+
+    __slots__ = (
+        "metadata",
+        "ip_host",
+        "up",
+        "mac",
+        "hostnames",
+        "ports",
+        "errors",
+        "warnings",
+        "elapsed",
+    )
+
+    def __init__(
+        self,
+        metadata,
+        ip_host,
+        up,
+        mac=None,
+        hostnames=(),
+        ports=(),
+        errors=(),
+        warnings=(),
+        elapsed=0.0,
+    ):
+        """
+        Initialisation des objets de type HostResult.
+
+        :param self : reference vers l'objet HostResult parent
+        :param metadata : metadonnees de la requete (sans les IP)
+        :param ip_host : IP de la machine
+        :param up : booleen indiquant si la machine est en ligne
+        :param mac : adresse MAC de la machine (ou None)
+        :param hostnames : noms d'hote de la machine
+        :param ports : resultats des ports (PortResult)
+        :param errors : messages d'erreur de nmap
+        :param warnings : avertissements de nmap
+        :param elapsed : duree de la requete (secondes)
+        :return None
+        """
+        self.metadata = metadata
+        self.ip_host = ip_host
+        self.up = up
+        self.mac = mac
+        self.hostnames = tuple(intern_string(name) for name in hostnames)
+        self.ports = tuple(ports)
+        self.errors = list(errors)
+        self.warnings = list(warnings)
+        self.elapsed = elapsed
+
+    @classmethod
+    def from_scan(cls, nmap_info, host_scan, metadata, ip_host):
+        """
+        Creation d'un resultat a partir d'un rapport python-nmap.
+
+        :param nmap_info : partie "nmap" du rapport (scaninfo, scanstats)
+        :param host_scan : partie "scan" du rapport pour cette machine, ou
+                           None si elle n'a pas ete detectee en ligne
+        :param metadata : metadonnees de la requete (sans les IP)
+        :param ip_host : IP de la machine
+        :return resultat (HostResult)
+        """
+        elapsed = float(nmap_info["scanstats"].get("elapsed", 0) or 0)
+        if host_scan is None:
+            return cls(metadata, ip_host, False, elapsed=elapsed)
+        transport_key = TRANSPORT_KEYS[metadata["transport_protocol"]]
+        return cls(
+            metadata,
+            ip_host,
+            True,
+            mac=host_scan["addresses"].get("mac"),
+            hostnames=[h["name"] for h in host_scan["hostnames"]],
+            ports=[
+                PortResult.from_dict(port, port_info)
+                for port, port_info in host_scan.get(transport_key, {}).items()
+            ],
+            # erreurs et avertissements de nmap
+            errors=nmap_info["scaninfo"].get("error", []),
+            warnings=nmap_info["scaninfo"].get("warning", []),
+            elapsed=elapsed,
+        )
+
+    @classmethod
+    def from_report(cls, report):
+        """
+        Adaptateur depuis l'ancien format : rapport python-nmap portant sur
+        une seule IP, muni de ses metadonnees (cle "ip_host" comprise).
+
+        :param report : rapport python-nmap muni de ses metadonnees
+        :return resultat (HostResult)
+        """
+        metadata = dict(report["metadata"])
+        ip_host = metadata.pop("ip_host")
+        host_scan = None
+        if report["nmap"]["scanstats"]["uphosts"] != "0":
+            host_scan = report["scan"].get(ip_host)
+        return cls.from_scan(report["nmap"], host_scan, metadata, ip_host)
+
+    def to_report(self):
+        """
+        Adaptateur vers l'ancien format : rapport python-nmap portant sur
+        une seule IP, muni de ses metadonnees.
+
+        :param self : reference vers l'objet HostResult parent
+        :return rapport python-nmap (dict)
+        """
+        scaninfo = {}
+        if self.errors:
+            scaninfo["error"] = list(self.errors)
+        if self.warnings:
+            scaninfo["warning"] = list(self.warnings)
+        report = {
+            "nmap": {
+                "scaninfo": scaninfo,
+                "scanstats": {
+                    "uphosts": "1" if self.up else "0",
+                    "downhosts": "0" if self.up else "1",
+                    "totalhosts": "1",
+                    "elapsed": str(self.elapsed),
+                },
+            },
+            "scan": {},
+            "metadata": dict(self.metadata, ip_host=self.ip_host),
+        }
+        if not self.up:
+            return report
+        address_type = "ipv6" if self.metadata["target_type"] == 6 else "ipv4"
+        addresses = {address_type: self.ip_host}
+        if self.mac is not None:
+            addresses["mac"] = self.mac
+        transport_key = TRANSPORT_KEYS[self.metadata["transport_protocol"]]
+        report["scan"][self.ip_host] = {
+            "hostnames": [
+                {"name": name, "type": ""} for name in self.hostnames
+            ],
+            "addresses": addresses,
+            "status": {"state": "up", "reason": ""},
+            transport_key: {port.port: port.to_dict() for port in self.ports},
+        }
+        return report
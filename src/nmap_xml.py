@@ -0,0 +1,199 @@
+"""
+Lancement de nmap avec une sortie XML analysee au fil de l'eau : les
+resultats de chaque machine sont disponibles des que nmap les affiche,
+sans attendre la fin du scan ni conserver toute la sortie en memoire.
+
+:file nmap_xml.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import re
+import subprocess
+import tempfile
+import xml.etree.ElementTree as ElementTree
+from .model import HostResult, PortResult, intern_string
+
+# avertissements de nmap sur la sortie d'erreur (voir python-nmap)
+WARNING_REGEX = re.compile("^Warning: .*", re.IGNORECASE)
+# taille maximale des lectures sur la sortie de nmap (octets)
+READ_SIZE = 65536
+
+
+class NmapXmlScan:
+    """
+    Scan nmap dont la sortie XML (-oX -) est analysee de maniere
+    incrementale. Les elements <port> et <host> sont liberes des qu'ils
+    ont ete convertis en resultats compacts (voir model.py) : la memoire
+    utilisee ne depend plus du nombre de machines scannees.
+
+    Les informations connues uniquement a la fin du scan (duree, erreurs
+    et avertissements) sont disponibles une fois les resultats consommes.
+
+    :class NmapXmlScan
+    """
+
+    def __init__(self, nmap_path, hosts, ports, arguments, sudo=False):
+        """
+        Initialisation des objets de type NmapXmlScan.
+
+        :param self : reference vers l'objet NmapXmlScan parent
+        :param nmap_path : chemin du binaire nmap
+        :param hosts : machines a scanner (format nmap)
+        :param ports : ports a scanner (format nmap), ou None
+        :param arguments : liste des options nmap
+        :param sudo : booleen indiquant s'il faut lancer nmap via sudo
+        :return None
+        """
+        self.command = [nmap_path, "-oX", "-"] + hosts.split()
+        if ports is not None:
+            self.command += ["-p", ports]
+        self.command += arguments
+        if sudo:
+            self.command = ["sudo"] + self.command
+        self.elapsed = 0.0
+        self.errors = []
+        self.warnings = []
+
+    def results(self, metadata):
+        """
+        Lancement du scan et generation des resultats des machines en
+        ligne, dans l'ordre ou nmap les affiche.
+
+        :param self : reference vers l'objet NmapXmlScan parent
+        :param metadata : metadonnees de la requete (sans les IP)
+        :return generateur de resultats (HostResult)
+        """
+        # la sortie d'erreur est redirigee vers un fichier temporaire, afin
+        # que nmap ne soit jamais bloque par un tube plein.
+        with tempfile.TemporaryFile() as stderr_file:
+            process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=stderr_file,
+            )
+            try:
+                yield from self.parse(process.stdout, metadata)
+            except ElementTree.ParseError:
+                process.kill()
+                process.wait()
+                stderr_file.seek(0)
+                raise RuntimeError(
+                    "sortie XML de nmap invalide : {}".format(
+                        stderr_file.read().decode(errors="replace").strip()
+                    )
+                )
+            finally:
+                process.stdout.close()
+                if process.poll() is None:
+                    # resultats abandonnes avant la fin du scan
+                    process.kill()
+                process.wait()
+            stderr_file.seek(0)
+            self.read_errors(stderr_file.read().decode(errors="replace"))
+
+    def parse(self, xml_stream, metadata):
+        """
+        Analyse incrementale de la sortie XML de nmap.
+
+        :param self : reference vers l'objet NmapXmlScan parent
+        :param xml_stream : flux de la sortie XML
+        :param metadata : metadonnees de la requete (sans les IP)
+        :return generateur de resultats (HostResult)
+        """
+        # read1 renvoie les donnees des qu'elles sont disponibles, la ou
+        # iterparse attendrait d'avoir rempli un tampon complet.
+        parser = ElementTree.XMLPullParser(events=("start", "end"))
+        root = None
+        ports = []
+        for data in iter(lambda: xml_stream.read1(READ_SIZE), b""):
+            parser.feed(data)
+            for event, element in parser.read_events():
+                if event == "start":
+                    if root is None:
+                        root = element
+                    continue
+                if element.tag == "port":
+                    ports.append(self.parse_port(element))
+                    element.clear()
+                elif element.tag == "host":
+                    result = self.parse_host(element, ports, metadata)
+                    ports = []
+                    # les machines deja traitees sont retirees de l'arbre
+                    root.clear()
+                    if result is not None:
+                        yield result
+                elif element.tag == "finished":
+                    self.elapsed = float(element.get("elapsed") or 0)
+        # une sortie vide ou tronquee leve une ParseError
+        parser.close()
+
+    @staticmethod
+    def parse_port(element):
+        """
+        Conversion d'un element <port> en resultat compact.
+
+        :param element : element <port> de la sortie XML
+        :return resultat du port (PortResult)
+        """
+        state = element.find("state")
+        service = element.find("service")
+        info = {"state": state.get("state"), "reason": state.get("reason")}
+        if service is not None:
+            for field in ("name", "product", "version", "extrainfo", "conf"):
+                info[field] = service.get(field) or ""
+            cpe = service.findall("cpe")
+            if cpe:
+                info["cpe"] = cpe[-1].text
+        return PortResult.from_dict(element.get("portid"), info)
+
+    @staticmethod
+    def parse_host(element, ports, metadata):
+        """
+        Conversion d'un element <host> en resultat compact.
+
+        :param element : element <host> de la sortie XML
+        :param ports : resultats des ports de la machine (PortResult)
+        :param metadata : metadonnees de la requete (sans les IP)
+        :return resultat de la machine (HostResult), ou None si elle
+                n'est pas en ligne
+        """
+        status = element.find("status")
+        if status is None or status.get("state") != "up":
+            return None
+        # meme convention que python-nmap : la machine est designee par
+        # son adresse IPv4, ou a defaut par sa premiere adresse.
+        addresses = {}
+        for address in element.findall("address"):
+            addresses[address.get("addrtype")] = address.get("addr")
+        ip_host = addresses.get("ipv4")
+        if ip_host is None:
+            ip_host = element.find("address").get("addr")
+        hostnames = [
+            hostname.get("name")
+            for hostname in element.findall("hostnames/hostname")
+        ]
+        return HostResult(
+            metadata,
+            intern_string(ip_host),
+            True,
+            mac=addresses.get("mac"),
+            hostnames=hostnames or [""],
+            ports=ports,
+        )
+
+    def read_errors(self, stderr):
+        """
+        Tri des messages de la sortie d'erreur de nmap entre erreurs et
+        avertissements, comme le fait python-nmap.
+
+        :param self : reference vers l'objet NmapXmlScan parent
+        :param stderr : contenu de la sortie d'erreur
+        :return None
+        """
+        for line in stderr.splitlines():
+            if WARNING_REGEX.search(line):
+                self.warnings.append(line)
+            elif line:
+                self.errors.append(line)
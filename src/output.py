@@ -6,12 +6,49 @@ Classe et fonctions specifiques aux sorties du programme : console, html.
 :date 07.10.2020
 """
 
+import csv
+import json
 import logging
 import os
 import time
 from .config import config_dict
+from .metrics import write_prometheus
 from jinja2 import Environment, PackageLoader
 
+# environnement de templating Jinja, cree au premier rendu puis reutilise
+# (un daemon produit de nombreux rapports)
+template_environment = None
+
+
+def get_template():
+    """
+    Recuperation du template html des rapports.
+
+    :param None
+    :return template Jinja
+    """
+    global template_environment
+    if template_environment is None:
+        template_environment = Environment(
+            loader=PackageLoader("static"), autoescape=True
+        )
+    return template_environment.get_template("template.html")
+
+
+def format_record(record):
+    """
+    Conversion d'un resultat agrege en ligne JSON.
+
+    :param record: resultat agrege (voir ReportAggregator.emit)
+    :return chaine JSON (sans saut de ligne)
+    """
+    record = dict(record)
+    record["ports"] = {
+        port_result.port: port_result.to_dict()
+        for port_result in record["ports"]
+    }
+    return json.dumps(record)
+
 
 class Output:
     """
@@ -70,6 +107,19 @@ class Output:
                 self.targets_reports["summary"]["scan_time"]
             )
         )
+        for target, target_report in self.targets_reports["reports"].items():
+            for error in target_report["summary"]["errors"]:
+                logging.warning("Cible {} : {}".format(target, error))
+        stats = self.targets_reports["summary"].get("stats")
+        if stats is not None:
+            logging.info(
+                "Duree des etapes : {}".format(
+                    ", ".join(
+                        "{} {:.2f}s".format(stage, seconds)
+                        for stage, seconds in stats["stages"].items()
+                    )
+                )
+            )
 
     def output_html(self):
         """
@@ -78,33 +128,213 @@ class Output:
         :param self: reference vers l'objet Output parent
         :return None
         """
-        # recuperation d'un environnement de templating Jinja
-        environment = Environment(
-            loader=PackageLoader("static"), autoescape=True
-        )
-        template = environment.get_template("template.html")
+        template = get_template()
         filename = os.path.join(
             config_dict["OUTPUT_DIRECTORY"],
             "{}.html".format(self.output_filename),
         )
-        # ecriture des resultats
+        # ecriture des resultats : le rendu est ecrit dans le fichier au
+        # fur et a mesure, sans construire la page entiere en memoire.
+        start_time = time.perf_counter()
         with open(filename, "w") as html_file:
-            html_file.write(
-                template.render(targets_reports=self.targets_reports)
+            template.stream(targets_reports=self.targets_reports).dump(
+                html_file
+            )
+        # la duree du rendu ne figure que dans les mesures exportees apres
+        # l'ecriture du rapport (logs, fichier Prometheus)
+        stats = self.targets_reports["summary"].get("stats")
+        if stats is not None:
+            stats["stages"]["output_html"] = round(
+                time.perf_counter() - start_time, 6
             )
         logging.info(
             "Le resultat a ete sauvegarde dans le fichier {}".format(filename)
         )
 
 
-def finalize(targets_reports):
+class JsonLinesWriter:
+    """
+    Sortie en flux au format JSON Lines : chaque resultat agrege (une
+    machine, un protocole, un ensemble de ports) est ecrit sur une ligne
+    des son arrivee.
+
+    :class JsonLinesWriter
+    """
+
+    def __init__(self, filename):
+        """
+        Initialisation des objets de type JsonLinesWriter.
+
+        :param self: reference vers l'objet JsonLinesWriter parent
+        :param filename: chemin du fichier de sortie
+        :return None
+        """
+        self.filename = filename
+        self.output_file = open(filename, "w")
+
+    def write(self, record):
+        """
+        Ecriture d'un resultat.
+
+        :param self: reference vers l'objet JsonLinesWriter parent
+        :param record: resultat agrege (voir ReportAggregator.emit)
+        :return None
+        """
+        self.output_file.write(format_record(record) + "\n")
+
+    def flush(self):
+        """
+        Ecriture sur disque des resultats en attente.
+
+        :param self: reference vers l'objet JsonLinesWriter parent
+        :return None
+        """
+        self.output_file.flush()
+
+    def close(self):
+        """
+        Fermeture du fichier de sortie.
+
+        :param self: reference vers l'objet JsonLinesWriter parent
+        :return None
+        """
+        self.output_file.close()
+
+
+class CsvWriter:
+    """
+    Sortie en flux au format CSV : une ligne par port de chaque resultat
+    agrege, ou une ligne sans port pour une machine en ligne sans port
+    ouvert.
+
+    :class CsvWriter
+    """
+
+    HOST_FIELDS = [
+        "target",
+        "ip_host",
+        "type",
+        "mac",
+        "hostnames",
+        "transport_protocol",
+    ]
+    PORT_FIELDS = [
+        "state",
+        "reason",
+        "name",
+        "product",
+        "version",
+        "extrainfo",
+        "conf",
+        "cpe",
+    ]
+
+    def __init__(self, filename):
+        """
+        Initialisation des objets de type CsvWriter.
+
+        :param self: reference vers l'objet CsvWriter parent
+        :param filename: chemin du fichier de sortie
+        :return None
+        """
+        self.filename = filename
+        self.output_file = open(filename, "w", newline="")
+        self.writer = csv.writer(self.output_file)
+        self.writer.writerow(self.HOST_FIELDS + ["port"] + self.PORT_FIELDS)
+
+    def write(self, record):
+        """
+        Ecriture d'un resultat.
+
+        :param self: reference vers l'objet CsvWriter parent
+        :param record: resultat agrege (voir ReportAggregator.emit)
+        :return None
+        """
+        host_row = [record[field] for field in self.HOST_FIELDS]
+        host_row[self.HOST_FIELDS.index("hostnames")] = " ".join(
+            record["hostnames"]
+        )
+        if len(record["ports"]) == 0:
+            self.writer.writerow(host_row)
+            return
+        for port_result in record["ports"]:
+            self.writer.writerow(
+                host_row
+                + [port_result.port]
+                + [getattr(port_result, field) for field in self.PORT_FIELDS]
+            )
+
+    def flush(self):
+        """
+        Ecriture sur disque des resultats en attente.
+
+        :param self: reference vers l'objet CsvWriter parent
+        :return None
+        """
+        self.output_file.flush()
+
+    def close(self):
+        """
+        Fermeture du fichier de sortie.
+
+        :param self: reference vers l'objet CsvWriter parent
+        :return None
+        """
+        self.output_file.close()
+
+
+# sorties en flux disponibles, par format
+STREAM_WRITERS = {"jsonl": JsonLinesWriter, "csv": CsvWriter}
+
+
+def open_stream_writers(output_filename, output_formats):
+    """
+    Ouverture des sorties en flux demandees, dans le dossier de sortie.
+
+    :param output_filename: nom des fichiers de sortie (sans extension)
+    :param output_formats: formats de sortie demandes
+    :return liste de sorties
+    """
+    if not os.path.exists(config_dict["OUTPUT_DIRECTORY"]):
+        os.mkdir(config_dict["OUTPUT_DIRECTORY"])
+    writers = []
+    for output_format in output_formats:
+        if output_format not in STREAM_WRITERS:
+            continue
+        filename = os.path.join(
+            config_dict["OUTPUT_DIRECTORY"],
+            "{}.{}".format(output_filename, output_format),
+        )
+        writers.append(STREAM_WRITERS[output_format](filename))
+        logging.info(
+            "les resultats seront ecrits au fil de l'eau dans {}".format(
+                filename
+            )
+        )
+    return writers
+
+
+def finalize(targets_reports, output_formats=("html",)):
     """
     Finalisation du programme : ecriture des elements de sortie.
     Fonction d'appel de la classe Output.
 
     :param targets_reports: liste de rapports sur les scans de cibles
+    :param output_formats: formats de sortie demandes
     :return None
     """
     output = Output(targets_reports=targets_reports)
-    output.output_html()
+    if "html" in output_formats:
+        output.output_html()
     output.print_results()
+    # export des mesures du scan au format texte de Prometheus
+    summary = targets_reports["summary"]
+    if config_dict["METRICS_PATH"] and "stats" in summary:
+        write_prometheus(
+            config_dict["METRICS_PATH"], summary["stats"], summary
+        )
+        logging.info(
+            "mesures du scan ecrites dans {}".format(
+                config_dict["METRICS_PATH"]
+            )
+        )
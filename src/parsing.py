@@ -8,41 +8,63 @@ Recuperation des arguments du programme et pre-traitement.
 
 import argparse
 import logging
+import os
+from .config import config_dict
+from .ports import NMAP_DEFAULT_PORTS, build_port_sets, top_ports
+from .targets import normalize_target
+
+# emplacements du cache et du journal lorsque le mode incremental ou la
+# tenue du journal sont demandes sans que CACHE_PATH ou JOURNAL_PATH ne
+# soient configures
+DEFAULT_CACHE_PATH = "cache.sqlite3"
+DEFAULT_JOURNAL_PATH = "journal.jsonl"
 
 
 def parse_file(filename):
     """
     Parsing d'un argument de type fichier, et recuperation du contenu du
-    fichier en question.
+    fichier en question. Le fichier est lu ligne par ligne, sans etre
+    charge entierement en memoire ; les lignes vides et les commentaires
+    (#) sont ignores.
 
     :param filename: nom du fichier
-    :return contenu du fichier sous forme de liste de cibles (list(str))
+    :return generateur de cibles (str) : IPv4, IPv6, cidr, hosts...
     """
     logging.info(
         "Recuperation des donnees d'entrees"
         " dans le fichier {}".format(filename)
     )
-    # ouverture du fichier
-    file_object = open(file=filename, mode="r")
-    # lecture
-    content = file_object.read()
-    # separation du contenu du fichier en differents tokens:
-    # IPv4, IPv6, cidr, hosts...
-    splitted_content = content.split("\n")
-    return splitted_content
+    with open(file=filename, mode="r") as file_object:
+        for line in file_object:
+            target = line.split("#", 1)[0].strip()
+            if target != "":
+                yield target
+
 
+class JobArgumentParser(argparse.ArgumentParser):
+    """
+    Parseur des arguments d'un scan soumis au daemon : les erreurs sont
+    signalees par une exception au lieu de quitter le programme.
 
-def parse_args():
+    :class JobArgumentParser
+    """
+
+    def error(self, message):
+        raise ValueError(message)
+
+
+def parse_args(argv=None, parser_class=argparse.ArgumentParser):
     """
     Recuperation des arguments via argparse.ArgumentParser.
 
-    :param None
-    :return None
+    :param argv : arguments a analyser (ligne de commande par defaut)
+    :param parser_class : classe du parseur d'arguments
+    :return espace de noms des arguments
     """
     # Utilisation de la bibliotheque argparse, qui permet
     # de simplifier le parsing des arguments.
     logging.info("parsing des arguments de la ligne de commande")
-    parser = argparse.ArgumentParser(description="Scanner de ports simplifie")
+    parser = parser_class(description="Scanner de ports simplifie")
 
     # on ne peut pas utiliser a la fois l'option -t (targets : ip/host/cidr...)
     # et l'option -f (fichier contenant des targets)
@@ -62,6 +84,21 @@ def parse_args():
         help="fichier.txt, hotes/ipv4/ipv6/cidr "
         "separes par des sauts a la ligne",
     )
+    # un worker ne scanne pas de cibles propres : il execute les requetes
+    # du coordinateur d'un scan distribue.
+    args_group.add_argument(
+        "--worker",
+        "-w",
+        metavar="address",
+        help="hote:port du coordinateur dont executer les requetes",
+    )
+    # le daemon garde son pool de processus entre les scans, qui lui sont
+    # soumis par une API HTTP locale.
+    args_group.add_argument(
+        "--daemon",
+        metavar="address",
+        help="[hote:]port ou chemin de socket Unix de l'API du daemon",
+    )
 
     # cette option permet d'ordonner a nmap de faire un scan plus rapide mais
     # avec beaucoup moins de details
@@ -72,26 +109,203 @@ def parse_args():
         help="scan leger et rapide, moins precis",
     )
 
-    return parser.parse_args()
+    # ensembles de ports a scanner, au format de l'option -p de nmap, ex :
+    # "22,80,1000-2000", "top:100", "T:80,443,U:53"
+    parser.add_argument(
+        "--ports",
+        "-p",
+        metavar="ports",
+        help="ports a scanner, ex : 22,80,1000-2000,top:100,T:443,U:53",
+    )
+    parser.add_argument(
+        "--exclude-ports",
+        "-x",
+        metavar="ports",
+        help="ports a ne pas scanner (meme format que --ports)",
+    )
+    parser.add_argument(
+        "--top-ports",
+        metavar="count",
+        type=int,
+        help="scan des <count> ports les plus frequemment ouverts",
+    )
 
+    # choix du moteur de scan des ports : nmap seul, ou scan connect()
+    # asynchrone suivi d'une detection de versions nmap sur les ports ouverts
+    parser.add_argument(
+        "--engine",
+        "-e",
+        choices=["nmap", "connect"],
+        default="nmap",
+        help="moteur de scan des ports TCP (defaut : nmap)",
+    )
 
-def parse():
+    # choix du moteur de scan des ports UDP : nmap seul, ou sondes UDP
+    # asynchrones (charges utiles propres aux services courants) suivies
+    # d'une detection de versions nmap sur les ports ayant repondu
+    parser.add_argument(
+        "--udp-engine",
+        "-u",
+        choices=["nmap", "async"],
+        default="nmap",
+        help="moteur de scan des ports UDP (defaut : nmap)",
+    )
+
+    # la phase de decouverte permet de ne scanner les ports que des
+    # machines en ligne, ce qui accelere fortement les reseaux peu peuples.
+    parser.add_argument(
+        "--discovery",
+        "-d",
+        action="store_true",
+        help="recherche des machines en ligne avant le scan des ports",
+    )
+
+    # nombre de machines scannees par un meme appel a nmap : nmap scanne
+    # les groupes de machines en parallele, bien plus efficacement que
+    # des appels separes pour chaque IP.
+    parser.add_argument(
+        "--batch-size",
+        "-b",
+        metavar="size",
+        type=int,
+        default=config_dict["HOST_BATCH_SIZE"],
+        help="nombre de machines par appel a nmap, 0 pour passer chaque "
+        "cible entiere (defaut : {})".format(config_dict["HOST_BATCH_SIZE"]),
+    )
+
+    # le scan attend surtout les reponses reseau : le nombre de processus
+    # peut largement depasser le nombre de coeurs.
+    parser.add_argument(
+        "--processes",
+        "-j",
+        metavar="count",
+        type=int,
+        default=config_dict["PROCESSES"],
+        help="nombre de processus de scan simultanes (defaut : {})".format(
+            config_dict["PROCESSES"]
+        ),
+    )
+
+    # scan distribue : les requetes nmap sont reparties entre des workers
+    # (option --worker), eventuellement lances sur la meme machine.
+    parser.add_argument(
+        "--coordinator",
+        "-c",
+        metavar="address",
+        help="[hote:]port d'ecoute des workers d'un scan distribue",
+    )
+    parser.add_argument(
+        "--local-workers",
+        metavar="count",
+        type=int,
+        default=0,
+        help="nombre de workers lances localement par le coordinateur "
+        "(defaut : 0)",
+    )
+
+    # limitation du trafic genere, tous processus confondus
+    parser.add_argument(
+        "--max-rate",
+        "-r",
+        metavar="packets",
+        type=int,
+        default=config_dict["MAX_RATE"],
+        help="nombre maximal de paquets par seconde, 0 pour ne pas limiter "
+        "(defaut : {})".format(config_dict["MAX_RATE"]),
+    )
+    parser.add_argument(
+        "--max-host-probes",
+        metavar="count",
+        type=int,
+        default=config_dict["MAX_HOST_PROBES"],
+        help="nombre maximal de sondes simultanees par machine, 0 pour ne "
+        "pas limiter (defaut : {})".format(config_dict["MAX_HOST_PROBES"]),
+    )
+    # les intervalles de ports sont repartis entre les machines : un meme
+    # groupe de machines ne recoit qu'un nombre borne de requetes a la fois.
+    parser.add_argument(
+        "--max-host-tasks",
+        metavar="count",
+        type=int,
+        default=config_dict["MAX_HOST_TASKS"],
+        help="nombre maximal de requetes nmap simultanees par machine, 0 "
+        "pour ne pas limiter (defaut : {})".format(
+            config_dict["MAX_HOST_TASKS"]
+        ),
+    )
+
+    # les resultats de chaque scan sont conserves dans un cache : un scan
+    # incremental ne rescanne que les ports dont le resultat est perime.
+    parser.add_argument(
+        "--incremental",
+        "-i",
+        action="store_true",
+        help="reutilisation des resultats du cache encore valides",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        metavar="seconds",
+        type=int,
+        default=config_dict["CACHE_TTL"],
+        help="duree de validite des resultats du cache (defaut : {})".format(
+            config_dict["CACHE_TTL"]
+        ),
+    )
+
+    # reprise d'un scan interrompu, d'apres le journal des requetes
+    # terminees : seul le travail restant est effectue.
+    parser.add_argument(
+        "--journal",
+        action="store_true",
+        help="tenue du journal des requetes terminees, pour pouvoir "
+        "reprendre le scan s'il est interrompu",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="reprise du scan interrompu (memes cibles), d'apres le journal",
+    )
+
+    # formats de sortie : le rapport html est ecrit en fin de scan, les
+    # formats jsonl et csv au fil de l'eau.
+    parser.add_argument(
+        "--output-formats",
+        "-o",
+        metavar="format",
+        nargs="+",
+        choices=["html", "jsonl", "csv"],
+        default=config_dict["OUTPUT_FORMATS"],
+        help="formats de sortie parmi html, jsonl, csv (defaut : {})".format(
+            " ".join(config_dict["OUTPUT_FORMATS"])
+        ),
+    )
+
+    return parser.parse_args(argv)
+
+
+def parse(argv=None, parser_class=argparse.ArgumentParser):
     """
     Fonction de wrapping permettant d'appeler les fonctions de recuperation
     des arguments.
 
-    :param None
+    :param argv : arguments a analyser (ligne de commande par defaut)
+    :param parser_class : classe du parseur d'arguments
     :return tuple : booleen indiquant le type de scan,
-            liste de cibles a scanner (list(str))
+            liste de cibles a scanner (list(str)),
+            dictionnaire des options de scan
     """
-    args_namespace = parse_args()
-    if args_namespace.file is not None:
+    args_namespace = parse_args(argv, parser_class)
+    if args_namespace.worker is not None:
+        logging.info("worker du coordinateur {}".format(args_namespace.worker))
+        targets = []
+    elif args_namespace.daemon is not None:
+        logging.info("daemon a l'ecoute sur {}".format(args_namespace.daemon))
+        targets = []
+    elif args_namespace.file is not None:
         logging.info(
             "argument de type fichier : {}".format(args_namespace.file)
         )
         targets = parse_file(args_namespace.file)
-        # suppression des lignes vides
-        targets = [t for t in targets if t != ""]
     else:
         logging.info(
             "argument de type target : {}".format(args_namespace.targets)
@@ -101,8 +315,133 @@ def parse():
     if args_namespace.soft:
         logging.info("le scan sera soft (rapide mais peu detaille)")
 
-    # suppression des doublons
-    unique_targets = list(set(targets))
-    if len(unique_targets) != len(targets):
-        targets = unique_targets
-    return args_namespace.soft, targets
+    # suppression des doublons (a la normalisation pres), en conservant
+    # l'ordre d'entree et la cible telle qu'elle a ete saisie, qui sert de
+    # cle dans les rapports. Les recouvrements entre reseaux sont traites
+    # au moment du scan (voir TargetMap), apres la resolution des noms
+    # d'hote.
+    unique_targets = {}
+    for target in targets:
+        unique_targets.setdefault(normalize_target(target), target.strip())
+    targets = list(unique_targets.values())
+    options = {
+        "engine": args_namespace.engine,
+        "udp_engine": args_namespace.udp_engine,
+        "host_batch_size": args_namespace.batch_size,
+        "discovery": args_namespace.discovery,
+        "processes": args_namespace.processes,
+        "max_rate": args_namespace.max_rate,
+        "max_host_probes": args_namespace.max_host_probes,
+        "max_host_tasks": args_namespace.max_host_tasks,
+        "incremental": args_namespace.incremental,
+        "cache_ttl": args_namespace.cache_ttl,
+        "resume": args_namespace.resume,
+        # le cache et le journal ne sont tenus que s'ils sont configures,
+        # ou demandes par les options correspondantes.
+        "cache_path": config_dict["CACHE_PATH"]
+        or (DEFAULT_CACHE_PATH if args_namespace.incremental else None),
+        "journal_path": config_dict["JOURNAL_PATH"]
+        or (
+            DEFAULT_JOURNAL_PATH
+            if args_namespace.journal or args_namespace.resume
+            else None
+        ),
+        "output_formats": args_namespace.output_formats,
+        "worker": args_namespace.worker,
+        "daemon": args_namespace.daemon,
+        "coordinator": args_namespace.coordinator,
+        "local_workers": args_namespace.local_workers,
+        "port_sets": build_port_sets(
+            args_namespace.soft,
+            args_namespace.ports,
+            args_namespace.exclude_ports,
+            args_namespace.top_ports,
+            ["T", "U"],
+        ),
+    }
+    logging.info("moteur de scan : {}".format(options["engine"]))
+    if not args_namespace.soft:
+        logging.info("moteur de scan UDP : {}".format(options["udp_engine"]))
+    if options["port_sets"] is not None:
+        for transport_protocol, port_set in options["port_sets"].items():
+            logging.info(
+                "ports {} a scanner : {} port(s)".format(
+                    transport_protocol, len(port_set)
+                )
+            )
+    if options["discovery"]:
+        logging.info("les machines en ligne seront recherchees au prealable")
+    logging.info("nombre de processus : {}".format(options["processes"]))
+    if options["max_rate"]:
+        logging.info("debit limite a {} paquets/s".format(options["max_rate"]))
+    if options["incremental"]:
+        logging.info(
+            "scan incremental : resultats valides pendant {}s".format(
+                options["cache_ttl"]
+            )
+        )
+    if options["cache_path"]:
+        logging.info("cache des resultats : {}".format(options["cache_path"]))
+    if options["resume"]:
+        if not os.path.isfile(options["journal_path"]):
+            raise ValueError(
+                "aucun journal {} : pas de scan a reprendre".format(
+                    options["journal_path"]
+                )
+            )
+        logging.info("reprise du scan interrompu")
+    if options["journal_path"]:
+        logging.info("journal du scan : {}".format(options["journal_path"]))
+    # un scan soft partiel compare au cache et au journal les ports que
+    # nmap aurait choisis : ils doivent etre connus avant de commencer.
+    if (
+        args_namespace.soft
+        and options["port_sets"] is None
+        and (options["incremental"] or options["resume"])
+    ):
+        top_ports(NMAP_DEFAULT_PORTS, "T")
+    if options["processes"] < 1:
+        raise ValueError(
+            "le nombre de processus doit etre strictement positif"
+        )
+    # l'API du daemon lance nmap en root : sur un port TCP, accessible a
+    # tous les utilisateurs de la machine, un jeton est exige.
+    if (
+        options["daemon"] is not None
+        and "/" not in options["daemon"]
+        and not config_dict["DAEMON_TOKEN"]
+    ):
+        raise ValueError("l'API TCP du daemon necessite DAEMON_TOKEN")
+    # de meme, les workers d'un scan distribue executent nmap en root sur
+    # ordre du coordinateur : ils s'authentifient mutuellement par un
+    # jeton partage.
+    if (
+        options["coordinator"] is not None or options["worker"] is not None
+    ) and not config_dict["DISTRIBUTED_TOKEN"]:
+        raise ValueError("le scan distribue necessite DISTRIBUTED_TOKEN")
+    if options["coordinator"] is not None:
+        if options["worker"] is not None:
+            raise ValueError("un worker ne peut pas etre coordinateur")
+        if options["daemon"] is not None:
+            raise ValueError(
+                "le daemon ne peut pas etre coordinateur d'un scan distribue"
+            )
+        logging.info(
+            "scan distribue : coordinateur sur {}, {} worker(s) local(aux)"
+            "".format(options["coordinator"], options["local_workers"])
+        )
+    elif options["local_workers"] != 0:
+        raise ValueError("les workers locaux necessitent --coordinator")
+    if options["local_workers"] < 0:
+        raise ValueError("le nombre de workers locaux doit etre positif")
+    if options["max_rate"] < 0 or options["max_host_probes"] < 0:
+        raise ValueError("les limites de debit doivent etre positives")
+    if options["max_host_tasks"] < 0:
+        raise ValueError(
+            "le nombre de requetes simultanees par machine doit etre positif"
+        )
+    if options["host_batch_size"] < 0:
+        raise ValueError(
+            "la taille des groupes de machines doit etre positive"
+        )
+    return args_namespace.soft, targets, options
@@ -0,0 +1,383 @@
+"""
+Ensembles de ports a scanner, representes par des intervalles disjoints.
+
+:file ports.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import bisect
+import os
+from .config import config_dict
+
+# ports les plus frequemment ouverts d'apres les statistiques de nmap,
+# par ordre de frequence decroissante. Ces listes ne servent que si le
+# fichier nmap-services n'est pas disponible a cote du binaire nmap.
+# fmt: off
+DEFAULT_TOP_PORTS = {
+    "T": [
+        80, 23, 443, 21, 22, 25, 3389, 110, 445, 139, 143, 53, 135, 3306,
+        8080, 1723, 111, 995, 993, 5900, 1025, 587, 8888, 199, 1720, 465,
+        548, 113, 81, 6001, 10000, 514, 5060, 179, 1026, 2000, 8443, 8000,
+        32768, 554, 26, 1433, 49152, 2001, 515, 8008, 49154, 1027, 5666,
+        646, 5000, 5631, 631, 49153, 8081, 2049, 88, 79, 5800, 106, 2121,
+        1110, 49155, 6000, 513, 990, 5357, 427, 49156, 543, 544, 5101, 144,
+        7, 389,
+    ],
+    "U": [
+        631, 161, 137, 123, 138, 1434, 445, 135, 67, 53, 139, 500, 68, 520,
+        1900, 4500, 514, 49152, 162, 69, 5353, 111, 49154, 1701, 998, 996,
+        997, 999, 3283, 49153, 1812, 136, 2222, 2049, 32768, 1433, 1646,
+        1645, 626, 1719, 1718, 31337, 4444, 5060, 5000,
+    ],
+}
+# fmt: on
+
+# correspondance entre les protocoles de transport et les noms utilises
+# dans le fichier nmap-services
+SERVICES_PROTOCOLS = {"T": "tcp", "U": "udp"}
+# nombre de ports scannes par nmap lorsqu'aucun port n'est precise (ses
+# ports les plus frequents)
+NMAP_DEFAULT_PORTS = 1000
+
+MIN_PORT = 1
+MAX_PORT = 65535
+
+
+class PortSet:
+    """
+    Ensemble de ports, stocke sous forme d'intervalles tries et disjoints
+    [(debut, fin)] bornes inclus : l'ensemble des 65535 ports n'occupe
+    qu'un seul intervalle.
+
+    :class PortSet
+    """
+
+    def __init__(self, intervals=()):
+        """
+        Initialisation des objets de type PortSet, les intervalles donnes
+        etant normalises (tries, fusionnes s'ils se chevauchent ou se
+        touchent).
+
+        :param self : reference vers l'objet PortSet parent
+        :param intervals : iterable de tuples (debut, fin) bornes inclus
+        :return None
+        """
+        self.intervals = []
+        for start, end in sorted(intervals):
+            if start > end:
+                continue
+            if start < MIN_PORT or end > MAX_PORT:
+                raise ValueError(
+                    "port hors limites : {}-{}".format(start, end)
+                )
+            if self.intervals and start <= self.intervals[-1][1] + 1:
+                last_start, last_end = self.intervals[-1]
+                self.intervals[-1] = (last_start, max(last_end, end))
+            else:
+                self.intervals.append((start, end))
+
+    @classmethod
+    def from_range(cls, start, end):
+        """
+        Creation d'un ensemble a partir d'un intervalle de ports.
+
+        :param start : premier port
+        :param end : dernier port
+        :return ensemble de ports (PortSet)
+        """
+        return cls([(start, end)])
+
+    @classmethod
+    def from_ports(cls, ports):
+        """
+        Creation d'un ensemble a partir d'une liste de ports.
+
+        :param ports : iterable de numeros de ports
+        :return ensemble de ports (PortSet)
+        """
+        return cls((port, port) for port in ports)
+
+    @classmethod
+    def from_nmap(cls, spec):
+        """
+        Creation d'un ensemble a partir de sa representation au format de
+        l'option -p de nmap (voir to_nmap).
+
+        :param spec : chaine de caracteres, ex : "22,80,1000-2000"
+        :return ensemble de ports (PortSet)
+        """
+        intervals = []
+        for token in spec.split(","):
+            start, _, end = token.partition("-")
+            intervals.append((int(start), int(end or start)))
+        return cls(intervals)
+
+    def __len__(self):
+        return sum(end - start + 1 for start, end in self.intervals)
+
+    def __iter__(self):
+        for start, end in self.intervals:
+            yield from range(start, end + 1)
+
+    def __contains__(self, port):
+        index = bisect.bisect_right(self.intervals, (port, MAX_PORT + 1))
+        return index > 0 and self.intervals[index - 1][1] >= port
+
+    def __eq__(self, other):
+        return isinstance(other, PortSet) and self.intervals == other.intervals
+
+    def __or__(self, other):
+        """
+        Union de deux ensembles de ports.
+        """
+        return PortSet(self.intervals + other.intervals)
+
+    def __and__(self, other):
+        """
+        Intersection de deux ensembles de ports.
+        """
+        return self - (self - other)
+
+    def __sub__(self, other):
+        """
+        Difference de deux ensembles de ports (liste d'exclusion).
+        """
+        intervals = []
+        excluded = other.intervals
+        index = 0
+        for start, end in self.intervals:
+            # on saute les exclusions situees entierement avant
+            # l'intervalle courant
+            while index < len(excluded) and excluded[index][1] < start:
+                index += 1
+            current = start
+            scan_index = index
+            while (
+                scan_index < len(excluded) and excluded[scan_index][0] <= end
+            ):
+                excluded_start, excluded_end = excluded[scan_index]
+                if excluded_start > current:
+                    intervals.append((current, excluded_start - 1))
+                current = max(current, excluded_end + 1)
+                scan_index += 1
+            if current <= end:
+                intervals.append((current, end))
+        return PortSet(intervals)
+
+    def split(self, count):
+        """
+        Separation de l'ensemble en ses "count" plus petits ports et le
+        reste.
+
+        :param self : reference vers l'objet PortSet parent
+        :param count : nombre de ports du premier ensemble
+        :return tuple (premiers ports, ports restants)
+        """
+        head = []
+        tail = []
+        remaining = count
+        for start, end in self.intervals:
+            if remaining <= 0:
+                tail.append((start, end))
+                continue
+            size = end - start + 1
+            if size <= remaining:
+                head.append((start, end))
+                remaining -= size
+            else:
+                head.append((start, start + remaining - 1))
+                tail.append((start + remaining, end))
+                remaining = 0
+        return PortSet(head), PortSet(tail)
+
+    def chunks(self, size):
+        """
+        Partition exacte de l'ensemble en sous-ensembles de "size" ports
+        (le dernier pouvant etre plus petit), sans chevauchement.
+
+        :param self : reference vers l'objet PortSet parent
+        :param size : nombre de ports par sous-ensemble
+        :return generateur d'ensembles de ports
+        """
+        remaining = self
+        while len(remaining.intervals) != 0:
+            chunk, remaining = remaining.split(size)
+            yield chunk
+
+    def to_nmap(self):
+        """
+        Representation de l'ensemble au format de l'option -p de nmap.
+
+        :param self : reference vers l'objet PortSet parent
+        :return chaine de caracteres, ex : "22,80,1000-2000"
+        """
+        return ",".join(
+            str(start) if start == end else "{}-{}".format(start, end)
+            for start, end in self.intervals
+        )
+
+    def __repr__(self):
+        return "PortSet({})".format(self.to_nmap())
+
+
+def get_services_path():
+    """
+    Recuperation du chemin du fichier nmap-services, installe a cote du
+    binaire nmap configure (ex : /usr/bin/nmap, /usr/share/nmap/).
+
+    :param None
+    :return chemin du fichier nmap-services
+    """
+    prefix = os.path.dirname(
+        os.path.dirname(os.path.abspath(config_dict["NMAP_BINARY_PATH"]))
+    )
+    return os.path.join(prefix, "share", "nmap", "nmap-services")
+
+
+def load_port_frequencies(transport_protocol):
+    """
+    Lecture des frequences d'ouverture des ports dans nmap-services.
+
+    :param transport_protocol : protocole de transport ("T" ou "U")
+    :return liste de ports par frequence decroissante, None si le fichier
+            est absent
+    """
+    services_path = get_services_path()
+    if not os.path.exists(services_path):
+        return None
+    protocol_name = SERVICES_PROTOCOLS[transport_protocol]
+    frequencies = {}
+    with open(services_path, "r") as services_file:
+        for line in services_file:
+            # format : "http	80/tcp	0.484143	# World Wide Web HTTP"
+            fields = line.split()
+            if len(fields) < 3 or fields[0].startswith("#"):
+                continue
+            port, _, protocol = fields[1].partition("/")
+            if protocol != protocol_name:
+                continue
+            try:
+                frequencies[int(port)] = float(fields[2])
+            except ValueError:
+                continue
+    return sorted(frequencies, key=lambda port: -frequencies[port])
+
+
+def top_ports(count, transport_protocol):
+    """
+    Recuperation des "count" ports les plus frequemment ouverts. Sans le
+    fichier nmap-services, seuls les premiers ports de DEFAULT_TOP_PORTS
+    sont connus : une erreur est levee si count les depasse.
+
+    :param count : nombre de ports souhaite
+    :param transport_protocol : protocole de transport ("T" ou "U")
+    :return ensemble de ports (PortSet)
+    """
+    ports = load_port_frequencies(transport_protocol)
+    if ports is None:
+        ports = DEFAULT_TOP_PORTS[transport_protocol]
+        # le scan ne doit pas porter silencieusement sur moins de ports
+        # que demande (ou que nmap n'en aurait choisi)
+        if count > len(ports):
+            raise ValueError(
+                "{} introuvable : seuls les {} ports {} les plus frequents "
+                "sont connus, {} demandes".format(
+                    get_services_path(),
+                    len(ports),
+                    SERVICES_PROTOCOLS[transport_protocol],
+                    count,
+                )
+            )
+    return PortSet.from_ports(ports[:count])
+
+
+def parse_port_spec(spec, transport_protocols):
+    """
+    Lecture d'une specification de ports, au format de l'option -p de
+    nmap : "22,80,1000-2000", "top:100", "T:80,443,U:53". Sans prefixe
+    T: ou U:, les ports concernent tous les protocoles de transport.
+
+    :param spec : specification de ports
+    :param transport_protocols : protocoles de transport concernes
+    :return dictionnaire {protocole: PortSet}
+    """
+    intervals = {protocol: [] for protocol in transport_protocols}
+    top_sets = {protocol: PortSet() for protocol in transport_protocols}
+    current_protocols = list(transport_protocols)
+    for token in spec.split(","):
+        token = token.strip()
+        if token == "":
+            continue
+        # un prefixe T: ou U: s'applique a la suite de la specification
+        prefix, separator, value = token.partition(":")
+        if separator and prefix.upper() in ("T", "U"):
+            current_protocols = [
+                p for p in transport_protocols if p == prefix.upper()
+            ]
+            token = value
+        if token.lower().startswith("top:"):
+            count = int(token[4:])
+            for protocol in current_protocols:
+                top_sets[protocol] = top_sets[protocol] | top_ports(
+                    count, protocol
+                )
+            continue
+        start, separator, end = token.partition("-")
+        start = int(start) if start else MIN_PORT
+        end = (int(end) if end else MAX_PORT) if separator else start
+        for protocol in current_protocols:
+            intervals[protocol].append((start, end))
+    return {
+        protocol: PortSet(intervals[protocol]) | top_sets[protocol]
+        for protocol in transport_protocols
+    }
+
+
+def build_port_sets(
+    soft, ports_spec, exclude_spec, top_count, transport_protocols
+):
+    """
+    Construction des ensembles de ports a scanner pour chaque protocole
+    de transport, a partir des options de la ligne de commande.
+
+    :param soft : booleen indiquant le type de scan (soft ou non)
+    :param ports_spec : specification des ports a scanner (ou None)
+    :param exclude_spec : specification des ports a exclure (ou None)
+    :param top_count : nombre de ports les plus frequents a scanner (ou
+                       None)
+    :param transport_protocols : protocoles de transport disponibles
+    :return dictionnaire {protocole: PortSet}, ou None pour laisser nmap
+            choisir ses ports les plus connus (scan soft par defaut)
+    """
+    if ports_spec is None and top_count is None:
+        if exclude_spec is None:
+            return None
+        # sans ports explicites, les exclusions s'appliquent aux ports
+        # qui auraient ete scannes par defaut.
+        if soft:
+            port_sets = {
+                protocol: top_ports(NMAP_DEFAULT_PORTS, protocol)
+                for protocol in transport_protocols
+            }
+        else:
+            port_sets = {
+                protocol: PortSet.from_range(MIN_PORT, MAX_PORT)
+                for protocol in transport_protocols
+            }
+    else:
+        port_sets = {protocol: PortSet() for protocol in transport_protocols}
+        if ports_spec is not None:
+            parsed = parse_port_spec(ports_spec, transport_protocols)
+            for protocol in transport_protocols:
+                port_sets[protocol] = port_sets[protocol] | parsed[protocol]
+        if top_count is not None:
+            for protocol in transport_protocols:
+                port_sets[protocol] = port_sets[protocol] | top_ports(
+                    top_count, protocol
+                )
+    if exclude_spec is not None:
+        excluded = parse_port_spec(exclude_spec, transport_protocols)
+        for protocol in transport_protocols:
+            port_sets[protocol] = port_sets[protocol] - excluded[protocol]
+    return port_sets
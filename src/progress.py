@@ -0,0 +1,123 @@
+"""
+Suivi de la progression des etapes du scan.
+
+:file progress.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import collections
+import datetime
+import logging
+import time
+
+
+def format_duration(seconds):
+    """
+    Mise en forme d'une duree pour les logs.
+
+    :param seconds : duree (secondes)
+    :return chaine h:mm:ss
+    """
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+
+class ProgressTracker:
+    """
+    Progression d'une etape, mise a jour a chaque requete terminee. Le
+    temps restant est estime d'apres le debit de progression observe sur
+    une fenetre glissante : il suit ainsi les variations de vitesse du
+    scan (machines lentes, limitation du debit) sans etre fausse par le
+    debut de l'etape.
+
+    :class ProgressTracker
+    """
+
+    def __init__(self, label, interval, window=60):
+        """
+        Initialisation des objets de type ProgressTracker.
+
+        :param self : reference vers l'objet ProgressTracker parent
+        :param label : nom de l'etape affiche dans les logs
+        :param interval : intervalle minimal entre deux logs (secondes)
+        :param window : duree de la fenetre de mesure du debit (secondes)
+        :return None
+        """
+        self.label = label
+        self.interval = interval
+        self.window = window
+        self.start_time = time.monotonic()
+        self.last_log_time = self.start_time
+        self.percentage = 0.0
+        # mesures recentes : (date, pourcentage)
+        self.samples = collections.deque([(self.start_time, 0.0)])
+
+    def update(self, percentage):
+        """
+        Prise en compte d'une nouvelle progression, et affichage de
+        celle-ci si le dernier affichage est assez ancien.
+
+        :param self : reference vers l'objet ProgressTracker parent
+        :param percentage : pourcentage de progression
+        :return None
+        """
+        now = time.monotonic()
+        self.percentage = percentage
+        self.samples.append((now, percentage))
+        while len(self.samples) > 2 and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+        # la fin de l'etape est affichee par finish
+        if percentage < 100 and now - self.last_log_time >= self.interval:
+            self.last_log_time = now
+            self.log(now)
+
+    def remaining_time(self, now):
+        """
+        Estimation du temps restant d'apres le debit de progression.
+
+        :param self : reference vers l'objet ProgressTracker parent
+        :param now : date courante (time.monotonic)
+        :return duree estimee (secondes), ou None si aucune progression
+                n'a encore ete mesuree
+        """
+        first_time, first_percentage = self.samples[0]
+        if now > first_time and self.percentage > first_percentage:
+            rate = (self.percentage - first_percentage) / (now - first_time)
+        elif now > self.start_time and self.percentage > 0:
+            rate = self.percentage / (now - self.start_time)
+        else:
+            return None
+        return max(0.0, 100 - self.percentage) / rate
+
+    def log(self, now):
+        """
+        Affichage de la progression et du temps restant estime.
+
+        :param self : reference vers l'objet ProgressTracker parent
+        :param now : date courante (time.monotonic)
+        :return None
+        """
+        remaining = self.remaining_time(now)
+        logging.info(
+            "progression {} : {:.1f}%, temps ecoule : {}, temps restant "
+            "estime : {}".format(
+                self.label,
+                self.percentage,
+                format_duration(now - self.start_time),
+                "inconnu" if remaining is None else format_duration(remaining),
+            )
+        )
+
+    def finish(self):
+        """
+        Fin de l'etape : affichage immediat de sa duree totale.
+
+        :param self : reference vers l'objet ProgressTracker parent
+        :return None
+        """
+        logging.info(
+            "progression {} : 100%, temps ecoule : {}".format(
+                self.label,
+                format_duration(time.monotonic() - self.start_time),
+            )
+        )
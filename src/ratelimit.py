@@ -0,0 +1,74 @@
+"""
+Limitation du debit de paquets, partagee entre les processus de scan.
+
+:file ratelimit.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import multiprocessing
+import time
+
+
+class TokenBucket:
+    """
+    Seau a jetons partage entre les processus du pool : chaque requete
+    preleve autant de jetons que de paquets qu'elle est susceptible
+    d'envoyer, et le seau se remplit au debit autorise. Une requete peut
+    endetter le seau ; les requetes suivantes attendent alors que la
+    dette soit resorbee, ce qui borne le debit moyen de l'ensemble des
+    processus.
+
+    L'etat du seau est stocke en memoire partagee : l'objet doit etre
+    cree par le processus principal et transmis aux processus du pool
+    lors de leur initialisation.
+
+    :class TokenBucket
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Initialisation des objets de type TokenBucket.
+
+        :param self : reference vers l'objet TokenBucket parent
+        :param rate : debit autorise (jetons par seconde)
+        :param capacity : nombre maximal de jetons accumulables (une
+                          seconde de debit par defaut)
+        :return None
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.lock = multiprocessing.Lock()
+        # time.monotonic est commun a tous les processus d'une machine
+        self.tokens = multiprocessing.Value("d", self.capacity, lock=False)
+        self.timestamp = multiprocessing.Value(
+            "d", time.monotonic(), lock=False
+        )
+
+    def acquire(self, amount):
+        """
+        Prelevement de jetons, avec attente tant que le seau est endette.
+
+        :param self : reference vers l'objet TokenBucket parent
+        :param amount : nombre de jetons a prelever
+        :return duree d'attente (secondes)
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                elapsed = now - self.timestamp.value
+                self.tokens.value = min(
+                    self.capacity, self.tokens.value + elapsed * self.rate
+                )
+                self.timestamp.value = now
+                if self.tokens.value >= 0:
+                    # la requete peut partir : son cout sera rembourse
+                    # par les requetes suivantes, pendant qu'elle tourne.
+                    self.tokens.value -= amount
+                    return waited
+                wait_time = -self.tokens.value / self.rate
+            # l'attente se fait hors du verrou, pour ne pas bloquer les
+            # autres processus pendant ce temps.
+            time.sleep(wait_time)
+            waited += wait_time
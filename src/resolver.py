@@ -0,0 +1,133 @@
+"""
+Resolution DNS concurrente des cibles designees par un nom d'hote.
+
+:file resolver.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import concurrent.futures
+import ipaddress
+import logging
+import socket
+import time
+
+
+def resolve_name(name):
+    """
+    Resolution d'un nom d'hote en toutes ses adresses IPv4 et IPv6
+    (enregistrements A et AAAA).
+
+    :param name : nom d'hote
+    :return tuple : liste d'adresses (str), triees IPv4 d'abord, et
+            message d'erreur si la resolution a echoue (None sinon)
+    """
+    try:
+        infos = socket.getaddrinfo(name, None, type=socket.SOCK_STREAM)
+    except socket.gaierror as exception:
+        error = "impossible de resoudre {} : {}".format(name, exception)
+        logging.error(error)
+        return [], error
+    addresses = {
+        ipaddress.ip_address(sockaddr[0].split("%")[0])
+        for _, _, _, _, sockaddr in infos
+    }
+    return [
+        str(address)
+        for address in sorted(addresses, key=lambda a: (a.version, a))
+    ], None
+
+
+class Resolver:
+    """
+    Resolution des noms d'hote par un groupe de threads (getaddrinfo etant
+    bloquant), avec un cache en memoire et, le cas echeant, dans le cache
+    des resultats sur disque. getaddrinfo ne donnant pas la duree de vie
+    des enregistrements, celle-ci est fixee par la configuration.
+
+    Les echecs de resolution ne sont pas mis en cache : ils sont renvoyes
+    a l'appelant, qui les reporte dans le rapport de la cible.
+
+    :class Resolver
+    """
+
+    def __init__(self, cache=None, ttl=3600, concurrency=64):
+        """
+        Initialisation des objets de type Resolver.
+
+        :param self : reference vers l'objet Resolver parent
+        :param cache : cache des resultats sur disque (ResultCache), ou
+                       None
+        :param ttl : duree de validite d'une resolution (secondes)
+        :param concurrency : nombre maximal de resolutions simultanees
+        :return None
+        """
+        self.cache = cache
+        self.ttl = ttl
+        self.concurrency = concurrency
+        # {nom: (liste d'adresses, date d'expiration)}
+        self.entries = {}
+
+    def lookup(self, name, now):
+        """
+        Recherche d'une resolution encore valide en memoire, puis sur
+        disque.
+
+        :param self : reference vers l'objet Resolver parent
+        :param name : nom d'hote
+        :param now : date courante (timestamp)
+        :return liste d'adresses, ou None
+        """
+        if name in self.entries:
+            addresses, expires_at = self.entries[name]
+            if expires_at > now:
+                return addresses
+            del self.entries[name]
+        if self.cache is None:
+            return None
+        entry = self.cache.lookup_name(name, now)
+        if entry is not None:
+            self.entries[name] = entry
+            return entry[0]
+        return None
+
+    def resolve(self, names):
+        """
+        Resolution d'un ensemble de noms d'hote : seuls les noms absents
+        des caches sont resolus, de maniere concurrente.
+
+        :param self : reference vers l'objet Resolver parent
+        :param names : noms d'hote a resoudre
+        :return tuple : dictionnaire {nom: liste d'adresses} et
+                dictionnaire {nom: message d'erreur} des noms non resolus
+        """
+        now = time.time()
+        resolved = {}
+        failures = {}
+        missing = []
+        for name in dict.fromkeys(names):
+            addresses = self.lookup(name, now)
+            if addresses is None:
+                missing.append(name)
+            else:
+                resolved[name] = addresses
+        if len(missing) == 0:
+            return resolved, failures
+
+        logging.info("resolution de {} nom(s) d'hote".format(len(missing)))
+        workers = min(self.concurrency, len(missing))
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            results = executor.map(resolve_name, missing)
+            for name, (addresses, error) in zip(missing, results):
+                resolved[name] = addresses
+                if error is not None:
+                    failures[name] = error
+                if len(addresses) == 0:
+                    continue
+                expires_at = now + self.ttl
+                self.entries[name] = (addresses, expires_at)
+                if self.cache is not None:
+                    self.cache.record_name(name, addresses, expires_at)
+        if self.cache is not None:
+            self.cache.commit()
+        return resolved, failures
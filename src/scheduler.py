@@ -0,0 +1,319 @@
+"""
+Ordonnancement adaptatif des intervalles de ports a scanner.
+
+:file scheduler.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import collections
+import threading
+from .ports import PortSet
+
+
+class AdaptiveChunkScheduler:
+    """
+    Decoupage des ports a scanner en intervalles dont la taille depend de
+    la vitesse de scan observee pour chaque groupe de machines : les
+    machines rapides recoivent de grands intervalles (peu d'appels a
+    nmap), les machines lentes (ports filtres) de petits intervalles que
+    les processus libres se partagent, ce qui evite d'attendre en fin de
+    scan quelques intervalles interminables.
+
+    Les intervalles ne sont crees qu'a la demande du pool : le reste des
+    ports d'une machine lente n'est jamais attribue a l'avance a un seul
+    processus.
+
+    Les groupes en cours cedent leurs intervalles a tour de role, et le
+    nombre de requetes simultanees sur un meme groupe de machines est
+    borne : les processus se repartissent entre les machines au lieu de
+    les scanner l'une apres l'autre, ce qui evite de declencher leurs
+    protections (SYN flood, limitation des ICMP).
+
+    :class AdaptiveChunkScheduler
+    """
+
+    # poids de la derniere mesure dans la moyenne glissante des vitesses
+    RATE_SMOOTHING = 0.5
+
+    def __init__(
+        self,
+        work_units,
+        total_ports,
+        initial_chunk,
+        min_chunk,
+        max_chunk,
+        chunk_duration,
+        window,
+        max_host_tasks=0,
+    ):
+        """
+        Initialisation des objets de type AdaptiveChunkScheduler.
+
+        :param self : reference vers l'objet AdaptiveChunkScheduler parent
+        :param work_units : iterable des metadonnees de base de chaque
+                            groupe de machines et protocole a scanner,
+                            "port_range" designant l'ensemble des ports
+                            du groupe, et "host_group" le groupe de
+                            machines (commun a ses protocoles)
+        :param total_ports : nombre total de ports a scanner, tous groupes
+                             confondus, chaque port comptant pour chaque
+                             machine du groupe ("hosts_count" des
+                             metadonnees, 1 par defaut)
+        :param initial_chunk : taille des intervalles tant qu'aucune
+                               vitesse n'a ete mesuree
+        :param min_chunk : taille minimale d'un intervalle
+        :param max_chunk : taille maximale d'un intervalle
+        :param chunk_duration : duree visee pour le scan d'un intervalle
+                                (secondes)
+        :param window : nombre de groupes scannes simultanement
+        :param max_host_tasks : nombre maximal de requetes simultanees sur
+                                un meme groupe de machines, tous
+                                protocoles confondus (0 : illimite)
+        :return None
+        """
+        self.work_units = iter(work_units)
+        self.initial_chunk = initial_chunk
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.chunk_duration = chunk_duration
+        self.window = window
+        self.max_host_tasks = max_host_tasks
+
+        # le generateur de requetes est consomme par un thread du pool,
+        # alors que les vitesses sont mesurees par le processus principal.
+        self.lock = threading.Lock()
+        # signale la fin d'une requete au generateur, bloque lorsque tous
+        # les groupes ont atteint max_host_tasks
+        self.task_done = threading.Condition(self.lock)
+        # requetes en cours par groupe de machines : {host_group: nombre}
+        self.running = collections.Counter()
+        # scan interrompu : le generateur ne doit plus attendre
+        self.stopped = False
+        # groupes en cours de scan : {identifiant: etat du groupe}
+        self.units = {}
+        # ordre de parcours des groupes en cours (tourniquet)
+        self.active = collections.deque()
+        self.next_unit_id = 0
+        # vitesse moyenne observee sur l'ensemble des groupes (ports/s)
+        self.global_rate = None
+
+        self.total_ports = total_ports
+        self.done_ports = 0
+
+    def activate_unit(self):
+        """
+        Activation du groupe suivant. Doit etre appelee en possession du
+        verrou.
+
+        :param self : reference vers l'objet AdaptiveChunkScheduler parent
+        :return booleen indiquant si un groupe restait a activer
+        """
+        base_metadata = next(self.work_units, None)
+        if base_metadata is None:
+            return False
+        unit_id = self.next_unit_id
+        self.next_unit_id += 1
+        self.units[unit_id] = {
+            "metadata": base_metadata,
+            "remaining": PortSet.from_nmap(base_metadata["port_range"]),
+            "rate": None,
+        }
+        self.active.append(unit_id)
+        return True
+
+    def fill_window(self):
+        """
+        Activation de nouveaux groupes tant que la fenetre n'est pas pleine.
+        Doit etre appelee en possession du verrou.
+
+        :param self : reference vers l'objet AdaptiveChunkScheduler parent
+        :return None
+        """
+        while len(self.active) < self.window and self.activate_unit():
+            pass
+
+    def next_unit(self):
+        """
+        Groupe suivant du tourniquet pouvant recevoir une requete : les
+        groupes ayant deja max_host_tasks requetes en cours sont passes.
+        Si tous les groupes de la fenetre sont dans ce cas, de nouveaux
+        groupes sont actives, afin d'occuper les processus libres avec
+        d'autres machines. Doit etre appelee en possession du verrou.
+
+        :param self : reference vers l'objet AdaptiveChunkScheduler parent
+        :return identifiant du groupe, ou None si aucun groupe ne peut
+                recevoir de requete
+        """
+        self.fill_window()
+        checked = 0
+        while True:
+            while checked < len(self.active):
+                unit_id = self.active[0]
+                self.active.rotate(-1)
+                checked += 1
+                group = self.units[unit_id]["metadata"]["host_group"]
+                if (
+                    self.max_host_tasks == 0
+                    or self.running[group] < self.max_host_tasks
+                ):
+                    return unit_id
+            # les groupes actives ensuite sont places en fin de tourniquet
+            if not self.activate_unit():
+                return None
+            self.active.rotate(1)
+            checked = len(self.active) - 1
+
+    def release(self, metadata):
+        """
+        Fin d'une requete d'un groupe de machines. Doit etre appelee en
+        possession du verrou.
+
+        :param self : reference vers l'objet AdaptiveChunkScheduler parent
+        :param metadata : metadonnees de l'intervalle
+        :return None
+        """
+        group = metadata["host_group"]
+        self.running[group] -= 1
+        if self.running[group] <= 0:
+            del self.running[group]
+        self.task_done.notify()
+
+    def stop(self):
+        """
+        Interruption du scan : le generateur des requetes se termine, y
+        compris s'il attend la fin d'une requete (sans quoi l'arret du
+        pool attendrait indefiniment).
+
+        :param self : reference vers l'objet AdaptiveChunkScheduler parent
+        :return None
+        """
+        with self.lock:
+            self.stopped = True
+            self.task_done.notify_all()
+
+    def chunk_size(self, unit):
+        """
+        Calcul de la taille du prochain intervalle d'un groupe, d'apres la
+        vitesse de scan observee.
+
+        :param self : reference vers l'objet AdaptiveChunkScheduler parent
+        :param unit : etat du groupe
+        :return nombre de ports du prochain intervalle
+        """
+        rate = unit["rate"] if unit["rate"] is not None else self.global_rate
+        if rate is None:
+            return self.initial_chunk
+        size = int(rate * self.chunk_duration)
+        return max(self.min_chunk, min(self.max_chunk, size))
+
+    def iter_tasks(self):
+        """
+        Generateur des requetes : a chaque appel, le groupe suivant du
+        tourniquet cede son prochain intervalle de ports. Lorsque tous les
+        groupes restants ont atteint max_host_tasks requetes en cours, le
+        generateur attend la fin de l'une d'elles.
+
+        :param self : reference vers l'objet AdaptiveChunkScheduler parent
+        :return generateur de dictionnaires de metadonnees
+        """
+        while True:
+            with self.lock:
+                if self.stopped:
+                    return
+                unit_id = self.next_unit()
+                while unit_id is None:
+                    if len(self.active) == 0 or self.stopped:
+                        return
+                    self.task_done.wait()
+                    unit_id = self.next_unit()
+                unit = self.units[unit_id]
+                self.running[unit["metadata"]["host_group"]] += 1
+
+                # les intervalles sont pris dans l'ensemble des ports
+                # restants : ils ne se chevauchent jamais.
+                chunk, unit["remaining"] = unit["remaining"].split(
+                    self.chunk_size(unit)
+                )
+                if len(unit["remaining"].intervals) == 0:
+                    # tous les ports du groupe sont attribues : il laisse
+                    # sa place dans la fenetre a un nouveau groupe.
+                    self.active.remove(unit_id)
+                    del self.units[unit_id]
+
+                metadata = dict(unit["metadata"])
+                metadata["port_range"] = chunk.to_nmap()
+                metadata["port_count"] = len(chunk)
+                metadata["unit_id"] = unit_id
+            yield metadata
+
+    def record(self, metadata, elapsed):
+        """
+        Prise en compte de la duree de scan d'un intervalle.
+
+        :param self : reference vers l'objet AdaptiveChunkScheduler parent
+        :param metadata : metadonnees de l'intervalle scanne
+        :param elapsed : duree du scan de l'intervalle (secondes)
+        :return None
+        """
+        rate = metadata["port_count"] / max(elapsed, 0.001)
+        with self.lock:
+            self.release(metadata)
+            self.done_ports += self.weight(metadata)
+            self.global_rate = self.smooth(self.global_rate, rate)
+            unit = self.units.get(metadata["unit_id"])
+            if unit is not None:
+                unit["rate"] = self.smooth(unit["rate"], rate)
+
+    def skip(self, metadata):
+        """
+        Prise en compte d'un intervalle dont le scan a echoue : ses ports
+        sont comptes comme traites, sans mesure de vitesse.
+
+        :param self : reference vers l'objet AdaptiveChunkScheduler parent
+        :param metadata : metadonnees de l'intervalle
+        :return None
+        """
+        with self.lock:
+            self.release(metadata)
+            self.done_ports += self.weight(metadata)
+
+    @staticmethod
+    def weight(metadata):
+        """
+        Part d'un intervalle dans la progression : ses ports, pour chaque
+        machine du groupe.
+
+        :param metadata : metadonnees de l'intervalle
+        :return nombre de ports, toutes machines confondues
+        """
+        return metadata["port_count"] * metadata.get("hosts_count", 1)
+
+    def smooth(self, previous_rate, rate):
+        """
+        Moyenne glissante exponentielle des vitesses de scan.
+
+        :param self : reference vers l'objet AdaptiveChunkScheduler parent
+        :param previous_rate : moyenne precedente (None si aucune)
+        :param rate : nouvelle mesure
+        :return nouvelle moyenne
+        """
+        if previous_rate is None:
+            return rate
+        return (
+            self.RATE_SMOOTHING * rate
+            + (1 - self.RATE_SMOOTHING) * previous_rate
+        )
+
+    def progress(self, skipped_ports=0):
+        """
+        Calcul de la progression du scan, en proportion de ports scannes.
+
+        :param self : reference vers l'objet AdaptiveChunkScheduler parent
+        :param skipped_ports : ports ecartes sans etre scannes (resultats
+                               deja connus), comptes comme total_ports
+        :return pourcentage de progression
+        """
+        if self.total_ports == 0:
+            return 100.0
+        return ((self.done_ports + skipped_ports) / self.total_ports) * 100
@@ -0,0 +1,150 @@
+"""
+Regroupement des cibles en reseaux disjoints a scanner, et
+correspondance inverse entre adresses et cibles d'origine.
+
+:file targets.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import bisect
+import ipaddress
+
+
+def normalize_target(target):
+    """
+    Normalisation d'une cible : forme canonique des IP et des CIDR (bits
+    d'hote mis a zero, IPv6 compressee), nom d'hote en minuscules.
+
+    :param target : cible (ipv4, ipv6, cidr, host...)
+    :return cible normalisee (str)
+    """
+    target = target.strip()
+    try:
+        return str(ipaddress.ip_address(target))
+    except ValueError:
+        pass
+    try:
+        return str(ipaddress.ip_network(target, strict=False))
+    except ValueError:
+        return target.lower().rstrip(".")
+
+
+class TargetMap:
+    """
+    Les reseaux de toutes les cibles sont fusionnes (recouvrements et
+    reseaux adjacents, voir ipaddress.collapse_addresses) : chaque
+    adresse n'est scannee qu'une seule fois, meme si elle appartient a
+    plusieurs cibles. Les resultats sont ensuite rattaches a toutes les
+    cibles d'origine de l'adresse.
+
+    Les intervalles d'adresses des cibles sont decoupes en segments
+    disjoints, chacun associe aux cibles qui le contiennent : retrouver
+    les cibles d'une adresse se fait par dichotomie.
+
+    :class TargetMap
+    """
+
+    def __init__(self, targets):
+        """
+        Initialisation des objets de type TargetMap.
+
+        :param self : reference vers l'objet TargetMap parent
+        :param targets : liste de cibles d'origine, dans l'ordre d'entree
+        :return None
+        """
+        self.ranks = {target: rank for rank, target in enumerate(targets)}
+        # reseaux de chaque version d'IP, avec leur cible d'origine
+        self.target_networks = {4: [], 6: []}
+        # reseaux disjoints a scanner, IPv4 puis IPv6 (voir build)
+        self.networks = []
+        # par version d'IP : debuts des segments, et tuples (fin du
+        # segment, cibles le contenant)
+        self.starts = {4: [], 6: []}
+        self.segments = {4: [], 6: []}
+
+    def add(self, target, networks):
+        """
+        Ajout des reseaux d'adresses d'une cible.
+
+        :param self : reference vers l'objet TargetMap parent
+        :param target : cible d'origine
+        :param networks : reseaux d'adresses de la cible (ipaddress)
+        :return None
+        """
+        for network in networks:
+            self.target_networks[network.version].append((network, target))
+
+    def build(self):
+        """
+        Fusion des reseaux et calcul des segments, une fois toutes les
+        cibles ajoutees.
+
+        :param self : reference vers l'objet TargetMap parent
+        :return None
+        """
+        self.networks = []
+        for version, target_networks in self.target_networks.items():
+            self.networks.extend(
+                ipaddress.collapse_addresses(
+                    network for network, _ in target_networks
+                )
+            )
+            self.build_segments(version, target_networks)
+
+    def build_segments(self, version, target_networks):
+        """
+        Decoupage des intervalles d'adresses d'une version d'IP en
+        segments disjoints (balayage des bornes des intervalles).
+
+        :param self : reference vers l'objet TargetMap parent
+        :param version : version d'IP (4 ou 6)
+        :param target_networks : liste de tuples (reseau, cible)
+        :return None
+        """
+        # evenements aux bornes : +1 au debut d'un intervalle, -1 juste
+        # apres sa fin
+        events = {}
+        for network, target in target_networks:
+            first = int(network.network_address)
+            last = int(network.broadcast_address)
+            events.setdefault(first, []).append((target, 1))
+            events.setdefault(last + 1, []).append((target, -1))
+        bounds = sorted(events)
+        active = {}
+        starts = []
+        segments = []
+        for index, bound in enumerate(bounds[:-1]):
+            for target, delta in events[bound]:
+                active[target] = active.get(target, 0) + delta
+                if active[target] == 0:
+                    del active[target]
+            if len(active) == 0:
+                continue
+            starts.append(bound)
+            segments.append(
+                (
+                    bounds[index + 1] - 1,
+                    tuple(sorted(active, key=self.ranks.__getitem__)),
+                )
+            )
+        self.starts[version] = starts
+        self.segments[version] = segments
+
+    def owners(self, ip_host):
+        """
+        Recuperation des cibles d'origine auxquelles appartient une IP.
+
+        :param self : reference vers l'objet TargetMap parent
+        :param ip_host : adresse IP (str)
+        :return tuple de cibles, dans l'ordre d'entree
+        """
+        address = ipaddress.ip_address(ip_host)
+        value = int(address)
+        index = bisect.bisect_right(self.starts[address.version], value) - 1
+        if index < 0:
+            return ()
+        last, targets = self.segments[address.version][index]
+        if value > last:
+            return ()
+        return targets
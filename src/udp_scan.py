@@ -0,0 +1,295 @@
+"""
+Moteur de scan UDP asynchrone, execute dans le processus principal.
+
+:file udp_scan.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import asyncio
+import logging
+import socket
+import time
+from .connect_scan import adjust_concurrency, scan_hosts
+from .ports import DEFAULT_TOP_PORTS, load_port_frequencies
+
+# sondes specifiques aux services UDP courants : {port: (service, charge
+# utile)}. Un datagramme vide ne suscite de reponse que de tres peu de
+# services ; les autres ports recoivent tout de meme un datagramme vide.
+# fmt: off
+UDP_PROBES = {
+    # echo
+    7: ("echo", b"\r\n\r\n"),
+    # requete DNS : serveurs de noms de la racine (NS .)
+    53: ("domain", b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+                   b"\x00\x00\x02\x00\x01"),
+    # lecture TFTP d'un fichier quelconque
+    69: ("tftp", b"\x00\x01r7tftp.txt\x00octet\x00"),
+    # appel RPC NULL au portmapper (programme 100000, version 2)
+    111: ("rpcbind", b"\x72\xfe\x1d\x13\x00\x00\x00\x00\x00\x00\x00\x02"
+                     b"\x00\x01\x86\xa0\x00\x00\x00\x02\x00\x00\x00\x00"
+                     b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+                     b"\x00\x00\x00\x00"),
+    # requete client NTP (version 4)
+    123: ("ntp", b"\xe3" + b"\x00" * 47),
+    # requete NetBIOS NBSTAT sur le nom "*"
+    137: ("netbios-ns", b"\x80\xf0\x00\x10\x00\x01\x00\x00\x00\x00\x00\x00"
+                        b"\x20CKAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA\x00"
+                        b"\x00\x21\x00\x01"),
+    # SNMPv1 GetRequest sysDescr.0, communaute "public"
+    161: ("snmp", b"\x30\x26\x02\x01\x00\x04\x06public\xa0\x19\x02\x01\x01"
+                  b"\x02\x01\x00\x02\x01\x00\x30\x0e\x30\x0c\x06\x08\x2b"
+                  b"\x06\x01\x02\x01\x01\x01\x00\x05\x00"),
+    # requete XDMCP Query
+    177: ("xdmcp", b"\x00\x01\x00\x02\x00\x01\x00"),
+    # demande de table de routage RIPv2
+    520: ("route", b"\x01\x02\x00\x00" + b"\x00" * 19 + b"\x10"),
+    # ping de presence RMCP (IPMI)
+    623: ("asf-rmcp", b"\x06\x00\xff\x06\x00\x00\x11\xbe\x80\x00\x00\x00"),
+    # ping du navigateur SQL Server
+    1434: ("ms-sql-m", b"\x02"),
+    # recherche SSDP (UPnP)
+    1900: ("upnp", b"M-SEARCH * HTTP/1.1\r\n"
+                   b"HOST: 239.255.255.250:1900\r\n"
+                   b"MAN: \"ssdp:discover\"\r\nMX: 1\r\nST: ssdp:all\r\n\r\n"),
+    # requete STUN Binding
+    3478: ("stun", b"\x00\x01\x00\x00\x21\x12\xa4\x42" + b"\x00" * 12),
+    # requete SIP OPTIONS
+    5060: ("sip", b"OPTIONS sip:nm SIP/2.0\r\n"
+                  b"Via: SIP/2.0/UDP nm;branch=foo;rport\r\n"
+                  b"From: <sip:nm@nm>;tag=root\r\nTo: <sip:nm2@nm2>\r\n"
+                  b"Call-ID: 50000\r\nCSeq: 42 OPTIONS\r\n"
+                  b"Max-Forwards: 70\r\nContent-Length: 0\r\n\r\n"),
+    # requete NAT-PMP d'adresse externe
+    5351: ("nat-pmp", b"\x00\x00"),
+    # requete mDNS : services DNS-SD annonces
+    5353: ("mdns", b"\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+                   b"\x09_services\x07_dns-sd\x04_udp\x05local\x00"
+                   b"\x00\x0c\x00\x01"),
+    # requete CoAP GET /.well-known/core
+    5683: ("coap", b"\x40\x01\x01\xce\xbb.well-known\x04core"),
+    # commande memcached "stats" (avec l'en-tete UDP)
+    11211: ("memcache", b"\x00\x01\x00\x00\x00\x01\x00\x00stats\r\n"),
+}
+# fmt: on
+
+# bornes du delai de retransmission adaptatif (secondes)
+MIN_RETRANSMISSION_TIMEOUT = 0.1
+
+
+def order_udp_ports(port_set):
+    """
+    Ordonnancement des ports UDP a scanner : d'abord ceux disposant d'une
+    sonde specifique, puis les plus frequemment ouverts (voir
+    nmap-services), et enfin les autres par ordre croissant. Les
+    resultats les plus probables sont ainsi obtenus en premier.
+
+    :param port_set : ensemble de ports a scanner (PortSet)
+    :return liste de ports ordonnee
+    """
+    frequent_ports = load_port_frequencies("U")
+    if frequent_ports is None:
+        frequent_ports = DEFAULT_TOP_PORTS["U"]
+    ordered = dict.fromkeys(
+        port for port in list(UDP_PROBES) + frequent_ports if port in port_set
+    )
+    for port in port_set:
+        ordered.setdefault(port)
+    return list(ordered)
+
+
+class ProbeProtocol(asyncio.DatagramProtocol):
+    """
+    Reception des reponses a une sonde UDP, sur un socket connecte : une
+    reponse UDP indique un port ouvert, un ICMP port unreachable (remonte
+    par le noyau sous forme de ConnectionRefusedError) un port ferme.
+
+    :class ProbeProtocol
+    """
+
+    def __init__(self):
+        """
+        Initialisation des objets de type ProbeProtocol.
+
+        :param self : reference vers l'objet ProbeProtocol parent
+        :return None
+        """
+        self.response = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data, addr):
+        if not self.response.done():
+            self.response.set_result("open")
+
+    def error_received(self, exc):
+        if isinstance(exc, ConnectionRefusedError):
+            if not self.response.done():
+                self.response.set_result("closed")
+
+
+class UdpProber:
+    """
+    Envoi des sondes UDP avec retransmission adaptative : le delai avant
+    retransmission est estime pour chaque machine a partir des temps de
+    reponse observes (SRTT + 4 RTTVAR, comme pour TCP), puis double a
+    chaque retransmission. Une machine qui repond rapidement (reponses
+    UDP ou ICMP) voit ainsi ses ports silencieux resolus bien avant le
+    delai initial.
+
+    :class UdpProber
+    """
+
+    def __init__(self, timeout, retries):
+        """
+        Initialisation des objets de type UdpProber.
+
+        :param self : reference vers l'objet UdpProber parent
+        :param timeout : delai initial (et maximal) avant retransmission
+                         (secondes)
+        :param retries : nombre maximal de retransmissions par sonde
+        :return None
+        """
+        self.timeout = timeout
+        self.retries = retries
+        # estimations du temps de reponse des machines ayant repondu :
+        # {ip: [srtt, rttvar]}
+        self.rtt = {}
+        # nombre de sondes renvoyees faute de reponse
+        self.retransmissions = 0
+
+    def retransmission_timeout(self, ip_host):
+        """
+        Delai avant retransmission pour une machine.
+
+        :param self : reference vers l'objet UdpProber parent
+        :param ip_host : adresse IP de la machine
+        :return delai (secondes)
+        """
+        if ip_host not in self.rtt:
+            return self.timeout
+        srtt, rttvar = self.rtt[ip_host]
+        return min(
+            self.timeout, max(MIN_RETRANSMISSION_TIMEOUT, srtt + 4 * rttvar)
+        )
+
+    def update_rtt(self, ip_host, sample):
+        """
+        Prise en compte d'une mesure du temps de reponse d'une machine.
+
+        :param self : reference vers l'objet UdpProber parent
+        :param ip_host : adresse IP de la machine
+        :param sample : temps de reponse mesure (secondes)
+        :return None
+        """
+        if ip_host not in self.rtt:
+            self.rtt[ip_host] = [sample, sample / 2]
+            return
+        estimate = self.rtt[ip_host]
+        estimate[1] = 0.75 * estimate[1] + 0.25 * abs(estimate[0] - sample)
+        estimate[0] = 0.875 * estimate[0] + 0.125 * sample
+
+    async def probe(self, ip_host, port, timeout=None):
+        """
+        Envoi d'une sonde UDP, retransmise tant qu'aucune reponse n'est
+        recue.
+
+        :param self : reference vers l'objet UdpProber parent
+        :param ip_host : adresse IP a tester
+        :param port : numero de port a tester
+        :param timeout : ignore (le delai est adaptatif), present pour la
+                         compatibilite avec scan_hosts
+        :return etat du port : "open", "closed" ou "filtered" (aucune
+                reponse : port filtre, ou ouvert mais muet)
+        """
+        loop = asyncio.get_running_loop()
+        payload = UDP_PROBES.get(port, (None, b""))[1]
+        # le socket est cree directement : create_datagram_endpoint ferait
+        # sinon appel a getaddrinfo pour chaque sonde.
+        family = socket.AF_INET6 if ":" in ip_host else socket.AF_INET
+        probe_socket = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            probe_socket.setblocking(False)
+            probe_socket.connect((ip_host, port))
+            transport, protocol = await loop.create_datagram_endpoint(
+                ProbeProtocol, sock=probe_socket
+            )
+        except OSError:
+            probe_socket.close()
+            return "filtered"
+        try:
+            delay = self.retransmission_timeout(ip_host)
+            for attempt in range(self.retries + 1):
+                sent_at = loop.time()
+                # envoi direct sur le socket : le transport asyncio ignore
+                # les datagrammes vides.
+                try:
+                    probe_socket.send(payload)
+                except ConnectionRefusedError:
+                    # ICMP port unreachable recu en reponse a un envoi
+                    # precedent
+                    return "closed"
+                except OSError:
+                    pass
+                try:
+                    state = await asyncio.wait_for(
+                        asyncio.shield(protocol.response), delay
+                    )
+                except asyncio.TimeoutError:
+                    delay = min(self.timeout, delay * 2)
+                    if attempt < self.retries:
+                        self.retransmissions += 1
+                    continue
+                # algorithme de Karn : seules les reponses a un premier
+                # envoi donnent une mesure fiable.
+                if attempt == 0:
+                    self.update_rtt(ip_host, loop.time() - sent_at)
+                return state
+            return "filtered"
+        finally:
+            transport.close()
+
+
+def run_udp_scan(
+    iter_ip_hosts,
+    hosts_count,
+    ports,
+    concurrency,
+    timeout,
+    retries,
+    max_rate=0,
+    max_host_probes=0,
+):
+    """
+    Lancement du scan UDP dans une boucle d'evenements asyncio.
+
+    :param iter_ip_hosts : fonction renvoyant un generateur des adresses IP
+                           a scanner
+    :param hosts_count : nombre d'adresses IP a scanner
+    :param ports : ports a scanner, dans l'ordre d'envoi des sondes
+    :param concurrency : nombre maximal de sondes simultanees
+    :param timeout : delai initial avant retransmission (secondes)
+    :param retries : nombre maximal de retransmissions par sonde
+    :param max_rate : nombre maximal de sondes par seconde (0 : illimite)
+    :param max_host_probes : nombre maximal de sondes simultanees par
+                             machine (0 : illimite)
+    :return tuple : resultats (voir scan_hosts), duree du scan (secondes),
+            nombre de retransmissions
+    """
+    concurrency = adjust_concurrency(concurrency)
+    logging.info(
+        "scan UDP de {} machine(s) sur {} port(s), {} sondes "
+        "simultanees".format(hosts_count, len(ports), concurrency)
+    )
+    prober = UdpProber(timeout, retries)
+    start_time = time.time()
+    results = asyncio.run(
+        scan_hosts(
+            iter_ip_hosts,
+            ports,
+            concurrency,
+            timeout,
+            max_rate=max_rate,
+            max_host_probes=max_host_probes,
+            probe=prober.probe,
+        )
+    )
+    return results, time.time() - start_time, prober.retransmissions
@@ -0,0 +1,16 @@
+"""
+Configuration des tests unitaires (pytest) : le dossier racine du projet
+est ajoute au chemin d'import, afin que le paquet src soit importable
+quel que soit le dossier de lancement.
+
+:file conftest.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import os
+import sys
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+)
@@ -0,0 +1,163 @@
+"""
+Tests unitaires de l'analyse incrementale de la sortie XML de nmap, sur
+une sortie -oX enregistree (test/data/nmap_scan.xml).
+
+:file test_nmap_xml.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import os
+import stat
+import xml.etree.ElementTree as ElementTree
+import pytest
+from src.nmap_xml import NmapXmlScan
+
+# sortie de "nmap -oX - -p 22,80,443 -sS -sV 172.20.128.1-3"
+XML_PATH = os.path.join(os.path.dirname(__file__), "data", "nmap_scan.xml")
+METADATA = {"target": "172.20.128.1-3", "transport": "T"}
+
+
+class ChunkedStream:
+    """
+    Flux renvoyant la sortie de nmap par petits morceaux, comme un tube
+    alimente au fil du scan.
+
+    :class ChunkedStream
+    """
+
+    def __init__(self, data, chunk_size):
+        """
+        Initialisation des objets de type ChunkedStream.
+
+        :param self : reference vers l'objet ChunkedStream parent
+        :param data : contenu du flux (bytes)
+        :param chunk_size : taille maximale des lectures (octets)
+        :return None
+        """
+        self.data = data
+        self.chunk_size = chunk_size
+        self.position = 0
+
+    def read1(self, size):
+        """
+        Lecture des donnees disponibles.
+
+        :param self : reference vers l'objet ChunkedStream parent
+        :param size : taille maximale demandee (octets)
+        :return donnees lues (b"" en fin de flux)
+        """
+        data = self.data[
+            self.position : self.position + min(size, self.chunk_size)
+        ]
+        self.position += len(data)
+        return data
+
+
+@pytest.fixture
+def recorded_xml():
+    with open(XML_PATH, "rb") as xml_file:
+        return xml_file.read()
+
+
+def make_scan(nmap_path="nmap"):
+    return NmapXmlScan(nmap_path, "172.20.128.1-3", "22,80,443", ["-sS"])
+
+
+def test_parse_recorded_output(recorded_xml):
+    scan = make_scan()
+    results = list(scan.parse(ChunkedStream(recorded_xml, 64), METADATA))
+    # la machine hors ligne n'est pas renvoyee
+    assert [result.ip_host for result in results] == [
+        "172.20.128.2",
+        "172.20.128.3",
+    ]
+    web, database = results
+    assert web.up and web.metadata is METADATA
+    assert web.mac == "02:42:AC:14:80:02"
+    assert web.hostnames == ("web.test_static-network", "web")
+    assert [(p.port, p.state, p.reason) for p in web.ports] == [
+        (22, "closed", "reset"),
+        (80, "open", "syn-ack"),
+        (443, "filtered", "no-response"),
+    ]
+    http = web.ports[1]
+    assert (http.name, http.product, http.version, http.conf) == (
+        "http",
+        "nginx",
+        "1.18.0",
+        "10",
+    )
+    assert http.cpe == "cpe:/a:igor_sysoev:nginx:1.18.0"
+    assert web.ports[0].cpe == ""
+    # les ports d'une machine ne sont pas attribues a la suivante
+    assert database.ports == ()
+    assert database.hostnames == ("",)
+    assert scan.elapsed == 6.42
+
+
+def test_results_are_incremental(recorded_xml):
+    stream = ChunkedStream(recorded_xml, 64)
+    results = make_scan().parse(stream, METADATA)
+    assert next(results).ip_host == "172.20.128.2"
+    # le resultat de la premiere machine est disponible avant la fin
+    # de la sortie de nmap
+    assert stream.position < recorded_xml.index(b"172.20.128.3")
+    assert next(results).ip_host == "172.20.128.3"
+    assert stream.position < len(recorded_xml)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_chunk_boundaries(recorded_xml, chunk_size):
+    stream = ChunkedStream(recorded_xml, chunk_size)
+    results = list(make_scan().parse(stream, METADATA))
+    assert len(results) == 2 and len(results[0].ports) == 3
+
+
+def test_truncated_output(recorded_xml):
+    truncated = recorded_xml[: recorded_xml.index(b"<runstats>")]
+    results = make_scan().parse(ChunkedStream(truncated, 64), METADATA)
+    with pytest.raises(ElementTree.ParseError):
+        list(results)
+
+
+def write_fake_nmap(tmp_path, stdout_path):
+    """
+    Creation d'un faux nmap qui affiche une sortie XML enregistree, un
+    avertissement et une erreur.
+
+    :param tmp_path : dossier temporaire
+    :param stdout_path : fichier affiche sur la sortie standard
+    :return chemin du faux nmap
+    """
+    nmap_path = tmp_path / "nmap"
+    nmap_path.write_text(
+        "#!/bin/sh\n"
+        'cat "{}"\n'
+        "echo 'Warning: 172.20.128.1 giving up on port' >&2\n"
+        "echo 'Failed to resolve \"unknown.invalid\".' >&2\n".format(
+            stdout_path
+        )
+    )
+    nmap_path.chmod(nmap_path.stat().st_mode | stat.S_IEXEC)
+    return str(nmap_path)
+
+
+def test_results_from_process(tmp_path):
+    scan = make_scan(write_fake_nmap(tmp_path, XML_PATH))
+    results = list(scan.results(METADATA))
+    assert [result.ip_host for result in results] == [
+        "172.20.128.2",
+        "172.20.128.3",
+    ]
+    assert scan.elapsed == 6.42
+    assert scan.warnings == ["Warning: 172.20.128.1 giving up on port"]
+    assert scan.errors == ['Failed to resolve "unknown.invalid".']
+
+
+def test_invalid_process_output(tmp_path):
+    empty_path = tmp_path / "empty.xml"
+    empty_path.write_text("")
+    scan = make_scan(write_fake_nmap(tmp_path, empty_path))
+    with pytest.raises(RuntimeError, match="Failed to resolve"):
+        list(scan.results(METADATA))
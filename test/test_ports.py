@@ -0,0 +1,135 @@
+"""
+Tests unitaires des ensembles de ports (PortSet) et de la lecture des
+specifications de ports.
+
+:file test_ports.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import pytest
+from src import ports
+from src.ports import MAX_PORT, MIN_PORT, PortSet, parse_port_spec
+
+
+@pytest.fixture(autouse=True)
+def default_top_ports(monkeypatch):
+    # les ports les plus frequents ne dependent pas du nmap installe
+    monkeypatch.setattr(ports, "load_port_frequencies", lambda protocol: None)
+
+
+def test_intervals_are_normalized():
+    port_set = PortSet([(80, 80), (1, 10), (5, 20), (21, 30), (443, 442)])
+    assert port_set.intervals == [(1, 30), (80, 80)]
+    assert len(port_set) == 31
+
+
+def test_out_of_range_port_is_rejected():
+    with pytest.raises(ValueError):
+        PortSet.from_range(0, 10)
+    with pytest.raises(ValueError):
+        PortSet.from_range(1, MAX_PORT + 1)
+
+
+@pytest.mark.parametrize(
+    "spec", ["22", "22,80,443", "1-1024", "1-10,20-30,443,8000-8080"]
+)
+def test_nmap_round_trip(spec):
+    assert PortSet.from_nmap(spec).to_nmap() == spec
+
+
+def test_from_nmap_normalizes():
+    assert PortSet.from_nmap("80,22,21-23").to_nmap() == "21-23,80"
+
+
+def test_split_keeps_every_port_once():
+    port_set = PortSet.from_nmap("1-10,20-29,100")
+    for count in range(0, len(port_set) + 2):
+        head, tail = port_set.split(count)
+        assert len(head) == min(count, len(port_set))
+        assert len(head & tail) == 0
+        assert head | tail == port_set
+        # les premiers ports sont les plus petits
+        if len(head) and len(tail):
+            assert max(head) < min(tail)
+
+
+def test_chunks_partition():
+    port_set = PortSet.from_range(MIN_PORT, 1000) - PortSet.from_nmap("500")
+    chunks = list(port_set.chunks(128))
+    assert all(len(chunk) == 128 for chunk in chunks[:-1])
+    assert sum(len(chunk) for chunk in chunks) == len(port_set)
+    union = PortSet()
+    for chunk in chunks:
+        assert len(union & chunk) == 0
+        union = union | chunk
+    assert union == port_set
+
+
+def test_subtract():
+    port_set = PortSet.from_range(1, 100)
+    excluded = PortSet.from_nmap("1,10-20,50,90-200")
+    assert (port_set - excluded).to_nmap() == "2-9,21-49,51-89"
+    assert len(port_set - port_set) == 0
+    assert port_set - PortSet() == port_set
+
+
+def test_intersection_and_membership():
+    left = PortSet.from_nmap("1-100,200-300")
+    right = PortSet.from_nmap("50-250")
+    assert (left & right).to_nmap() == "50-100,200-250"
+    assert 75 in left and 150 not in left and 301 not in left
+
+
+def test_spec_applies_to_all_protocols():
+    port_sets = parse_port_spec("22,80-82", ["T", "U"])
+    assert port_sets["T"].to_nmap() == "22,80-82"
+    assert port_sets["U"].to_nmap() == "22,80-82"
+
+
+def test_spec_protocol_prefixes():
+    port_sets = parse_port_spec("T:22,443,U:53,161", ["T", "U"])
+    assert port_sets["T"].to_nmap() == "22,443"
+    assert port_sets["U"].to_nmap() == "53,161"
+
+
+def test_spec_prefix_of_unscanned_protocol():
+    port_sets = parse_port_spec("T:80,U:53", ["T"])
+    assert list(port_sets) == ["T"]
+    assert port_sets["T"].to_nmap() == "80"
+
+
+def test_spec_open_ranges():
+    port_sets = parse_port_spec("-100,65000-", ["T"])
+    assert port_sets["T"].intervals == [(MIN_PORT, 100), (65000, MAX_PORT)]
+
+
+def test_spec_top_ports():
+    port_sets = parse_port_spec("top:5,U:top:3", ["T", "U"])
+    assert port_sets["T"] == PortSet.from_ports(
+        ports.DEFAULT_TOP_PORTS["T"][:5]
+    )
+    assert port_sets["U"] == PortSet.from_ports(
+        ports.DEFAULT_TOP_PORTS["U"][:5]
+    ) | PortSet.from_ports(ports.DEFAULT_TOP_PORTS["U"][:3])
+
+
+def test_spec_top_ports_with_ports():
+    port_sets = parse_port_spec("T:top:2,8080", ["T", "U"])
+    expected = PortSet.from_ports(ports.DEFAULT_TOP_PORTS["T"][:2] + [8080])
+    assert port_sets["T"] == expected
+    assert len(port_sets["U"]) == 0
+
+
+def test_top_ports_beyond_default_list():
+    # sans nmap-services, le scan ne porte pas sur moins de ports que
+    # demande
+    with pytest.raises(ValueError):
+        parse_port_spec("top:1000", ["T"])
+    with pytest.raises(ValueError):
+        ports.top_ports(len(ports.DEFAULT_TOP_PORTS["U"]) + 1, "U")
+
+
+def test_invalid_spec():
+    with pytest.raises(ValueError):
+        parse_port_spec("22,abc", ["T"])
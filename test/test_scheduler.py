@@ -0,0 +1,146 @@
+"""
+Tests unitaires de l'ordonnancement adaptatif des intervalles de ports.
+
+:file test_scheduler.py
+:author Thibaut PASSILLY
+:date 18.10.2026
+"""
+
+import threading
+from src.ports import PortSet
+from src.scheduler import AdaptiveChunkScheduler
+
+# delai laisse au generateur pour se bloquer, ou se debloquer (secondes)
+WAIT_TIMEOUT = 2
+
+
+def make_scheduler(units, max_host_tasks=0, window=2, initial_chunk=100):
+    """
+    Creation d'un ordonnanceur sur des groupes de machines fictifs.
+
+    :param units : liste de couples (groupe de machines, ports a scanner)
+    :param max_host_tasks : nombre maximal de requetes par groupe
+    :param window : nombre de groupes scannes simultanement
+    :param initial_chunk : taille des intervalles avant toute mesure
+    :return AdaptiveChunkScheduler
+    """
+    work_units = [
+        {"host_group": group, "port_range": port_range, "transport": "T"}
+        for group, port_range in units
+    ]
+    total_ports = sum(len(PortSet.from_nmap(p)) for _, p in units)
+    return AdaptiveChunkScheduler(
+        work_units,
+        total_ports,
+        initial_chunk,
+        min_chunk=10,
+        max_chunk=1000,
+        chunk_duration=1,
+        window=window,
+        max_host_tasks=max_host_tasks,
+    )
+
+
+def next_in_thread(tasks):
+    """
+    Demande de la requete suivante dans un thread, le generateur pouvant
+    se bloquer.
+
+    :param tasks : generateur des requetes
+    :return couple (thread, liste recevant la requete, ou None si le
+            generateur s'est termine)
+    """
+    received = []
+    thread = threading.Thread(
+        target=lambda: received.append(next(tasks, None)), daemon=True
+    )
+    thread.start()
+    return thread, received
+
+
+def test_chunks_never_overlap():
+    units = [("a", "1-1000"), ("b", "1-50,100-300,8080"), ("c", "22")]
+    scheduler = make_scheduler(units)
+    assigned = {group: PortSet() for group, _ in units}
+    for index, metadata in enumerate(scheduler.iter_tasks()):
+        chunk = PortSet.from_nmap(metadata["port_range"])
+        assert len(chunk) == metadata["port_count"] > 0
+        assert len(assigned[metadata["host_group"]] & chunk) == 0
+        assigned[metadata["host_group"]] |= chunk
+        # les vitesses mesurees modifient la taille des intervalles
+        scheduler.record(metadata, 0.05 * (index + 1))
+    for group, port_range in units:
+        assert assigned[group] == PortSet.from_nmap(port_range)
+    assert scheduler.progress() == 100.0
+
+
+def test_chunk_size_follows_rate():
+    scheduler = make_scheduler([("a", "1-65535")])
+    tasks = scheduler.iter_tasks()
+    first = next(tasks)
+    assert first["port_count"] == 100
+    # 1000 ports/s pendant 1 s, borne par max_chunk
+    scheduler.record(first, 0.1)
+    assert next(tasks)["port_count"] == 1000
+
+
+def test_groups_share_the_pool():
+    units = [("a", "1-1000"), ("b", "1-1000"), ("c", "1-1000")]
+    scheduler = make_scheduler(units, max_host_tasks=1, window=1)
+    tasks = scheduler.iter_tasks()
+    # la fenetre ne compte qu'un groupe, mais les autres sont actives
+    # plutot que de depasser max_host_tasks
+    groups = [next(tasks)["host_group"] for _ in units]
+    assert sorted(groups) == ["a", "b", "c"]
+
+
+def test_host_group_cap_blocks_until_release():
+    scheduler = make_scheduler([("a", "1-1000")], max_host_tasks=1)
+    tasks = scheduler.iter_tasks()
+    first = next(tasks)
+    thread, received = next_in_thread(tasks)
+    thread.join(0.2)
+    assert thread.is_alive() and received == []
+    scheduler.record(first, 1)
+    thread.join(WAIT_TIMEOUT)
+    assert not thread.is_alive()
+    assert received[0]["host_group"] == "a"
+    second = PortSet.from_nmap(received[0]["port_range"])
+    assert len(second & PortSet.from_nmap(first["port_range"])) == 0
+
+
+def test_skip_releases_host_group():
+    scheduler = make_scheduler([("a", "1-1000")], max_host_tasks=1)
+    tasks = scheduler.iter_tasks()
+    first = next(tasks)
+    thread, received = next_in_thread(tasks)
+    thread.join(0.2)
+    assert thread.is_alive()
+    scheduler.skip(first)
+    thread.join(WAIT_TIMEOUT)
+    assert not thread.is_alive() and received[0] is not None
+    assert scheduler.done_ports == first["port_count"]
+
+
+def test_cap_counts_every_protocol_of_a_group():
+    scheduler = make_scheduler([("a", "1-100"), ("a", "1-100")], 1)
+    tasks = scheduler.iter_tasks()
+    first = next(tasks)
+    thread, received = next_in_thread(tasks)
+    thread.join(0.2)
+    assert thread.is_alive()
+    scheduler.record(first, 1)
+    thread.join(WAIT_TIMEOUT)
+    assert received[0]["unit_id"] != first["unit_id"]
+
+
+def test_stop_wakes_up_generator():
+    scheduler = make_scheduler([("a", "1-1000")], max_host_tasks=1)
+    tasks = scheduler.iter_tasks()
+    next(tasks)
+    thread, received = next_in_thread(tasks)
+    thread.join(0.2)
+    assert thread.is_alive()
+    scheduler.stop()
+    thread.join(WAIT_TIMEOUT)
+    assert not thread.is_alive() and received == [None]